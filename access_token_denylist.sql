@@ -0,0 +1,21 @@
+-- ======================================
+-- 서명 Access Token 폐기 목록 (streamlit_app)
+-- Supabase SQL Editor에서 실행하세요
+--
+-- 토큰은 HMAC 서명으로 DB 조회 없이 검증하고,
+-- 폐기할 토큰(token_id = jti) 또는 사용자(user_id)만 여기에 넣습니다.
+-- 앱은 이 목록을 ACCESS_DENYLIST_TTL 초(기본 60초)마다 다시 읽습니다.
+-- ======================================
+
+create table if not exists access_token_denylist (
+  id bigint generated by default as identity primary key,
+  token_id text,
+  user_id uuid references users(id) on delete cascade,
+  reason text,
+  created_at timestamptz default now(),
+  check (token_id is not null or user_id is not null)
+);
+
+alter table access_token_denylist enable row level security;
+
+select 'access_token_denylist 생성 완료!' as status;
@@ -1,8 +1,10 @@
 -- Create a function for similarity search
+-- Orders by distance first (HNSW index scan), then applies the threshold.
+-- See pgvector_hnsw_setup.sql for the matching indexes.
 create or replace function match_knowledge (
   query_embedding vector(768),
-  match_threshold float,
-  match_count int,
+  match_threshold float default 0.5,
+  match_count int default 3,
   filter jsonb default '{}'
 )
 returns table (
@@ -11,20 +13,20 @@ returns table (
   metadata jsonb,
   similarity float
 )
-language plpgsql
+language sql stable
 as $$
-begin
-  return query(
+  select t.id, t.content, t.metadata, 1 - t.distance as similarity
+  from (
     select
       knowledge_store.id,
       knowledge_store.content,
       knowledge_store.metadata,
-      1 - (knowledge_store.embedding <=> query_embedding) as similarity
+      knowledge_store.embedding <=> query_embedding as distance
     from knowledge_store
-    where 1 - (knowledge_store.embedding <=> query_embedding) > match_threshold
-    and knowledge_store.metadata @> filter
+    where knowledge_store.metadata @> filter
     order by knowledge_store.embedding <=> query_embedding
     limit match_count
-  );
-end;
+  ) t
+  where 1 - t.distance > match_threshold
+  order by t.distance;
 $$;
@@ -5,9 +5,9 @@ src/knowledge/docs/ 폴더의 PDF들을 Supabase knowledge_base에 저장합니
 
 import os
 from dotenv import load_dotenv
-from supabase import create_client, Client
-import google.generativeai as genai
-from PyPDF2 import PdfReader
+from supabase import Client
+from myeongshim_rag.src.extract_cache import ExtractCache
+from myeongshim_rag.src.clients import get_supabase, configure_genai, client_stats
 
 load_dotenv()
 
@@ -33,8 +33,9 @@ def ingest_pdfs():
     print("🚀 PDF → Supabase 학습 시작...")
     
     # 클라이언트 초기화
-    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-    genai.configure(api_key=GEMINI_API_KEY)
+    supabase: Client = get_supabase(SUPABASE_URL, SUPABASE_KEY)
+    genai = configure_genai(GEMINI_API_KEY)
+    cache = ExtractCache()  # myeongshim_rag/src/ingest.py 와 공유하는 추출 캐시
     
     if not os.path.exists(PDF_PATH):
         print(f"❌ PDF 폴더를 찾을 수 없습니다: {PDF_PATH}")
@@ -50,15 +51,11 @@ def ingest_pdfs():
         print(f"\n[{idx+1}/{len(pdf_files)}] 📄 {pdf_file[:50]}...")
         
         try:
-            # PDF 읽기
+            # PDF 읽기 (캐시에 있으면 파싱 생략)
             pdf_path = os.path.join(PDF_PATH, pdf_file)
-            reader = PdfReader(pdf_path)
+            pages, _ = cache.get_pdf_pages(pdf_path)
             
-            text = ""
-            for page in reader.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
+            text = "".join(page_text + "\n" for page_text in pages if page_text)
             
             if not text.strip():
                 print(f"  ⚠️ 텍스트 추출 실패 (스캔 이미지?)")
@@ -106,6 +103,9 @@ def ingest_pdfs():
             print(f"  ❌ PDF 읽기 실패: {str(e)[:50]}")
             continue
     
+    print(f"\n📦 추출 캐시: {cache.hits}개 재사용, {cache.misses}개 새로 파싱")
+    cache.close()
+    print(f"⏱️ 요청 지연 통계: {client_stats.snapshot()}")
     print(f"\n🎉 학습 완료! 총 {total_chunks}개 청크 저장됨")
     print("\n앱에서 테스트: /debug_rag 재물운")
 
@@ -10,9 +10,9 @@ PDF 학습 데이터를 Supabase 벡터 DB로 이전합니다.
 
 import os
 from dotenv import load_dotenv
-from supabase import create_client, Client
-import google.generativeai as genai
+from supabase import Client
 import chromadb
+from myeongshim_rag.src.clients import get_supabase, configure_genai, client_stats
 
 load_dotenv()
 
@@ -28,8 +28,8 @@ def migrate():
     print("🚀 ChromaDB → Supabase 마이그레이션 시작...")
     
     # 1. 클라이언트 초기화
-    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-    genai.configure(api_key=GEMINI_API_KEY)
+    supabase: Client = get_supabase(SUPABASE_URL, SUPABASE_KEY)
+    genai = configure_genai(GEMINI_API_KEY)
     
     # 2. ChromaDB 연결
     if not os.path.exists(CHROMA_DB_PATH):
@@ -110,6 +110,7 @@ def migrate():
             except Exception as e:
                 print(f"  ❌ 삽입 실패: {e}")
     
+    print(f"\n⏱️ 요청 지연 통계: {client_stats.snapshot()}")
     print(f"\n🎉 마이그레이션 완료! 총 {total_migrated}개 문서 이전됨")
     print("\n다음 단계:")
     print("1. Supabase에서 테이블 확인: knowledge_base")
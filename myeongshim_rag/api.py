@@ -1,22 +1,67 @@
-from fastapi import FastAPI, HTTPException
+import os
+import hmac
+import asyncio
+from fastapi import FastAPI, HTTPException, Header, Request
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 from src.ingest import ingest_documents
 from src.rag_chain import MyeongshimBrain
+from src.clients import client_stats
+from src.manseryeok import birth_pillars, GAN_KR, GAN_ELEMENT
+from src.answer_cache import cache_stats, clear_all
+from src.cache_warmer import CacheWarmer, WARMUP_ENABLED
+from src.llm_gateway import get_gateway
+from src.profiling import profiler, slow_requests, trace_request
+from src.embedding_space import EmbeddingMigrator, cutover
+from src.rag_chain import DB_PATH
 import uvicorn
 
 app = FastAPI(title="Myeongshim RAG server")
 
+# Admin endpoints (profiler, slow requests) are disabled unless ADMIN_TOKEN is set
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+# Upper bound on questions per /ask_many request
+ASK_MANY_MAX_QUESTIONS = int(os.getenv("ASK_MANY_MAX_QUESTIONS", "50"))
+
 # Global Brain Instance
 brain = MyeongshimBrain()
+warmer = CacheWarmer(brain)
+migrator = EmbeddingMigrator(DB_PATH)
+brain.dual_read = migrator.maybe_dual_read
 
 class QueryRequest(BaseModel):
     question: str
     saju: dict = None
 
+class BatchQueryRequest(BaseModel):
+    questions: list[str]
+    saju: dict = None
+    max_concurrency: int = None
+
+class SajuRequest(BaseModel):
+    birth_date: str
+    birth_time: str = None
+
+def require_admin(token: str):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Admin endpoints disabled (set ADMIN_TOKEN)")
+    if not token or not hmac.compare_digest(token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    # Requests slower than SLOW_REQUEST_MS land in the slow-request ring buffer with per-stage timings
+    with trace_request(f"{request.method} {request.url.path}") as trace:
+        response = await call_next(request)
+        trace.notes["status"] = response.status_code
+        return response
+
 @app.on_event("startup")
 async def startup_event():
     print("Server starting up...")
     # Brain is already initialized globally, but we can re-check here if needed
+    if WARMUP_ENABLED:
+        warmer.start()
 
 @app.post("/ingest")
 async def ingest_endpoint():
@@ -26,6 +71,8 @@ async def ingest_endpoint():
     try:
         result = ingest_documents()
         brain.reload() # Reload the chain with new DB
+        clear_all() # Cached answers/embeddings refer to the old DB
+        warmer.trigger()
         return {"status": "success", "message": result}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -36,10 +83,130 @@ async def ask_endpoint(request: QueryRequest):
     Asks the RAG agent a question.
     """
     try:
-        response = brain.get_answer(request.question, request.saju)
+        # get_answer blocks (single-flight waits, LLM call); run it off the event loop
+        response = await asyncio.to_thread(brain.get_answer, request.question, request.saju)
         return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/ask_many")
+async def ask_many_endpoint(request: BatchQueryRequest):
+    """
+    Answers a batch of questions sharing one saju context.
+    Results keep the input order; per-item failures are reported in `error`.
+    """
+    if len(request.questions) > ASK_MANY_MAX_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"At most {ASK_MANY_MAX_QUESTIONS} questions per request")
+    try:
+        results = await brain.get_answers(request.questions, request.saju, request.max_concurrency)
+        return {"results": results}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/saju")
+async def saju_endpoint(request: SajuRequest):
+    """
+    Computes the four pillars (사주 4기둥) from the precomputed manseryeok table.
+    """
+    try:
+        pillars = birth_pillars(request.birth_date, request.birth_time)  # hour is None when the time is unknown
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    day_gan = pillars["day"][0]
+    return {
+        "saju_characters": pillars,
+        "dayMaster": day_gan + GAN_ELEMENT[GAN_KR.index(day_gan)],
+    }
+
+@app.get("/client_stats")
+async def client_stats_endpoint():
+    """
+    Per-endpoint latency counters for the shared Supabase/Gemini clients.
+    """
+    return client_stats.snapshot()
+
+@app.get("/llm_stats")
+async def llm_stats_endpoint():
+    """
+    Per-model Gemini gateway stats (latency percentiles, 429s, retries, hedges, fallbacks, concurrency limit).
+    """
+    return get_gateway().stats()
+
+@app.post("/warmup")
+async def warmup_endpoint():
+    """
+    Wakes the cache warmer (starting it if the schedule is disabled).
+    """
+    warmer.start()
+    warmer.trigger()
+    return {"status": "scheduled", "last_run": warmer.last_run}
+
+@app.get("/cache_stats")
+async def cache_stats_endpoint():
+    """
+    Hit/miss counters for the answer and embedding caches.
+    """
+    return {**cache_stats(), "warmup": warmer.last_run}
+
+@app.post("/admin/profiler/start")
+async def profiler_start_endpoint(interval_ms: float = 10, max_seconds: float = 120,
+                                  x_admin_token: str = Header(None)):
+    """
+    Starts the sampling profiler (stops by itself after max_seconds).
+    """
+    require_admin(x_admin_token)
+    started = profiler.start(interval_ms, max_seconds)
+    return {"started": started, **profiler.status()}
+
+@app.post("/admin/profiler/stop", response_class=PlainTextResponse)
+async def profiler_stop_endpoint(x_admin_token: str = Header(None)):
+    """
+    Stops the profiler and returns collapsed stacks (flamegraph.pl / speedscope input).
+    """
+    require_admin(x_admin_token)
+    return profiler.stop()
+
+@app.get("/admin/slow_requests")
+async def slow_requests_endpoint(x_admin_token: str = Header(None)):
+    """
+    Recently captured slow requests, newest first.
+    """
+    require_admin(x_admin_token)
+    return {"profiler": profiler.status(), "requests": list(reversed(slow_requests))}
+
+@app.post("/admin/embedding/migrate")
+async def embedding_migrate_endpoint(model: str, auto_cutover: bool = True, x_admin_token: str = Header(None)):
+    """
+    Starts re-embedding the active space into `model` in the background (queries stay on the current space).
+    """
+    require_admin(x_admin_token)
+    try:
+        started = migrator.start(model, auto_cutover)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"started": started, **migrator.status()}
+
+@app.get("/admin/embedding/status")
+async def embedding_status_endpoint(x_admin_token: str = Header(None)):
+    """
+    Embedding spaces, migration coverage and dual-read overlap with the active space.
+    """
+    require_admin(x_admin_token)
+    return migrator.status()
+
+@app.post("/admin/embedding/cutover")
+async def embedding_cutover_endpoint(space: str, x_admin_token: str = Header(None)):
+    """
+    Switches queries to a ready (or retired, for rollback) embedding space.
+    """
+    require_admin(x_admin_token)
+    try:
+        # Building the derived index and reloading can take minutes; keep the event loop serving meanwhile
+        await asyncio.to_thread(cutover, space, DB_PATH)
+    except (KeyError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await asyncio.to_thread(brain.reload)
+    return migrator.status()
+
 if __name__ == "__main__":
     uvicorn.run("api:app", host="0.0.0.0", port=8000, reload=True)
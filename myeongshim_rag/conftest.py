@@ -0,0 +1 @@
+# pytest 가 myeongshim_rag 를 sys.path 에 넣도록 하는 파일 (src.* 로 import)
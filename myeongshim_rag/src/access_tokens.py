@@ -0,0 +1,133 @@
+"""
+Access Tokens
+Streamlit 상담 링크용 HMAC 서명 토큰입니다. DB 조회 없이 검증합니다.
+
+토큰 = base64url(JSON 클레임) + "." + base64url(HMAC-SHA256(ACCESS_TOKEN_SECRET, 앞부분))
+- uid: users.id, dur: 이용권 시간(분), exp: 링크 만료 시각(epoch 초), jti: 토큰 id
+- 폐기는 access_token_denylist 테이블(access_token_denylist.sql)에 넣고,
+  각 프로세스는 목록을 ACCESS_DENYLIST_TTL 초 동안 캐시합니다
+
+사용: python -m src.access_tokens issue <user_id> [duration_minutes] [valid_days]
+      python -m src.access_tokens revoke <token>
+"""
+
+import os
+import hmac
+import json
+import time
+import base64
+import hashlib
+import secrets
+import threading
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ACCESS_TOKEN_DAYS = int(os.getenv("ACCESS_TOKEN_DAYS", "30"))
+ACCESS_DENYLIST_TTL = float(os.getenv("ACCESS_DENYLIST_TTL", "60"))
+DENYLIST_TABLE = "access_token_denylist"
+
+
+class InvalidToken(ValueError):
+    pass
+
+
+def _secret() -> bytes:
+    secret = os.getenv("ACCESS_TOKEN_SECRET")
+    if not secret:
+        raise ValueError("ACCESS_TOKEN_SECRET missing")
+    return secret.encode("utf-8")
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(body: str) -> str:
+    return _b64encode(hmac.new(_secret(), body.encode("ascii"), hashlib.sha256).digest())
+
+
+def issue_token(user_id: str, duration_minutes: int = 30, valid_days: int = ACCESS_TOKEN_DAYS) -> str:
+    claims = {
+        "uid": str(user_id),
+        "dur": int(duration_minutes),
+        "exp": int(time.time() + valid_days * 86400),
+        "jti": secrets.token_urlsafe(9),
+    }
+    body = _b64encode(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+    return f"{body}.{_sign(body)}"
+
+
+def looks_like_token(value: str) -> bool:
+    return bool(value) and value.count(".") == 1 and len(value) > 40
+
+
+def verify_token(token: str) -> dict:
+    """서명과 만료를 확인하고 클레임을 반환합니다. 실패하면 InvalidToken."""
+    try:
+        body, signature = token.split(".")
+    except (AttributeError, ValueError):
+        raise InvalidToken("malformed token")
+    if not hmac.compare_digest(signature, _sign(body)):
+        raise InvalidToken("bad signature")
+    try:
+        claims = json.loads(_b64decode(body))
+    except ValueError:
+        raise InvalidToken("malformed claims")
+    if claims.get("exp", 0) < time.time():
+        raise InvalidToken("token expired")
+    return claims
+
+
+# --- Revocation ---
+_denylist = {"tokens": set(), "users": set(), "fetched": 0.0}
+_denylist_lock = threading.Lock()
+
+
+def is_revoked(supabase, claims: dict) -> bool:
+    """폐기된 토큰/사용자인지 확인합니다. 목록은 ACCESS_DENYLIST_TTL 초마다 한 번만 다시 읽습니다."""
+    with _denylist_lock:
+        if time.monotonic() - _denylist["fetched"] > ACCESS_DENYLIST_TTL:
+            try:
+                rows = supabase.table(DENYLIST_TABLE).select("token_id, user_id").execute().data or []
+                _denylist["tokens"] = {r["token_id"] for r in rows if r.get("token_id")}
+                _denylist["users"] = {str(r["user_id"]) for r in rows if r.get("user_id")}
+            except Exception as e:
+                print(f"⚠️ Denylist refresh failed: {e}")
+            _denylist["fetched"] = time.monotonic()
+        return claims.get("jti") in _denylist["tokens"] or str(claims.get("uid")) in _denylist["users"]
+
+
+def revoke(supabase, token: str = None, user_id: str = None):
+    """토큰 하나(jti) 또는 사용자의 모든 토큰을 폐기합니다."""
+    record = {}
+    if token:
+        record["token_id"] = json.loads(_b64decode(token.split(".")[0]))["jti"]
+    if user_id:
+        record["user_id"] = str(user_id)
+    if not record:
+        raise ValueError("token or user_id required")
+    supabase.table(DENYLIST_TABLE).insert(record).execute()
+    with _denylist_lock:
+        _denylist["fetched"] = 0.0
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 2 and sys.argv[1] == "issue":
+        duration = int(sys.argv[3]) if len(sys.argv) > 3 else 30
+        days = int(sys.argv[4]) if len(sys.argv) > 4 else ACCESS_TOKEN_DAYS
+        print(issue_token(sys.argv[2], duration, days))
+    elif len(sys.argv) > 2 and sys.argv[1] == "revoke":
+        from src.clients import get_supabase
+
+        revoke(get_supabase(), token=sys.argv[2])
+        print("revoked")
+    else:
+        print(__doc__)
@@ -0,0 +1,80 @@
+"""
+Answer / Embedding Cache
+RAG 서버의 TTL 캐시입니다. (shared_cache 의 이름공간: CACHE_BACKEND 로 워커 간 공유)
+
+- answer_cache   : (질문, 사주 시그니처, 프로필 해시) -> 답변. 시그니처는 일간(日干) x 올해 세운,
+                   프로필 해시는 프롬프트에 들어가는 사주 정보 전체 (다른 사람의 개인 풀이가 섞이지 않도록)
+- embedding_cache: (임베딩 모델, 질의 문자열) -> 임베딩 벡터
+- context_cache  : (임베딩 모델, 정규화한 질문) -> 참고 자료와 청크 (사주와 무관한 검색 단계, cache_warmer 가 채움)
+/ingest 후에는 clear_all() 로 비우고 cache_warmer 가 다시 채웁니다.
+"""
+
+import os
+import re
+import json
+import hashlib
+from datetime import datetime
+
+from src.manseryeok import GAN_KR, KST, compute_pillars, fill_saju_data
+from src.shared_cache import get_shared_cache
+
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", str(24 * 3600)))
+EMBEDDING_CACHE_TTL = int(os.getenv("EMBEDDING_CACHE_TTL", str(7 * 24 * 3600)))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "5000"))
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "20000"))
+CONTEXT_CACHE_TTL = int(os.getenv("CONTEXT_CACHE_TTL", str(24 * 3600)))
+CONTEXT_CACHE_SIZE = int(os.getenv("CONTEXT_CACHE_SIZE", "2000"))
+
+shared_cache = get_shared_cache()
+answer_cache = shared_cache.namespace("answers", ANSWER_CACHE_TTL, ANSWER_CACHE_SIZE)
+embedding_cache = shared_cache.namespace("embeddings", EMBEDDING_CACHE_TTL, EMBEDDING_CACHE_SIZE)
+context_cache = shared_cache.namespace("contexts", CONTEXT_CACHE_TTL, CONTEXT_CACHE_SIZE)
+
+
+def normalize_question(question: str) -> str:
+    return re.sub(r"[\s\"'“”?？!.]+", " ", question or "").strip().lower()
+
+
+# rag_chain._format_saju 가 프롬프트에 넣는 항목
+PROFILE_FIELDS = ("birth_date", "birth_time", "dayMaster", "saju_characters", "current_luck_cycle",
+                  "current_yearly_luck")
+
+
+def current_year_ganji(now: datetime = None) -> str:
+    """현재 세운 간지 (입춘 경계 기준: 1월 ~ 입춘 전은 지난해 간지)."""
+    return compute_pillars(now or datetime.now(KST))["year"]
+
+
+def saju_signature(saju_data: dict = None) -> str:
+    """일간 x 올해 세운. 일간을 알 수 없으면 'none'."""
+    saju_data = fill_saju_data(saju_data) or {}
+    day_stem = None
+    chars = saju_data.get("saju_characters")
+    if isinstance(chars, dict) and chars.get("day"):
+        day_stem = str(chars["day"])[0]
+    elif saju_data.get("dayMaster"):
+        day_stem = str(saju_data["dayMaster"])[0]
+    if day_stem not in GAN_KR:
+        day_stem = "none"
+    return f"{day_stem}|{current_year_ganji()}"
+
+
+def profile_hash(saju_data: dict = None) -> str:
+    """프롬프트에 들어가는 사주 정보 전체의 해시. 같은 해시일 때만 답변을 공유합니다."""
+    saju_data = fill_saju_data(saju_data) or {}
+    profile = {k: saju_data.get(k) for k in PROFILE_FIELDS if saju_data.get(k) is not None}
+    encoded = json.dumps(profile, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+def answer_key(question: str, saju_data: dict = None):
+    return (normalize_question(question), saju_signature(saju_data), profile_hash(saju_data))
+
+
+def clear_all():
+    """모든 워커의 답변/임베딩/참고 자료 캐시를 무효화합니다 (/ingest 후)."""
+    shared_cache.invalidate("answers", "embeddings", "contexts")
+
+
+def cache_stats():
+    return shared_cache.stats()
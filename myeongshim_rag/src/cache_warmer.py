@@ -0,0 +1,121 @@
+"""
+Cache Warmer
+guided_questions.md 의 질문 목록으로 사주와 무관한 단계(질의 임베딩, 검색 + MMR 로 만든 참고 자료)를 미리 돌려서
+embedding_cache / context_cache 를 채워 둡니다.
+
+- 답변(answer_cache)은 데우지 않습니다: 키에 요청의 사주 프로필 해시가 들어가서, 프론트엔드가 보내는
+  개인 사주(생년월일시, 8글자, 대운)와 일치하는 답변을 미리 만들 수 없기 때문 (LLM 생성 없음)
+- 배치 단위로 ContextAssembler.assemble_many 를 호출하고, 분당 배치 수(WARMUP_RPM)를 넘지 않게 쉬어 갑니다
+- 만료까지 다음 주기보다 오래 남은 항목은 건너뜀
+- WARMUP_INTERVAL_HOURS 마다 다시 실행하고, /ingest 후에는 trigger() 로 바로 다시 채움
+- 드릴다운 메뉴 질문처럼 추가로 데울 질문은 WARMUP_EXTRA_QUESTIONS 파일에 한 줄에 하나씩
+
+사용: python -m src.cache_warmer   (한 번 실행 후 통계 출력)
+"""
+
+import os
+import re
+import time
+import asyncio
+import threading
+
+from src.answer_cache import context_cache
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+GUIDED_QUESTIONS_PATH = os.getenv("WARMUP_QUESTIONS_PATH", os.path.join(BASE_DIR, "guided_questions.md"))
+WARMUP_EXTRA_QUESTIONS = os.getenv("WARMUP_EXTRA_QUESTIONS")
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "0") in ("1", "true", "True")
+WARMUP_INTERVAL_HOURS = float(os.getenv("WARMUP_INTERVAL_HOURS", "6"))
+WARMUP_BATCH_SIZE = int(os.getenv("WARMUP_BATCH_SIZE", "10"))
+WARMUP_RPM = int(os.getenv("WARMUP_RPM", "30"))  # 분당 임베딩 + 검색 배치 수
+
+_QUESTION_LINE = re.compile(r'^\s*\d+\.\s*"(.+)"\s*$')
+
+
+def load_question_catalog(path: str = GUIDED_QUESTIONS_PATH, extra_path: str = WARMUP_EXTRA_QUESTIONS):
+    """guided_questions.md 의 번호 매긴 질문 + 추가 질문 파일 (중복 제거, 순서 유지)."""
+    questions = []
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                match = _QUESTION_LINE.match(line)
+                if match:
+                    questions.append(match.group(1).strip())
+    if extra_path and os.path.exists(extra_path):
+        with open(extra_path, encoding="utf-8") as f:
+            questions.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+    return list(dict.fromkeys(questions))
+
+
+class CacheWarmer:
+    def __init__(self, brain, batch_size: int = WARMUP_BATCH_SIZE, rpm: int = WARMUP_RPM,
+                 interval_hours: float = WARMUP_INTERVAL_HOURS):
+        self.brain = brain
+        self.batch_size = max(1, batch_size)
+        self.rpm = max(1, rpm)
+        self.interval = interval_hours * 3600
+        self._wake = threading.Event()
+        self._running = threading.Lock()
+        self._thread = None
+        self.last_run = {}
+
+    def _is_fresh(self, assembler, question):
+        # 다음 주기 전에 만료될 항목은 미리 새로 만듭니다.
+        return context_cache.remaining(assembler.context_key(question)) > self.interval
+
+    async def run_once(self, questions=None):
+        """카탈로그 질문의 참고 자료를 한 번 채웁니다. 이미 다른 실행 중이면 건너뜁니다."""
+        assembler = self.brain.assembler
+        if not assembler or not self._running.acquire(blocking=False):
+            return {"skipped": True}
+        try:
+            questions = questions or load_question_catalog()
+            started = time.time()
+            todo = [q for q in questions if not self._is_fresh(assembler, q)]
+            stats = {"questions": len(questions), "warmed": 0, "fresh": len(questions) - len(todo), "errors": 0}
+            for i in range(0, len(todo), self.batch_size):
+                batch = todo[i:i + self.batch_size]
+                batch_started = time.monotonic()
+                try:
+                    await asyncio.to_thread(assembler.assemble_many, batch)
+                    stats["warmed"] += len(batch)
+                except Exception as e:
+                    print(f"⚠️ Cache warm-up batch failed: {e}")
+                    stats["errors"] += len(batch)
+                # 분당 rpm 배치를 넘지 않도록 쉬어 갑니다 (질의용 임베딩 쿼터를 남겨 둠).
+                await asyncio.sleep(max(0.0, 60 / self.rpm - (time.monotonic() - batch_started)))
+            stats["seconds"] = round(time.time() - started, 1)
+            self.last_run = stats
+            print(f"🔥 Cache warm-up done: {stats}")
+            return stats
+        finally:
+            self._running.release()
+
+    def trigger(self):
+        """/ingest 후처럼 바로 다시 채워야 할 때 스케줄 스레드를 깨웁니다."""
+        self._wake.set()
+
+    def _loop(self):
+        while True:
+            try:
+                asyncio.run(self.run_once())
+            except Exception as e:
+                print(f"⚠️ Cache warm-up failed: {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def start(self):
+        """백그라운드 스케줄 시작 (프로세스당 한 번)."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="cache-warmer", daemon=True)
+            self._thread.start()
+        return self._thread
+
+
+if __name__ == "__main__":
+    from src.rag_chain import MyeongshimBrain
+    from src.answer_cache import cache_stats
+
+    warmer = CacheWarmer(MyeongshimBrain())
+    asyncio.run(warmer.run_once())
+    print(cache_stats())
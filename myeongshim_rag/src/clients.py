@@ -0,0 +1,162 @@
+"""
+Shared Clients
+Supabase / Gemini 클라이언트를 프로세스 전체에서 하나씩만 만들어 재사용합니다.
+
+- Supabase: httpx 커넥션 풀(keep-alive, HTTP/2)을 모든 스레드가 공유
+- genai.configure 는 한 번만 호출하고 GenerativeModel 은 모델 이름별로 캐시
+- 엔드포인트별 지연 시간 통계(client_stats): 연결 실패, 타임아웃도 오류로 기록
+- 비동기 Supabase 클라이언트(get_async_supabase)는 호출하는 곳이 없어 일부러 두지 않음.
+  async 경로가 생기면 같은 풀 설정으로 AsyncClient 를 만들어 추가
+"""
+
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+HTTP_KEEPALIVE = int(os.getenv("HTTP_KEEPALIVE", "10"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "1") not in ("0", "false", "False")
+
+_lock = threading.Lock()
+_sync_clients = {}
+_models = {}
+_genai_configured = False
+
+
+class LatencyStats:
+    """엔드포인트별 호출 수, 오류 수, 평균/최대 지연 시간(ms)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, name: str, seconds: float, ok: bool = True):
+        with self._lock:
+            s = self._stats.setdefault(name, {"count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+            ms = seconds * 1000
+            s["count"] += 1
+            s["errors"] += 0 if ok else 1
+            s["total_ms"] += ms
+            s["max_ms"] = max(s["max_ms"], ms)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                name: {
+                    "count": s["count"],
+                    "errors": s["errors"],
+                    "avg_ms": round(s["total_ms"] / s["count"], 2) if s["count"] else 0.0,
+                    "max_ms": round(s["max_ms"], 2),
+                }
+                for name, s in sorted(self._stats.items())
+            }
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+client_stats = LatencyStats()
+
+
+def _endpoint_name(request: httpx.Request) -> str:
+    # /rest/v1/chat_messages?select=... -> "GET /rest/v1/chat_messages"
+    parts = request.url.path.strip("/").split("/")[:3]
+    return f"{request.method} /{'/'.join(parts)}"
+
+
+class _TimedTransport(httpx.BaseTransport):
+    """요청마다 지연 시간을 기록하는 트랜스포트. 응답이 없는 경우(ConnectError, 타임아웃)도 오류로 남습니다."""
+
+    def __init__(self, transport: httpx.BaseTransport):
+        self._transport = transport
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        ok = False
+        try:
+            response = self._transport.handle_request(request)
+            ok = response.status_code < 500
+            return response
+        finally:
+            client_stats.record(_endpoint_name(request), time.perf_counter() - started, ok)
+
+    def close(self):
+        self._transport.close()
+
+
+def _limits():
+    return httpx.Limits(max_connections=HTTP_POOL_SIZE, max_keepalive_connections=HTTP_KEEPALIVE)
+
+
+def _timeout():
+    return httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+
+
+def _supabase_env(url, key):
+    url = url or os.getenv("SUPABASE_URL") or os.getenv("NEXT_PUBLIC_SUPABASE_URL")
+    key = key or os.getenv("SUPABASE_SERVICE_KEY") or os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+    if not url or not key:
+        raise ValueError("Supabase Environment Variables missing")
+    return url, key
+
+
+def get_supabase(url: str = None, key: str = None):
+    """프로세스 공용 Supabase 클라이언트 (스레드 간 커넥션 풀 공유)."""
+    from supabase import create_client
+    from supabase.lib.client_options import SyncClientOptions
+
+    url, key = _supabase_env(url, key)
+    with _lock:
+        client = _sync_clients.get((url, key))
+        if client is None:
+            transport = _TimedTransport(httpx.HTTPTransport(http2=HTTP2_ENABLED, limits=_limits()))
+            http = httpx.Client(transport=transport, timeout=_timeout())
+            options = SyncClientOptions(httpx_client=http, postgrest_client_timeout=_timeout())
+            client = create_client(url, key, options=options)
+            _sync_clients[(url, key)] = client
+        return client
+
+
+def configure_genai(api_key: str = None):
+    """genai.configure 를 프로세스당 한 번만 호출합니다. (gRPC 채널 재사용)"""
+    global _genai_configured
+    import google.generativeai as genai
+
+    with _lock:
+        if not _genai_configured:
+            api_key = api_key or os.getenv("GEMINI_API_KEY")
+            if not api_key:
+                raise ValueError("GEMINI_API_KEY missing")
+            genai.configure(api_key=api_key)
+            _genai_configured = True
+    return genai
+
+
+def get_model(name: str = "gemini-2.5-flash"):
+    """모델 이름별로 캐시된 GenerativeModel."""
+    genai = configure_genai()
+    with _lock:
+        if name not in _models:
+            _models[name] = genai.GenerativeModel(name)
+        return _models[name]
+
+
+@contextmanager
+def timed(name: str):
+    """SDK 호출처럼 httpx 훅을 쓸 수 없는 경우의 지연 시간 기록용."""
+    started = time.perf_counter()
+    ok = False
+    try:
+        yield
+        ok = True
+    finally:
+        client_stats.record(name, time.perf_counter() - started, ok)
@@ -0,0 +1,205 @@
+"""
+Context Assembler
+RetrievalQA "stuff" 체인 대신, 후보를 넉넉히 가져와 MMR 로 중복을 걸러내고
+토큰 예산 안에서 문장 단위로 참고 자료를 구성합니다.
+"""
+
+import os
+import re
+import hashlib
+
+import numpy as np
+
+from src.answer_cache import embedding_cache, context_cache, normalize_question
+from src.profiling import stage, note
+
+FETCH_K = int(os.getenv("RAG_FETCH_K", "20"))
+TOP_K = int(os.getenv("RAG_TOP_K", "6"))
+MMR_LAMBDA = float(os.getenv("RAG_MMR_LAMBDA", "0.6"))
+DEDUP_THRESHOLD = float(os.getenv("RAG_DEDUP_THRESHOLD", "0.95"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKENS", "1500"))
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?。])\s+|\n+")
+
+
+def estimate_tokens(text: str) -> int:
+    """대략적인 토큰 수 추정 (한글 등 비ASCII 문자는 1자당 1토큰, ASCII 는 4자당 1토큰)."""
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return non_ascii + (len(text) - non_ascii + 3) // 4
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def mmr_select(query_vec, cand_vecs, k: int = TOP_K, lambda_mult: float = MMR_LAMBDA,
+               dedup_threshold: float = DEDUP_THRESHOLD):
+    """
+    Maximal Marginal Relevance 로 k 개의 후보 인덱스를 고릅니다.
+    이미 선택된 청크와 코사인 유사도가 dedup_threshold 이상인 후보(중복 PDF 등)는 제외합니다.
+    """
+    cand = _normalize(np.asarray(cand_vecs, dtype=np.float32))
+    if len(cand) == 0:
+        return []
+    query = _normalize(np.asarray(query_vec, dtype=np.float32))
+
+    relevance = cand @ query
+    pairwise = cand @ cand.T
+
+    selected = []
+    max_sim = np.full(len(cand), -np.inf, dtype=np.float32)
+    available = np.ones(len(cand), dtype=bool)
+
+    while len(selected) < k and available.any():
+        redundancy = np.where(np.isinf(max_sim), 0.0, max_sim)
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        max_sim = np.maximum(max_sim, pairwise[best])
+        available &= max_sim < dedup_threshold
+
+    return selected
+
+
+def pack_sentences(chunks, token_budget: int = CONTEXT_TOKEN_BUDGET):
+    """
+    선택된 청크를 순서대로 문장 단위로 나누어 토큰 예산까지 채웁니다.
+    여러 청크에 반복되는 문장은 한 번만 넣고, 남은 예산보다 긴 문장은 건너뛰고 다음 문장을 시도합니다.
+    블록에는 문장을 낸 청크(chunk)를 함께 담습니다.
+    """
+    seen = set()
+    used = 0
+    blocks = []
+    for chunk in chunks:
+        kept = []
+        for sentence in _SENTENCE_SPLIT.split(chunk["content"]):
+            sentence = sentence.strip()
+            if not sentence:
+                continue
+            key = hashlib.md5(re.sub(r"\s+", "", sentence).encode("utf-8")).digest()
+            if key in seen:
+                continue
+            cost = estimate_tokens(sentence)
+            if used + cost > token_budget:
+                continue
+            seen.add(key)
+            kept.append(sentence)
+            used += cost
+        if kept:
+            blocks.append({"source": chunk["source"], "text": " ".join(kept), "chunk": chunk})
+        if used >= token_budget:
+            break
+    return blocks, used
+
+
+class ContextAssembler:
+    def __init__(self, vectorstore, embeddings, fetch_k: int = FETCH_K, k: int = TOP_K,
+                 lambda_mult: float = MMR_LAMBDA, token_budget: int = CONTEXT_TOKEN_BUDGET,
+                 index=None):
+        self.vectorstore = vectorstore
+        self.index = index  # 선택: QuantizedIndex / PartitionedIndex / PgVectorIndex
+        self.embeddings = embeddings
+        self.fetch_k = fetch_k
+        self.k = k
+        self.lambda_mult = lambda_mult
+        self.token_budget = token_budget
+
+    def fetch_candidates_batch(self, query_vecs, questions=None):
+        """
+        여러 질의 벡터의 후보를 한 번의 행렬 검색으로 가져옵니다.
+        도메인 라우팅 인덱스에는 질문 문자열도 넘깁니다.
+        반환값: [(후보 청크 목록, float32 벡터), ...] (질의 순서 유지)
+        """
+        if getattr(self.index, "routes_queries", False):
+            return self.index.query_batch(query_vecs, self.fetch_k, questions=questions)
+        if self.index is not None:
+            return self.index.query_batch(query_vecs, self.fetch_k)
+
+        res = self.vectorstore._collection.query(
+            query_embeddings=[np.asarray(v, dtype=np.float32).tolist() for v in query_vecs],
+            n_results=self.fetch_k,
+            include=["documents", "metadatas", "embeddings"],
+        )
+        results = []
+        for i in range(len(query_vecs)):
+            documents = res["documents"][i] if res.get("documents") else []
+            metadatas = res["metadatas"][i] if res.get("metadatas") else [{}] * len(documents)
+            vectors = res["embeddings"][i] if res.get("embeddings") is not None else []
+
+            candidates = []
+            for doc, meta in zip(documents, metadatas):
+                meta = meta or {}
+                candidates.append({"content": doc, "source": meta.get("source", "Unknown"), "metadata": meta})
+            results.append((candidates, np.asarray(vectors, dtype=np.float32)))
+        return results
+
+    def fetch_candidates(self, query_vec, question: str = None):
+        """저장된 벡터까지 포함해 fetch_k 개의 후보를 가져옵니다."""
+        return self.fetch_candidates_batch([query_vec], [question] if question else None)[0]
+
+    def _build_context(self, query_vec, candidates, vectors):
+        if not candidates:
+            return "", []
+
+        with stage("mmr_pack"):
+            order = mmr_select(query_vec, vectors, k=self.k, lambda_mult=self.lambda_mult)
+            chosen = [candidates[i] for i in order]
+            blocks, used = pack_sentences(chosen, self.token_budget)
+        note(candidates=len(candidates), chunks=len(chosen), context_tokens=used)
+
+        context = "\n\n".join(f"[출처: {os.path.basename(b['source'])}]\n{b['text']}" for b in blocks)
+        # 출처로는 실제로 문장이 들어간 청크만 보고합니다.
+        return context, [b["chunk"] for b in blocks]
+
+    def embed_queries(self, questions):
+        """질의 임베딩 (캐시에 없는 것만 한 번의 호출로 임베딩). 캐시 키에 모델을 넣어 공간이 섞이지 않게 합니다."""
+        model = getattr(self.embeddings, "model", "")
+        vectors = [embedding_cache.get(f"{model}|{q}") for q in questions]
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if len(missing) == 1:
+            new = [self.embeddings.embed_query(questions[missing[0]])]
+        elif missing:
+            new = self.embeddings.embed_documents([questions[i] for i in missing], task_type="RETRIEVAL_QUERY")
+        else:
+            new = []
+        for i, vec in zip(missing, new):
+            vectors[i] = np.asarray(vec, dtype=np.float32)
+            embedding_cache.set(f"{model}|{questions[i]}", vectors[i])
+        return np.asarray(vectors, dtype=np.float32)
+
+    def context_key(self, question: str) -> str:
+        """참고 자료 캐시 키. 사주 정보와 무관하므로 어떤 사용자의 같은 질문이든 공유합니다."""
+        return f"{getattr(self.embeddings, 'model', '')}|{normalize_question(question)}"
+
+    def assemble(self, question: str):
+        """
+        질문에 대한 참고 자료 문자열과 사용된 청크 목록을 반환합니다.
+        """
+        return self.assemble_many([question])[0]
+
+    def assemble_many(self, questions):
+        """
+        여러 질문을 한 번의 임베딩 호출과 한 번의 검색으로 처리합니다. (context_cache 에 있는 질문은 건너뜀)
+        반환값: [(context, chunks), ...] (질문 순서 유지)
+        """
+        if not questions:
+            return []
+        questions = list(questions)
+        results = [context_cache.get(self.context_key(q)) for q in questions]
+        missing = [i for i, r in enumerate(results) if r is None]
+        note(context_cache_hits=len(questions) - len(missing))
+        if not missing:
+            return results
+
+        with stage("embed"):
+            query_vecs = self.embed_queries([questions[i] for i in missing])
+        with stage("search"):
+            fetched = self.fetch_candidates_batch(query_vecs, [questions[i] for i in missing])
+        for i, query_vec, (candidates, vectors) in zip(missing, query_vecs, fetched):
+            results[i] = self._build_context(query_vec, candidates, vectors)
+            if results[i][1]:
+                context_cache.set(self.context_key(questions[i]), results[i])
+        return results
@@ -0,0 +1,81 @@
+"""
+Domain Router
+지식 코퍼스를 도메인(명리 / 심리·코칭 / 주역·64키 / 일반 / 기타)으로 나누고,
+질문이 어느 도메인을 검색해야 하는지 고릅니다.
+
+- 태깅: 파일 이름 키워드로 결정 (규칙만 바꾸면 재임베딩 없이 파티션을 다시 만들 수 있음)
+- 라우팅: 질문 키워드 + 도메인 중심 벡터(centroid) 유사도
+- RAG_EXCLUDED_DOMAINS 의 도메인(기본: 기타 = 창업/의료법 등)은 검색하지 않음
+"""
+
+import os
+
+import numpy as np
+
+# 파일 이름 키워드 -> 도메인 (위에서부터 먼저 맞는 규칙 사용)
+SOURCE_RULES = [
+    ("other", ["창업", "의료법"]),
+    ("iching", ["주역", "64책", "64괘", "64키", "GOLDENPATH"]),  # 맨 "64" 는 연도/나이와 겹침
+    ("myeongri", ["명리", "사주", "격국", "만세력", "중급", "실증철학"]),
+    ("psychology", ["인지행동", "코칭", "심리"]),
+]
+DEFAULT_DOMAIN = "general"
+
+# 질문 키워드 -> 도메인
+QUERY_KEYWORDS = {
+    "myeongri": ["사주", "명리", "팔자", "일간", "일주", "천간", "지지", "오행", "십성", "십신", "격국", "용신",
+                 "대운", "세운", "삼합", "육합", "방합", "지지충", "원진", "지장간", "십이운성", "궁합", "재성", "관성",
+                 "인성", "식상", "비겁"],
+    "psychology": ["불안", "우울", "감정", "트라우마", "인지", "자동적 사고", "CBT", "코칭", "상담", "스트레스",
+                   "무기력", "분노", "자존감", "호흡"],
+    "iching": ["주역", "괘", "64키", "64 키", "유전자 키", "Gene Key", "골든패스", "golden path"],
+}
+
+EXCLUDED_DOMAINS = {d.strip() for d in os.getenv("RAG_EXCLUDED_DOMAINS", "other").split(",") if d.strip()}
+ROUTE_MAX_DOMAINS = int(os.getenv("RAG_ROUTE_MAX_DOMAINS", "2"))
+ROUTE_MARGIN = float(os.getenv("RAG_ROUTE_MARGIN", "0.05"))
+
+
+def classify_source(source: str) -> str:
+    """청크 출처(파일 경로)의 도메인."""
+    name = os.path.basename(source or "")
+    for domain, keywords in SOURCE_RULES:
+        if any(k.lower() in name.lower() for k in keywords):
+            return domain
+    return DEFAULT_DOMAIN
+
+
+class QueryRouter:
+    def __init__(self, centroids: dict, max_domains: int = ROUTE_MAX_DOMAINS, margin: float = ROUTE_MARGIN,
+                 excluded=EXCLUDED_DOMAINS):
+        self.domains = [d for d in centroids if d not in excluded]
+        self.max_domains = max(1, max_domains)
+        self.margin = margin
+        if self.domains:
+            c = np.asarray([centroids[d] for d in self.domains], dtype=np.float32)
+            self.centroids = c / np.maximum(np.linalg.norm(c, axis=1, keepdims=True), 1e-12)
+        else:
+            self.centroids = np.empty((0, 0), dtype=np.float32)
+
+    def keyword_domains(self, question: str):
+        text = (question or "").lower()
+        return [d for d in self.domains if any(k.lower() in text for k in QUERY_KEYWORDS.get(d, []))]
+
+    def route(self, question: str, query_vec):
+        """
+        검색할 도메인 목록. 키워드로 걸린 도메인을 먼저 넣고,
+        centroid 유사도가 최고점에서 margin 안쪽인 도메인을 max_domains 까지 채웁니다.
+        """
+        if not self.domains:
+            return []
+        chosen = self.keyword_domains(question)[:self.max_domains]
+
+        q = np.asarray(query_vec, dtype=np.float32)
+        scores = self.centroids @ (q / max(float(np.linalg.norm(q)), 1e-12))
+        best = float(scores.max())
+        for i in np.argsort(-scores):
+            if len(chosen) >= self.max_domains or scores[i] < best - self.margin:
+                break
+            if self.domains[i] not in chosen:
+                chosen.append(self.domains[i])
+        return chosen or list(self.domains)
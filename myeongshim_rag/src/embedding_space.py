@@ -0,0 +1,365 @@
+"""
+Embedding Space
+Chroma 지식 베이스의 임베딩 공간(모델 + 차원 + 컬렉션)을 버전별로 관리합니다.
+
+- embedding_spaces.json 에 공간별 모델, 차원, 컬렉션, 상태(active | building | ready | retired)를 기록하고,
+  질의는 항상 active 공간 하나만 사용 (다른 모델의 벡터가 섞이지 않도록 컬렉션 메타데이터도 확인)
+- EmbeddingMigrator: 새 모델 공간으로 청크를 백그라운드에서 다시 임베딩 (분당 MIGRATION_RPM 배치로 제한)
+  그동안 질의는 기존 공간으로 가고, EMBED_DUAL_READ_RATE 비율만큼 새 공간에도 같은 질의를 보내
+  상위 청크 겹침률을 기록 (dual-read)
+- 모든 청크가 옮겨지면 파생 인덱스(RAG_INDEX_FORMAT)를 새 공간용으로 만든 뒤
+  레지스트리 파일을 os.replace 로 한 번에 바꿔 전환 (MyeongshimBrain 은 전환을 알아채면 백그라운드에서 다시 로드)
+- 이전 공간은 retired 로 남겨 두어 cutover 로 되돌릴 수 있음
+
+사용: python -m src.embedding_space                      (공간 목록)
+      python -m src.embedding_space migrate <model>      (예: models/text-embedding-004, 끝나면 전환)
+      python -m src.embedding_space cutover <space>      (ready / retired 공간으로 수동 전환)
+"""
+
+import os
+import json
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+SPACES_PATH = os.path.join(BASE_DIR, "embedding_spaces.json")
+EMBED_MODEL = os.getenv("RAG_EMBED_MODEL", "models/embedding-001")
+LEGACY_COLLECTION = "langchain"  # langchain_chroma 기본 컬렉션 (레지스트리 이전에 만든 DB)
+MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "50"))
+MIGRATION_RPM = int(os.getenv("MIGRATION_RPM", "30"))  # 분당 임베딩 배치 호출 수
+EMBED_DUAL_READ_RATE = float(os.getenv("EMBED_DUAL_READ_RATE", "0.1"))
+
+_lock = threading.Lock()
+_versions = {}  # 레지스트리 경로 -> (mtime, 버전)
+
+
+def space_name(model: str) -> str:
+    """'models/text-embedding-004' -> 'text-embedding-004'"""
+    return model.split("/")[-1]
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def load_spaces(path: str = SPACES_PATH):
+    """레지스트리를 읽습니다. 없으면 기존 DB(langchain 컬렉션, RAG_EMBED_MODEL)를 active 공간으로 봅니다."""
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    name = space_name(EMBED_MODEL)
+    return {
+        "active": name,
+        "generation": 0,
+        "spaces": {
+            name: {"model": EMBED_MODEL, "dim": None, "collection": LEGACY_COLLECTION, "suffix": "",
+                   "status": "active", "created_at": _now()},
+        },
+    }
+
+
+def save_spaces(spaces, path: str = SPACES_PATH):
+    """임시 파일에 쓰고 os.replace 로 바꿉니다. 읽는 쪽은 항상 이전 또는 새 레지스트리 전체를 봅니다."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(spaces, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+
+def active_space(spaces=None):
+    spaces = spaces or load_spaces()
+    return spaces["active"], spaces["spaces"][spaces["active"]]
+
+
+def space_path(base_path: str, space) -> str:
+    """공간별 파생 인덱스 경로 (기존 공간은 suffix 가 없어 예전 경로 그대로)."""
+    return base_path + space.get("suffix", "")
+
+
+def registry_version(path: str = SPACES_PATH):
+    """
+    전환 감지용 (active 공간, 전환 시각). cutover 때만 바뀌고, 마이그레이션 시작, 차원 기록, ready 표시처럼
+    다른 항목만 바꾼 저장은 무시합니다. 질의마다 부르므로 파일 mtime 이 그대로면 다시 읽지 않습니다.
+    """
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+    cached = _versions.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    spaces = load_spaces(path)
+    active = spaces["active"]
+    version = (active, spaces["spaces"][active].get("activated_at"))
+    _versions[path] = (mtime, version)
+    return version
+
+
+def make_embeddings(model: str):
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+    return GoogleGenerativeAIEmbeddings(model=model)
+
+
+def collection_metadata(space):
+    return {"embedding_model": space["model"]}
+
+
+def check_collection(collection, space):
+    """컬렉션에 기록된 모델이 공간의 모델과 다르면 ValueError (섞인 벡터로 조용히 검색이 망가지는 것을 막음)."""
+    recorded = (collection.metadata or {}).get("embedding_model")
+    if recorded and recorded != space["model"]:
+        raise ValueError(
+            f"Collection {collection.name} holds {recorded} vectors but space expects {space['model']}"
+        )
+
+
+def record_dim(name: str, collection, path: str = SPACES_PATH):
+    """컬렉션의 벡터 차원을 레지스트리에 기록합니다."""
+    sample = collection.get(limit=1, include=["embeddings"])["embeddings"]
+    if sample is None or len(sample) == 0:
+        return None
+    dim = len(sample[0])
+    with _lock:
+        spaces = load_spaces(path)
+        spaces["spaces"][name]["dim"] = dim
+        save_spaces(spaces, path)
+    return dim
+
+
+def reset_after_ingest(path: str = SPACES_PATH):
+    """
+    ingest 는 DB 를 지우고 active 공간만 새로 만듭니다. 다른 공간은 비었으므로 building 으로 돌리고
+    generation 을 올려 진행 중인 마이그레이션이 처음부터 다시 비교하게 합니다.
+    """
+    with _lock:
+        spaces = load_spaces(path)
+        for name, space in spaces["spaces"].items():
+            if name != spaces["active"] and space["status"] in ("building", "ready"):
+                space["status"] = "building"
+            elif name != spaces["active"]:
+                space["status"] = "dropped"
+        spaces["generation"] += 1
+        save_spaces(spaces, path)
+        return spaces
+
+
+def read_collection(db_path: str, collection_name: str = None):
+    """
+    한 공간의 Chroma 컬렉션에서 (벡터, 문서, 메타데이터)를 읽습니다. 파생 인덱스 빌드가 함께 씁니다.
+    collection_name 이 없으면 active 공간의 컬렉션 (다른 모델의 벡터를 섞지 않도록 여러 컬렉션을 합치지 않음)
+    """
+    import chromadb
+
+    if collection_name is None:
+        collection_name = active_space()[1]["collection"]
+    client = chromadb.PersistentClient(path=db_path)
+    data = client.get_collection(collection_name).get(include=["documents", "metadatas", "embeddings"])
+    documents = data["documents"] or []
+    vectors = list(data["embeddings"]) if documents else []
+    metadatas = data["metadatas"] or [{}] * len(documents)
+    return vectors, documents, metadatas
+
+
+def build_space_index(db_path: str, space, index_format: str = None):
+    """RAG_INDEX_FORMAT 에 맞는 파생 인덱스를 이 공간의 컬렉션만으로 만듭니다."""
+    from src.quantized_index import build_index_from_chroma, INDEX_FORMAT, INDEX_PATH
+
+    index_format = index_format or INDEX_FORMAT
+    collection = space["collection"]
+    if index_format in ("float16", "int8"):
+        path = space_path(INDEX_PATH, space)
+        build_index_from_chroma(db_path, path, index_format, collection_name=collection)
+        print(f"Built {index_format} quantized index at {path}")
+    elif index_format == "partitioned":
+        from src.partitioned_index import build_partitions_from_chroma, PARTITION_PATH, PARTITION_DTYPE
+        for d in build_partitions_from_chroma(db_path, space_path(PARTITION_PATH, space), PARTITION_DTYPE,
+                                              collection_name=collection):
+            print(f"Built partition {d['name']} ({d['count']} chunks)")
+    elif index_format == "sharded":
+        from src.sharded_index import build_shards_from_chroma, SHARD_PATH
+        for s in build_shards_from_chroma(db_path, space_path(SHARD_PATH, space), collection_name=collection):
+            print(f"Built {s['name']} ({s['count']} chunks)")
+    elif index_format == "pgvector":
+        from src.pg_retriever import load_from_chroma, PGVECTOR_TABLE
+        table = PGVECTOR_TABLE + space.get("suffix", "").replace("-", "_")
+        print(f"Loaded {load_from_chroma(db_path, table=table, collection_name=collection)} chunks "
+              f"into pgvector table {table}")
+
+
+def cutover(name: str, db_path: str, path: str = SPACES_PATH, build_index: bool = True):
+    """파생 인덱스를 먼저 만든 뒤 레지스트리의 active 를 한 번에 바꿉니다."""
+    spaces = load_spaces(path)
+    space = spaces["spaces"][name]
+    if space["status"] not in ("ready", "retired", "active"):
+        raise ValueError(f"Space {name} is {space['status']}, not ready for cutover")
+    if build_index:
+        build_space_index(db_path, space)
+    with _lock:
+        spaces = load_spaces(path)
+        previous = spaces["active"]
+        if previous != name:
+            spaces["spaces"][previous]["status"] = "retired"
+        spaces["spaces"][name]["status"] = "active"
+        spaces["spaces"][name]["activated_at"] = _now()
+        spaces["active"] = name
+        spaces["generation"] += 1
+        save_spaces(spaces, path)
+    print(f"🔀 Embedding space cutover: {previous} -> {name}")
+    return spaces
+
+
+class EmbeddingMigrator:
+    """active 공간의 청크를 새 모델 공간으로 옮기는 백그라운드 작업 (프로세스당 하나)."""
+
+    def __init__(self, db_path: str, path: str = SPACES_PATH, batch_size: int = MIGRATION_BATCH_SIZE,
+                 rpm: int = MIGRATION_RPM, dual_read_rate: float = EMBED_DUAL_READ_RATE):
+        self.db_path = db_path
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self.rpm = max(1, rpm)
+        self.dual_read_rate = dual_read_rate
+        self.target = None
+        self.progress = {}
+        self.dual_read = {"reads": 0, "overlap": 0.0}
+        self._stop = threading.Event()
+        self._thread = None
+        self._shadow = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed-dual-read")
+        self._target_embeddings = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, model: str, auto_cutover: bool = True):
+        """model 공간을 만들고(또는 이어서) 백그라운드 재임베딩을 시작합니다."""
+        name = space_name(model)
+        with _lock:
+            spaces = load_spaces(self.path)
+            if spaces["active"] == name:
+                raise ValueError(f"{name} is already the active embedding space")
+            space = spaces["spaces"].setdefault(name, {
+                "model": model, "dim": None, "collection": f"space_{name}", "suffix": f"-{name}",
+                "created_at": _now(),
+            })
+            space["status"] = "building"
+            save_spaces(spaces, self.path)
+        if self.running:
+            return False
+        self.target = name
+        self._target_embeddings = make_embeddings(model)
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, args=(name, auto_cutover), name="embedding-migrator", daemon=True
+        )
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+
+    def _collections(self, name):
+        import chromadb
+
+        spaces = load_spaces(self.path)
+        source_space = spaces["spaces"][spaces["active"]]
+        target_space = spaces["spaces"][name]
+        client = chromadb.PersistentClient(path=self.db_path)
+        source = client.get_collection(source_space["collection"])
+        target = client.get_or_create_collection(target_space["collection"], metadata=collection_metadata(target_space))
+        check_collection(target, target_space)
+        return spaces["generation"], source, target
+
+    def _run(self, name: str, auto_cutover: bool):
+        interval = 60.0 / self.rpm
+        while not self._stop.is_set():
+            try:
+                generation, source, target = self._collections(name)
+                source_ids = source.get(include=[])["ids"]
+                done = set(target.get(include=[])["ids"])
+                missing = [i for i in source_ids if i not in done]
+                self.progress = {"total": len(source_ids), "embedded": len(source_ids) - len(missing),
+                                 "generation": generation}
+                if not missing:
+                    record_dim(name, target, self.path)
+                    with _lock:
+                        spaces = load_spaces(self.path)
+                        if spaces["generation"] != generation:
+                            continue  # ingest 가 그 사이 DB 를 다시 만들었으면 처음부터 다시 비교
+                        spaces["spaces"][name]["status"] = "ready"
+                        save_spaces(spaces, self.path)
+                    if auto_cutover:
+                        cutover(name, self.db_path, self.path)
+                    return
+
+                for start in range(0, len(missing), self.batch_size):
+                    if self._stop.is_set() or load_spaces(self.path)["generation"] != generation:
+                        break
+                    started = time.monotonic()
+                    batch = source.get(ids=missing[start:start + self.batch_size], include=["documents", "metadatas"])
+                    vectors = self._target_embeddings.embed_documents(batch["documents"])
+                    target.upsert(ids=batch["ids"], embeddings=vectors, documents=batch["documents"],
+                                  metadatas=batch["metadatas"])
+                    self.progress["embedded"] += len(batch["ids"])
+                    # 분당 rpm 배치를 넘지 않도록 쉬어 갑니다 (질의용 임베딩 쿼터를 남겨 둠).
+                    self._stop.wait(max(0.0, interval - (time.monotonic() - started)))
+            except Exception as e:
+                print(f"⚠️ Embedding migration step failed: {e}")
+                self._stop.wait(interval)
+
+    def maybe_dual_read(self, question: str, chunks):
+        """
+        마이그레이션 중 일부 질의를 새 공간에서도 검색해, 기존 공간 상위 청크와의 겹침률을 기록합니다.
+        응답 경로를 막지 않도록 별도 스레드에서 실행합니다.
+        """
+        if not self.running or not chunks or random.random() >= self.dual_read_rate:
+            return
+        self._shadow.submit(self._dual_read, question, [c["content"] for c in chunks])
+
+    def _dual_read(self, question: str, primary):
+        try:
+            _, _, target = self._collections(self.target)
+            vec = self._target_embeddings.embed_query(question)
+            found = target.query(query_embeddings=[vec], n_results=len(primary), include=["documents"])
+            overlap = len(set(primary) & set(found["documents"][0])) / len(primary)
+            reads = self.dual_read["reads"] + 1
+            self.dual_read = {
+                "reads": reads,
+                "overlap": round(self.dual_read["overlap"] + (overlap - self.dual_read["overlap"]) / reads, 3),
+            }
+        except Exception as e:
+            print(f"⚠️ Dual-read failed: {e}")
+
+    def status(self):
+        spaces = load_spaces(self.path)
+        progress = dict(self.progress)
+        if progress.get("total"):
+            progress["coverage"] = round(progress["embedded"] / progress["total"], 3)
+        return {
+            "active": spaces["active"],
+            "spaces": spaces["spaces"],
+            "migration": {"target": self.target, "running": self.running, **progress},
+            "dual_read": self.dual_read,
+        }
+
+
+if __name__ == "__main__":
+    import sys
+    from src.ingest import DB_PATH
+
+    if len(sys.argv) > 2 and sys.argv[1] == "migrate":
+        migrator = EmbeddingMigrator(DB_PATH, dual_read_rate=0)
+        migrator.start(sys.argv[2])
+        while migrator.running:
+            time.sleep(5)
+            print(migrator.status()["migration"])
+    elif len(sys.argv) > 2 and sys.argv[1] == "cutover":
+        cutover(sys.argv[2], DB_PATH)
+    else:
+        spaces = load_spaces()
+        for name, space in spaces["spaces"].items():
+            marker = "*" if name == spaces["active"] else " "
+            print(f"{marker} {name:<24} {space['status']:<8} dim={space['dim']} collection={space['collection']}")
@@ -0,0 +1,146 @@
+"""
+PDF 텍스트 추출 캐시
+파일 내용 해시(SHA-256)를 키로 페이지별 텍스트를 SQLite 에 zlib 압축해 저장합니다.
+myeongshim_rag/src/ingest.py 와 루트의 ingest_pdfs_supabase.py 가 같은 캐시를 사용하므로,
+재학습하거나 청크 설정만 바꿀 때는 PDF 파싱을 다시 하지 않습니다.
+myeongshim_rag/data 와 src/knowledge/docs 에 중복된 파일도 한 번만 추출됩니다.
+"""
+
+import os
+import json
+import zlib
+import sqlite3
+import hashlib
+import threading
+
+CACHE_PATH = os.getenv(
+    "EXTRACT_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "cache", "extract_cache.sqlite3"),
+)
+
+# 추출기 동작이 바뀌면 올려서 기존 캐시를 무효화합니다.
+EXTRACTOR_VERSION = "pypdf-1"
+
+_SCHEMA = """
+create table if not exists files (
+  path text primary key,
+  size integer not null,
+  mtime_ns integer not null,
+  sha256 text not null
+);
+create table if not exists documents (
+  sha256 text not null,
+  extractor text not null,
+  num_pages integer not null,
+  metadata text not null,
+  primary key (sha256, extractor)
+);
+create table if not exists pages (
+  sha256 text not null,
+  extractor text not null,
+  page integer not null,
+  content blob not null,
+  primary key (sha256, extractor, page)
+);
+"""
+
+
+def file_sha256(file_path: str) -> str:
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _extract_pdf(file_path: str):
+    from pypdf import PdfReader
+
+    reader = PdfReader(file_path)
+    pages = [page.extract_text() or "" for page in reader.pages]
+    metadata = {}
+    if reader.metadata:
+        for key in ("/Title", "/Author", "/CreationDate"):
+            if reader.metadata.get(key):
+                metadata[key.lstrip("/").lower()] = str(reader.metadata.get(key))
+    return pages, metadata
+
+
+class ExtractCache:
+    def __init__(self, path: str = CACHE_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        self.hits = 0
+        self.misses = 0
+
+    def content_hash(self, file_path: str) -> str:
+        """(경로, 크기, 수정 시각)이 같으면 이전에 계산한 해시를 재사용합니다."""
+        st = os.stat(file_path)
+        abs_path = os.path.abspath(file_path)
+        with self._lock:
+            row = self._conn.execute(
+                "select size, mtime_ns, sha256 from files where path = ?", (abs_path,)
+            ).fetchone()
+        if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            return row[2]
+
+        digest = file_sha256(file_path)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "insert or replace into files (path, size, mtime_ns, sha256) values (?, ?, ?, ?)",
+                (abs_path, st.st_size, st.st_mtime_ns, digest),
+            )
+        return digest
+
+    def _load(self, digest: str):
+        with self._lock:
+            doc = self._conn.execute(
+                "select num_pages, metadata from documents where sha256 = ? and extractor = ?",
+                (digest, EXTRACTOR_VERSION),
+            ).fetchone()
+            if not doc:
+                return None
+            rows = self._conn.execute(
+                "select content from pages where sha256 = ? and extractor = ? order by page",
+                (digest, EXTRACTOR_VERSION),
+            ).fetchall()
+        if len(rows) != doc[0]:
+            return None
+        return [zlib.decompress(r[0]).decode("utf-8") for r in rows], json.loads(doc[1])
+
+    def _store(self, digest: str, pages, metadata):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "delete from pages where sha256 = ? and extractor = ?", (digest, EXTRACTOR_VERSION)
+            )
+            self._conn.executemany(
+                "insert into pages (sha256, extractor, page, content) values (?, ?, ?, ?)",
+                [(digest, EXTRACTOR_VERSION, i, zlib.compress(text.encode("utf-8"))) for i, text in enumerate(pages)],
+            )
+            self._conn.execute(
+                "insert or replace into documents (sha256, extractor, num_pages, metadata) values (?, ?, ?, ?)",
+                (digest, EXTRACTOR_VERSION, len(pages), json.dumps(metadata, ensure_ascii=False)),
+            )
+
+    def get_pdf_pages(self, file_path: str):
+        """
+        PDF 의 페이지별 텍스트와 메타데이터를 반환합니다. 캐시에 없을 때만 파싱합니다.
+        반환값: (pages: list[str], metadata: dict)
+        """
+        digest = self.content_hash(file_path)
+        cached = self._load(digest)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        self.misses += 1
+        pages, metadata = _extract_pdf(file_path)
+        metadata["sha256"] = digest
+        self._store(digest, pages, metadata)
+        return pages, metadata
+
+    def close(self):
+        self._conn.close()
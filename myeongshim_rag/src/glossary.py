@@ -0,0 +1,260 @@
+"""
+Glossary
+용어 사전과 Aho–Corasick 매처입니다.
+
+- data/code_term_definition.txt 의 용어 매핑(다크코드, 뉴럴코드, 메타코드, 라이프 코드)과
+  강의 자료에서 찾은 명리 용어 정의 문장("지장간이란 ... 말한다")으로 ingest 때 사전을 만듦
+- "지장간이 뭐예요?" 같은 순수 정의 질문은 LLM 없이 사전으로 바로 답함
+- 다른 질문에서도 언급된 용어의 정의를 참고 자료 앞에 붙임
+"""
+
+import os
+import re
+import json
+from collections import deque
+
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+GLOSSARY_PATH = os.path.join(BASE_DIR, "glossary.json")
+GLOSSARY_SOURCE = os.path.join(BASE_DIR, "data", "code_term_definition.txt")
+GLOSSARY_MAX_CONTEXT_TERMS = int(os.getenv("GLOSSARY_MAX_CONTEXT_TERMS", "3"))
+
+# 강의 자료에서 정의 문장을 찾을 명리 용어
+MYEONGRI_TERMS = [
+    "사주", "팔자", "음양", "오행", "십이운성", "지장간", "원진", "삼합", "육합", "방합", "반합", "지지충",
+    "격국", "용신", "희신", "기신", "대운", "세운", "십성", "십신", "천간", "지지", "일간", "일주", "비견",
+    "겁재", "식신", "상관", "편재", "정재", "편관", "정관", "편인", "정인", "조후", "억부", "합화", "공망",
+    "신살", "도화살", "역마살", "화개살", "양인", "건록", "장생", "관대", "제왕",
+]
+# 한 글자 용어(충, 형, 파, 해 ...)는 일반 단어 속에서 오탐이 많아 넣지 않습니다.
+
+_GLOSSARY_LINE = re.compile(r'^\s*\d+\.\s*(.+?)\s*\((.+?)\)\s*->\s*"(.+?)\s*\((.+?)\)"\s*:\s*(.+)$')
+_HANJA_GAP = re.compile(r"(?<=[\u4e00-\u9fff])\s+(?=[\u4e00-\u9fff])")
+_DEFINING = r"(?:\s*\([^)]{1,20}\))?\s*(이란|란|이라 함은|라 함은|은|는)\s+"
+_STRONG_END = re.compile(r"(말한다|뜻한다|의미한다|가리킨다|말합니다|뜻합니다|의미합니다|가리킵니다)[.。]?$")
+_WEAK_END = re.compile(r"(이다|입니다)[.。]?$")
+# 정의 질문으로 보는 형태 (용어 뒤에 다른 말이 붙지 않은 경우만):
+# "X(이/가) 뭐예요?", "X(이)란?", "X란 무엇인가요?", "X(의) 뜻/의미/정의", "X에 대해 설명해줘"
+_ASK = r"(?:뭐예요|뭐에요|뭐야|뭐지|뭐죠|뭔가요|뭡니까|뭘까요|무엇인가요|무엇입니까|무엇이에요|무엇이죠)"
+_DEFINITION_QUERY = re.compile(
+    rf"^(?:(?:이|가|은|는)?\s*{_ASK}"
+    rf"|(?:이란|란)\s*{_ASK}?"
+    rf"|의?\s*(?:뜻|의미|정의)\s*(?:(?:이|가|은|는)?\s*{_ASK})?"
+    rf"|(?:에 대해서?|이 뭔지|가 뭔지)\s*(?:설명해|알려)\s*(?:줘|주세요|줄래|주실래요)"
+    rf")\s*[?？!.~]*$"
+)
+# 개인 사주 평가를 묻는 말 (사주 정보와 함께 오면 사전 답변 대신 LLM 으로)
+_EVALUATIVE = re.compile(r"어때|어떤|좋|나쁘|부족|넘치|많|적어|문제|언제|맞|강해|약해|나한테|내 |제 ")
+
+
+# --- Aho–Corasick ---
+class AhoCorasick:
+    """여러 용어를 한 번의 스캔으로 찾는 Aho–Corasick 오토마톤."""
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        for pattern in patterns:
+            self._add(pattern)
+        self._build()
+
+    def _add(self, pattern: str):
+        node = 0
+        for ch in pattern:
+            nxt = self.goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[node][ch] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append([])
+            node = nxt
+        self.out[node].append(pattern)
+
+    def _build(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self.goto[node].items():
+                queue.append(nxt)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0) if self.goto[f].get(ch, 0) != nxt else 0
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def find_all(self, text: str):
+        """(시작, 끝, 패턴) 목록."""
+        node = 0
+        found = []
+        for i, ch in enumerate(text):
+            while node and ch not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(ch, 0)
+            for pattern in self.out[node]:
+                found.append((i - len(pattern) + 1, i + 1, pattern))
+        return found
+
+    def find_longest(self, text: str):
+        """겹치지 않는 가장 긴 일치만 남깁니다 (예: '십이운성' 안의 '운성')."""
+        chosen = []
+        end = -1
+        for start, stop, pattern in sorted(self.find_all(text), key=lambda m: (m[0], -(m[1] - m[0]))):
+            if start >= end:
+                chosen.append((start, stop, pattern))
+                end = stop
+        return chosen
+
+
+# --- Build (ingest) ---
+def parse_glossary_file(path: str = GLOSSARY_SOURCE):
+    """'1. Shadow (그림자) -> "다크코드 (Dark Code)" : 정의' 형식의 줄을 용어 항목으로 바꿉니다."""
+    entries = {}
+    if not os.path.exists(path):
+        return entries
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            match = _GLOSSARY_LINE.match(line)
+            if not match:
+                continue
+            original, original_kr, term, term_en, definition = (g.strip() for g in match.groups())
+            entries[term] = {
+                "term": term,
+                "aliases": sorted({term, term.replace(" ", ""), term_en, original, original_kr}),
+                "definition": f"{definition} (원래 용어: {original} / {original_kr})",
+                "source": path,
+            }
+    return entries
+
+
+def _clean(text: str) -> str:
+    """PDF 추출문 정리: 공백 정리, 괄호/구두점 앞뒤 공백과 한자 사이 공백 제거."""
+    text = re.sub(r"\s+", " ", text)
+    text = re.sub(r"\s+([,.)\]:])", r"\1", text)
+    text = re.sub(r"([(\[])\s+", r"\1", text)
+    return _HANJA_GAP.sub("", text)
+
+
+def _sentences(text: str):
+    return re.split(r"(?<=[.!?。])\s+", _clean(text))
+
+
+def extract_definitions(chunks, terms=MYEONGRI_TERMS):
+    """
+    청크에서 용어 정의를 찾아 용어별로 가장 알맞은 것을 고릅니다.
+    1) 정의 문장: '용신은 ... 을 말합니다.' / '원진이란 ... 뜻한다.'
+    2) 괄호 풀이: '일간(日干, 태어난 날의 천간)'
+    3) 약한 정의: '비견(比肩)은 견줄 비, 어깨 견이다.'
+    """
+    glosses = {t: re.compile(re.escape(t) + r"\s*\([\u4e00-\u9fff]+,\s*([^()]{4,60})\)") for t in terms}
+    defining = {t: re.compile(re.escape(t) + _DEFINING) for t in terms}
+    best = {}
+
+    def consider(term, score, text, metadata):
+        if term not in best or score > best[term][0]:
+            best[term] = (score, text, metadata)
+
+    for chunk in chunks:
+        content = chunk.page_content if hasattr(chunk, "page_content") else chunk["content"]
+        metadata = chunk.metadata if hasattr(chunk, "metadata") else chunk.get("metadata", {})
+        for sentence in _sentences(content):
+            sentence = sentence.strip()
+            if len(sentence) < 8:
+                continue
+            for term in terms:
+                if term not in sentence:
+                    continue
+                gloss = glosses[term].search(sentence)
+                if gloss and re.search(r"[가-힣]", gloss.group(1)):
+                    consider(term, (2, -abs(len(gloss.group(1)) - 20)), gloss.group(1).strip() + ".", metadata)
+                match = defining[term].search(sentence)
+                if not match:
+                    continue
+                definition = sentence[match.start():]
+                if not (12 <= len(definition) <= 220):
+                    continue
+                if _STRONG_END.search(definition):
+                    consider(term, (3, -abs(len(definition) - 80)), definition, metadata)
+                elif _WEAK_END.search(definition) and match.start() == 0:
+                    consider(term, (1, -abs(len(definition) - 80)), definition, metadata)
+    return {
+        term: {
+            "term": term,
+            "aliases": [term],
+            "definition": text,
+            "source": (metadata or {}).get("source", "Unknown"),
+            "page": (metadata or {}).get("page"),
+        }
+        for term, (_, text, metadata) in best.items()
+    }
+
+
+def build_glossary(chunks, path: str = GLOSSARY_PATH, glossary_file: str = GLOSSARY_SOURCE):
+    """용어 사전 파일을 만듭니다. 수동 사전(glossary_file)이 자동 추출보다 우선합니다."""
+    entries = extract_definitions(chunks)
+    entries.update(parse_glossary_file(glossary_file))
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(sorted(entries.values(), key=lambda e: e["term"]), f, ensure_ascii=False, indent=1)
+    return len(entries)
+
+
+# --- Lookup ---
+class Glossary:
+    def __init__(self, entries):
+        self.entries = {e["term"]: e for e in entries}
+        self.alias_to_term = {}
+        for entry in entries:
+            for alias in entry["aliases"]:
+                self.alias_to_term[alias.lower()] = entry["term"]
+        self.matcher = AhoCorasick(self.alias_to_term)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def match(self, text: str):
+        """질문에 언급된 용어 (등장 순서, 중복 제거)."""
+        terms = []
+        for _, _, alias in self.matcher.find_longest((text or "").lower()):
+            term = self.alias_to_term[alias]
+            if term not in terms:
+                terms.append(term)
+        return terms
+
+    def definition_query(self, question: str, saju_data: dict = None):
+        """
+        '지장간이 뭐예요?' 처럼 용어 하나의 정의만 묻는 질문이면 그 용어, 아니면 None.
+        사주 정보가 함께 오고 평가하는 말(어때/좋/부족/문제/언제 ...)이 있으면 개인 질문으로 보고 None.
+        """
+        text = (question or "").strip().lower()
+        if saju_data and _EVALUATIVE.search(text):
+            return None
+        matches = self.matcher.find_longest(text)
+        if len(matches) != 1 or matches[0][0] != 0:
+            return None
+        rest = text[matches[0][1]:].strip(" \"'“”")
+        return self.alias_to_term[matches[0][2]] if _DEFINITION_QUERY.match(rest) else None
+
+    def answer(self, term: str):
+        entry = self.entries[term]
+        source = os.path.basename(entry.get("source") or "")
+        page = f" p.{entry['page'] + 1}" if isinstance(entry.get("page"), int) else ""
+        return {
+            "answer": f"**{term}**: {entry['definition']}\n\n(출처: {source}{page})",
+            "sources": [entry.get("source")],
+            "glossary": term,
+        }
+
+    def context_block(self, question: str, max_terms: int = GLOSSARY_MAX_CONTEXT_TERMS) -> str:
+        """질문에 나온 용어 정의를 참고 자료 앞에 붙일 문자열."""
+        terms = self.match(question)[:max_terms]
+        if not terms:
+            return ""
+        lines = "\n".join(f"- {t}: {self.entries[t]['definition']}" for t in terms)
+        return f"[용어 정의]\n{lines}\n\n"
+
+
+def load_glossary(path: str = GLOSSARY_PATH):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return Glossary(json.load(f))
@@ -1,10 +1,15 @@
 import os
 import shutil
-from langchain_community.document_loaders import PyPDFLoader, DirectoryLoader, Docx2txtLoader, TextLoader
+from langchain_community.document_loaders import DirectoryLoader, Docx2txtLoader, TextLoader
+from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_chroma import Chroma
 from dotenv import load_dotenv
+from src.extract_cache import ExtractCache
+from src.embedding_space import active_space, build_space_index, collection_metadata, record_dim, reset_after_ingest
+from src.domain_router import classify_source
+from src.glossary import build_glossary
 
 load_dotenv()
 
@@ -24,11 +29,13 @@ def ingest_documents():
     documents = []
     
     # Supported extensions and their loaders
+    # PDFs go through the shared extraction cache (parsed once per file content)
     loaders = {
-        ".pdf": PyPDFLoader,
+        ".pdf": None,
         ".docx": Docx2txtLoader,
         ".txt": TextLoader
     }
+    cache = ExtractCache()
 
     print(f"Scanning {DATA_PATH}...")
     
@@ -43,13 +50,19 @@ def ingest_documents():
             try:
                 print(f"Loading {filename}...")
                 loader_cls = loaders[ext]
-                # TextLoader needs encoding sometimes
-                if ext == ".txt":
-                    loader = loader_cls(file_path, encoding="utf-8")
+                if ext == ".pdf":
+                    pages, _ = cache.get_pdf_pages(file_path)
+                    docs = [
+                        Document(page_content=text, metadata={"source": file_path, "page": i})
+                        for i, text in enumerate(pages)
+                    ]
                 else:
-                    loader = loader_cls(file_path)
-                    
-                docs = loader.load()
+                    # TextLoader needs encoding sometimes
+                    if ext == ".txt":
+                        loader = loader_cls(file_path, encoding="utf-8")
+                    else:
+                        loader = loader_cls(file_path)
+                    docs = loader.load()
                 documents.extend(docs)
                 print(f"✅ Loaded {len(docs)} pages/sections from {filename}")
             except Exception as e:
@@ -57,6 +70,9 @@ def ingest_documents():
         else:
             print(f"⚠️  Skipping unsupported file: {filename}")
 
+    print(f"Extraction cache: {cache.hits} hits, {cache.misses} parsed.")
+    cache.close()
+
     if not documents:
         return "No supported documents found in data/ folder."
 
@@ -65,18 +81,30 @@ def ingest_documents():
     # 3. Split Text
     text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
     chunks = text_splitter.split_documents(documents)
+    for chunk in chunks:
+        chunk.metadata["domain"] = classify_source(chunk.metadata.get("source"))
     print(f"Split into {len(chunks)} chunks.")
+    print(f"Built glossary with {build_glossary(chunks)} terms.")
 
-    # 4. Embed and Store
-    embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
+    # 4. Embed and Store (into the active embedding space: its model and collection)
+    space_name, space = active_space()
+    embeddings = GoogleGenerativeAIEmbeddings(model=space["model"])
     
     # Create Chroma DB
-    Chroma.from_documents(
+    vectorstore = Chroma.from_documents(
         documents=chunks, 
         embedding=embeddings, 
-        persist_directory=DB_PATH
+        persist_directory=DB_PATH,
+        collection_name=space["collection"],
+        collection_metadata=collection_metadata(space)
     )
-    
+    # Other spaces were wiped with the DB; a running migration starts over against the new chunks
+    reset_after_ingest()
+    print(f"Embedded with {space['model']} (dim {record_dim(space_name, vectorstore._collection)}).")
+
+    # 5. Optional compact index (float16 / int8, memory-mapped) or pgvector backend
+    build_space_index(DB_PATH, space)
+
     return f"Successfully ingested {len(documents)} PDFs into {len(chunks)} chunks."
 
 if __name__ == "__main__":
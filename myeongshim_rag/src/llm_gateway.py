@@ -0,0 +1,518 @@
+"""
+LLM Gateway
+Gemini 호출을 한 곳으로 모은 공용 게이트웨이입니다. (REST generateContent, 커넥션 풀 공유)
+
+- AIMD 동시성 제한: 429 / 지연 목표 초과 시 절반으로 줄이고, 정상 응답마다 조금씩 늘림 (모델별)
+- 429 / 5xx / 타임아웃은 지수 백오프 + full jitter 로 재시도 (Retry-After 가 있으면 우선)
+- 헤징(선택): 모델의 p95 가 지나도 응답이 없으면 같은 요청을 한 번 더 보내 먼저 온 응답을 사용
+- 최근 p95 가 지연 SLO 를 넘거나 재시도가 모두 실패하면 더 빠른 대체 모델로 전환
+  (주 모델이 회복됐는지 보려고 LLM_FALLBACK_PROBE_EVERY 번에 한 번은 주 모델로 보냄)
+- 모델별 통계: get_gateway().stats()
+
+GEMINI_BASE_URL 로 로컬 가짜 서버를 가리킬 수 있습니다:
+    python -m src.llm_gateway demo   (가짜 서버를 띄워 429 / 느린 꼬리 응답 상황에서 게이트웨이를 실행)
+"""
+
+import os
+import json
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import httpx
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# streamlit_app 에서도 import 하므로 src.* 에 의존하지 않습니다. (풀 설정은 clients.py 와 같은 환경 변수)
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+HTTP_KEEPALIVE = int(os.getenv("HTTP_KEEPALIVE", "10"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com")
+LLM_DEFAULT_MODEL = os.getenv("LLM_DEFAULT_MODEL", "gemini-2.5-flash")
+LLM_FALLBACK_MODEL = os.getenv("LLM_FALLBACK_MODEL", "gemini-2.0-flash-lite")
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+LLM_INITIAL_CONCURRENCY = int(os.getenv("LLM_INITIAL_CONCURRENCY", "4"))
+LLM_MIN_CONCURRENCY = int(os.getenv("LLM_MIN_CONCURRENCY", "1"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_LATENCY_TARGET_MS = float(os.getenv("LLM_LATENCY_TARGET_MS", "12000"))
+LLM_LATENCY_SLO_MS = float(os.getenv("LLM_LATENCY_SLO_MS", "20000"))
+LLM_HEDGE = os.getenv("LLM_HEDGE", "0") in ("1", "true", "True")
+LLM_HEDGE_MIN_MS = float(os.getenv("LLM_HEDGE_MIN_MS", "1000"))
+LLM_FALLBACK_PROBE_EVERY = int(os.getenv("LLM_FALLBACK_PROBE_EVERY", "10"))
+LLM_STATS_WINDOW = int(os.getenv("LLM_STATS_WINDOW", "200"))
+MIN_SAMPLES = 20  # p95 를 믿기 시작하는 최소 표본 수
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class GatewayError(Exception):
+    def __init__(self, message: str, status: int = None):
+        super().__init__(message)
+        self.status = status
+
+
+class _Retryable(GatewayError):
+    def __init__(self, message: str, status: int = None, retry_after: float = None):
+        super().__init__(message, status)
+        self.retry_after = retry_after
+
+
+class ModelStats:
+    """모델별 카운터와 최근 지연 시간 창."""
+
+    def __init__(self, window: int = LLM_STATS_WINDOW):
+        self._lock = threading.Lock()
+        self.latencies = deque(maxlen=window)
+        self.counts = {k: 0 for k in ("requests", "successes", "errors", "throttled", "retries",
+                                      "hedges", "hedge_wins", "fallbacks")}
+
+    def incr(self, name: str, n: int = 1):
+        with self._lock:
+            self.counts[name] += n
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self.latencies.append(seconds)
+            self.counts["successes"] += 1
+
+    def percentile(self, p: float):
+        """초 단위 백분위 지연. 표본이 MIN_SAMPLES 보다 적으면 None."""
+        with self._lock:
+            if len(self.latencies) < MIN_SAMPLES:
+                return None
+            return float(np.percentile(list(self.latencies), p))
+
+    def snapshot(self):
+        with self._lock:
+            lat = list(self.latencies)
+            counts = dict(self.counts)
+        if lat:
+            counts["p50_ms"] = round(float(np.percentile(lat, 50)) * 1000, 1)
+            counts["p95_ms"] = round(float(np.percentile(lat, 95)) * 1000, 1)
+        return counts
+
+
+class AdaptiveLimiter:
+    """AIMD 동시성 제한. 감소는 cooldown 안에 한 번만 (같은 폭주로 여러 번 반감되지 않도록)."""
+
+    def __init__(self, initial: int = LLM_INITIAL_CONCURRENCY, minimum: int = LLM_MIN_CONCURRENCY,
+                 maximum: int = LLM_MAX_CONCURRENCY, cooldown: float = 1.0):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def on_success(self, seconds: float, target_ms: float = LLM_LATENCY_TARGET_MS):
+        if seconds * 1000 > target_ms:
+            self.on_overload()
+            return
+        with self._cond:
+            grown = min(self.maximum, self.limit + 1.0 / self.limit)
+            if int(grown) > int(self.limit):
+                self._cond.notify()
+            self.limit = grown
+
+    def on_overload(self):
+        with self._cond:
+            now = time.monotonic()
+            if now - self._last_decrease >= self.cooldown:
+                self.limit = max(float(self.minimum), self.limit / 2)
+                self._last_decrease = now
+
+
+def _backoff(attempt: int, retry_after: float = None) -> float:
+    if retry_after is not None:
+        return min(retry_after, LLM_BACKOFF_MAX)
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+
+
+def _camel(key: str) -> str:
+    head, *rest = key.split("_")
+    return head + "".join(w.title() for w in rest)
+
+
+def _to_contents(prompt):
+    """문자열 또는 [{"role", "parts"}] 대화 기록을 REST contents 형식으로 바꿉니다."""
+    if isinstance(prompt, str):
+        return [{"role": "user", "parts": [{"text": prompt}]}]
+    contents = []
+    for message in prompt:
+        parts = [p if isinstance(p, dict) else {"text": str(p)} for p in message.get("parts", [])]
+        contents.append({"role": message.get("role", "user"), "parts": parts})
+    return contents
+
+
+def _response_text(data: dict) -> str:
+    candidates = data.get("candidates") or []
+    if not candidates:
+        return ""
+    parts = (candidates[0].get("content") or {}).get("parts") or []
+    return "".join(p.get("text", "") for p in parts)
+
+
+def _retry_after(response: httpx.Response):
+    try:
+        return float(response.headers["retry-after"])
+    except (KeyError, ValueError):
+        return None
+
+
+class LLMGateway:
+    def __init__(self, api_key: str = None, base_url: str = None, fallback_model: str = LLM_FALLBACK_MODEL,
+                 hedge: bool = LLM_HEDGE, max_retries: int = LLM_MAX_RETRIES, slo_ms: float = LLM_LATENCY_SLO_MS,
+                 initial_concurrency: int = LLM_INITIAL_CONCURRENCY, max_concurrency: int = LLM_MAX_CONCURRENCY):
+        self.base_url = (base_url or GEMINI_BASE_URL).rstrip("/")
+        self.api_key = api_key or os.getenv("GEMINI_API_KEY")
+        if not self.api_key:
+            raise ValueError("GEMINI_API_KEY missing")
+        self.fallback_model = fallback_model
+        self.hedge = hedge
+        self.max_retries = max_retries
+        self.slo_ms = slo_ms
+        self.initial_concurrency = initial_concurrency
+        self.max_concurrency = max_concurrency
+
+        self.http = httpx.Client(
+            limits=httpx.Limits(max_connections=max(HTTP_POOL_SIZE, max_concurrency * 2),
+                                max_keepalive_connections=HTTP_KEEPALIVE),
+            timeout=httpx.Timeout(LLM_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        )
+        self._hedge_pool = ThreadPoolExecutor(max_workers=max_concurrency * 2, thread_name_prefix="llm-hedge")
+        self._lock = threading.Lock()
+        self._models = {}  # name -> (AdaptiveLimiter, ModelStats)
+        self._probe_counter = 0
+
+    def _model(self, name: str):
+        with self._lock:
+            if name not in self._models:
+                self._models[name] = (
+                    AdaptiveLimiter(self.initial_concurrency, maximum=self.max_concurrency), ModelStats()
+                )
+            return self._models[name]
+
+    def _url(self, model: str, method: str) -> str:
+        return f"{self.base_url}/v1beta/models/{model}:{method}"
+
+    def _body(self, prompt, generation_config: dict = None):
+        body = {"contents": _to_contents(prompt)}
+        if generation_config:
+            body["generationConfig"] = {_camel(k): v for k, v in generation_config.items()}
+        return body
+
+    # --- Single attempt ---
+    def _check(self, response: httpx.Response, limiter, stats):
+        if response.status_code in RETRYABLE_STATUS:
+            if response.status_code == 429:
+                stats.incr("throttled")
+            limiter.on_overload()
+            raise _Retryable(f"HTTP {response.status_code}", response.status_code, _retry_after(response))
+        if response.status_code >= 400:
+            stats.incr("errors")
+            raise GatewayError(f"HTTP {response.status_code}: {response.text[:200]}", response.status_code)
+
+    def _post(self, model: str, body: dict, sent: threading.Event = None) -> str:
+        limiter, stats = self._model(model)
+        limiter.acquire()
+        if sent is not None:
+            sent.set()
+        started = time.perf_counter()
+        try:
+            response = self.http.post(
+                self._url(model, "generateContent"), json=body, headers={"x-goog-api-key": self.api_key}
+            )
+            self._check(response, limiter, stats)
+            try:
+                data = response.json()
+            except ValueError as e:
+                stats.incr("errors")
+                raise GatewayError(f"Invalid JSON response: {response.text[:200]}", response.status_code) from e
+            text = _response_text(data)
+        except httpx.TransportError as e:
+            limiter.on_overload()
+            raise _Retryable(f"{type(e).__name__}: {e}") from e
+        finally:
+            limiter.release()
+        elapsed = time.perf_counter() - started
+        limiter.on_success(elapsed)
+        stats.observe(elapsed)
+        return text
+
+    def _hedged(self, model: str, body: dict) -> str:
+        """p95 가 지나도 응답이 없으면 같은 요청을 하나 더 보내 먼저 성공한 쪽을 씁니다."""
+        limiter, stats = self._model(model)
+        p95 = stats.percentile(95)
+        if not self.hedge or p95 is None:
+            return self._post(model, body)
+
+        # 대기열에서 기다린 시간은 빼고, 실제로 보낸 시점부터 p95 를 잽니다.
+        sent = threading.Event()
+        first = self._hedge_pool.submit(self._post, model, body, sent)
+        sent.wait()
+        done, _ = wait([first], timeout=max(p95, LLM_HEDGE_MIN_MS / 1000))
+        # 남는 동시성 슬롯이 없으면 헤징 요청이 다른 요청의 자리를 뺏으므로 그냥 기다립니다.
+        if done or limiter.in_flight >= int(limiter.limit):
+            return first.result()
+
+        stats.incr("hedges")
+        second = self._hedge_pool.submit(self._post, model, body)
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    text = future.result()
+                except GatewayError as e:
+                    error = e
+                    continue
+                if future is second:
+                    stats.incr("hedge_wins")
+                return text
+        raise error
+
+    # --- Retries / fallback ---
+    def _with_retries(self, model: str, attempt_fn):
+        _, stats = self._model(model)
+        for attempt in range(self.max_retries + 1):
+            try:
+                return attempt_fn(model)
+            except _Retryable as e:
+                if attempt == self.max_retries:
+                    stats.incr("errors")
+                    raise
+                stats.incr("retries")
+                time.sleep(_backoff(attempt, e.retry_after))
+
+    def _choose_model(self, model: str) -> str:
+        """주 모델의 최근 p95 가 SLO 를 넘으면 대체 모델로 보냅니다 (가끔은 주 모델로 탐색)."""
+        if not self.fallback_model or model == self.fallback_model:
+            return model
+        _, stats = self._model(model)
+        p95 = stats.percentile(95)
+        if p95 is None or p95 * 1000 <= self.slo_ms:
+            return model
+        with self._lock:
+            self._probe_counter += 1
+            if self._probe_counter % LLM_FALLBACK_PROBE_EVERY == 0:
+                return model
+        stats.incr("fallbacks")
+        return self.fallback_model
+
+    def _run(self, model: str, attempt_fn):
+        chosen = self._choose_model(model)
+        self._model(chosen)[1].incr("requests")
+        try:
+            return self._with_retries(chosen, attempt_fn)
+        except _Retryable:
+            if not self.fallback_model or chosen == self.fallback_model:
+                raise
+        self._model(model)[1].incr("fallbacks")
+        self._model(self.fallback_model)[1].incr("requests")
+        return self._with_retries(self.fallback_model, attempt_fn)
+
+    # --- Public API ---
+    def generate(self, prompt, model: str = LLM_DEFAULT_MODEL, generation_config: dict = None) -> str:
+        """프롬프트(문자열 또는 대화 기록)에 대한 응답 텍스트."""
+        body = self._body(prompt, generation_config)
+        return self._run(model, lambda m: self._hedged(m, body))
+
+    async def agenerate(self, prompt, model: str = LLM_DEFAULT_MODEL, generation_config: dict = None) -> str:
+        return await asyncio.to_thread(self.generate, prompt, model, generation_config)
+
+    def stream(self, prompt, model: str = LLM_DEFAULT_MODEL, generation_config: dict = None):
+        """
+        응답을 조각 단위로 내보냅니다 (streamGenerateContent, SSE).
+        첫 조각 전의 실패만 재시도/대체 모델 전환 대상이고, 지연 통계는 첫 조각까지의 시간입니다.
+        """
+        body = self._body(prompt, generation_config)
+        first = {}
+
+        def open_stream(m):
+            limiter, stats = self._model(m)
+            limiter.acquire()
+            started = time.perf_counter()
+            ctx = self.http.stream(
+                "POST", self._url(m, "streamGenerateContent") + "?alt=sse",
+                json=body, headers={"x-goog-api-key": self.api_key},
+            )
+            try:
+                response = ctx.__enter__()
+                if response.status_code >= 400:
+                    response.read()  # _check 가 오류 본문을 메시지에 넣으므로 스트림을 먼저 읽습니다.
+                self._check(response, limiter, stats)
+                lines = response.iter_lines()
+                for line in lines:
+                    if line.startswith("data:"):
+                        elapsed = time.perf_counter() - started
+                        limiter.on_success(elapsed)
+                        stats.observe(elapsed)
+                        first.update(ctx=ctx, lines=lines, text=_response_text(json.loads(line[5:])))
+                        return limiter
+                ctx.__exit__(None, None, None)
+                limiter.release()
+                return None
+            except httpx.TransportError as e:
+                ctx.__exit__(type(e), e, e.__traceback__)
+                limiter.release()
+                limiter.on_overload()
+                raise _Retryable(f"{type(e).__name__}: {e}") from e
+            except BaseException as e:
+                ctx.__exit__(type(e), e, e.__traceback__)
+                limiter.release()
+                raise
+
+        limiter = self._run(model, open_stream)
+        if limiter is None:
+            return
+        try:
+            if first["text"]:
+                yield first["text"]
+            for line in first["lines"]:
+                if line.startswith("data:"):
+                    text = _response_text(json.loads(line[5:]))
+                    if text:
+                        yield text
+        finally:
+            first["ctx"].__exit__(None, None, None)
+            limiter.release()
+
+    def stats(self):
+        with self._lock:
+            models = dict(self._models)
+        return {
+            name: {**stats.snapshot(), "concurrency_limit": round(limiter.limit, 2), "in_flight": limiter.in_flight}
+            for name, (limiter, stats) in sorted(models.items())
+        }
+
+    def close(self):
+        self._hedge_pool.shutdown(wait=False)
+        self.http.close()
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway() -> LLMGateway:
+    """프로세스 공용 게이트웨이."""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = LLMGateway()
+        return _gateway
+
+
+# --- Local fake server (테스트/데모용) ---
+def run_fake_server(port: int = 0, capacity: int = 6, latency: float = 0.2, tail_rate: float = 0.05,
+                    tail_latency: float = 3.0, error_rate: float = 0.02):
+    """
+    generateContent / streamGenerateContent 를 흉내 내는 로컬 서버를 띄우고 base_url 을 반환합니다.
+    동시 요청이 capacity 를 넘으면 429, error_rate 확률로 503, tail_rate 확률로 느린 응답.
+    이름에 'lite' 가 들어간 모델은 꼬리 지연이 없습니다.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    state = {"in_flight": 0, "lock": threading.Lock()}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, payload, content_type="application/json"):
+            data = payload.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            model = self.path.split("/models/")[-1].split(":")[0]
+            with state["lock"]:
+                overloaded = state["in_flight"] >= capacity
+                if not overloaded:
+                    state["in_flight"] += 1
+            if overloaded:
+                return self._send(429, json.dumps({"error": {"code": 429, "status": "RESOURCE_EXHAUSTED"}}))
+            try:
+                if random.random() < error_rate:
+                    return self._send(503, json.dumps({"error": {"code": 503, "status": "UNAVAILABLE"}}))
+                slow = "lite" not in model and random.random() < tail_rate
+                time.sleep(tail_latency if slow else random.uniform(0.5, 1.5) * latency)
+                chunk = lambda text: json.dumps({"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]})
+                if ":streamGenerateContent" in self.path:
+                    events = "".join(f"data: {chunk(t)}\r\n\r\n" for t in (f"[{model}] ", "fake ", "answer"))
+                    return self._send(200, events, "text/event-stream")
+                return self._send(200, chunk(f"[{model}] fake answer"))
+            finally:
+                with state["lock"]:
+                    state["in_flight"] -= 1
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.handle_error = lambda request, address: None  # 헤징으로 버려진 연결의 끊김은 무시
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def demo(requests: int = 200, workers: int = 32):
+    """가짜 서버에 헤징 없음 / 헤징 켬 두 번 부하를 걸고 지연 분포와 모델별 통계를 출력합니다."""
+    server, base_url = run_fake_server()
+    try:
+        for hedge in (False, True):
+            gateway = LLMGateway(api_key="fake", base_url=base_url, hedge=hedge, slo_ms=2000)
+
+            def one(i):
+                started = time.perf_counter()
+                gateway.generate(f"question {i}")
+                return time.perf_counter() - started
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                lat = np.asarray(list(pool.map(one, range(requests)))) * 1000
+            print(f"\nhedge={hedge}: {requests} requests in {time.perf_counter() - started:.1f}s  "
+                  f"p50={np.percentile(lat, 50):.0f}ms p95={np.percentile(lat, 95):.0f}ms "
+                  f"p99={np.percentile(lat, 99):.0f}ms")
+            for name, s in gateway.stats().items():
+                print(f"  {name}: {s}")
+            print("  stream:", "".join(gateway.stream("hello")))
+            gateway.close()
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == "fake":
+        port = int(sys.argv[2]) if len(sys.argv) > 2 else 8765
+        _, url = run_fake_server(port)
+        print(f"Fake Gemini server at {url} (GEMINI_BASE_URL={url})")
+        threading.Event().wait()
+    else:
+        demo()
@@ -0,0 +1,257 @@
+"""
+만세력 (Manseryeok) 엔진
+절기(節氣) 경계를 미리 계산해 두고, 년/월/일/시 4기둥을 조회 테이블로 산출합니다.
+
+- 시간 기준: 한국 표준시 (KST, UTC+9) 벽시계 시각
+- 지원 범위: START_YEAR ~ END_YEAR
+- 절입 시각은 저정밀 태양 황경 공식으로 구하므로 수 분 정도의 오차가 있습니다
+- 일주 경계는 자정(00:00), 23시(야자시)는 다음 날 일간으로 시간(時干)을 계산
+  (프론트엔드 lunar-javascript 기본 설정과 동일)
+"""
+
+import math
+import threading
+from array import array
+from datetime import date, datetime, time, timedelta, timezone
+
+import numpy as np
+
+START_YEAR = 1900
+END_YEAR = 2100
+
+KST = timezone(timedelta(hours=9))
+
+GAN_KR = ["갑", "을", "병", "정", "무", "기", "경", "신", "임", "계"]
+ZHI_KR = ["자", "축", "인", "묘", "진", "사", "오", "미", "신", "유", "술", "해"]
+GAN_ELEMENT = ["목", "목", "화", "화", "토", "토", "금", "금", "수", "수"]
+
+# 24절기 (소한부터 양력 순서). 짝수 인덱스가 월을 나누는 절(節)입니다.
+SOLAR_TERMS = [
+    ("소한", 285), ("대한", 300), ("입춘", 315), ("우수", 330),
+    ("경칩", 345), ("춘분", 0), ("청명", 15), ("곡우", 30),
+    ("입하", 45), ("소만", 60), ("망종", 75), ("하지", 90),
+    ("소서", 105), ("대서", 120), ("입추", 135), ("처서", 150),
+    ("백로", 165), ("추분", 180), ("한로", 195), ("상강", 210),
+    ("입동", 225), ("소설", 240), ("대설", 255), ("동지", 270),
+]
+
+_EPOCH = datetime(1970, 1, 1)
+_JD_UNIX_EPOCH = 2440587.5      # 1970-01-01 00:00 UTC
+_JDN_UNIX_EPOCH = 2440588       # 1970-01-01 의 율리우스 적일
+_KST_OFFSET_MIN = 9 * 60
+
+_table_lock = threading.Lock()
+_term_table = None  # array('q'): KST 분 단위 타임스탬프, 연도 x 24절기
+_jie_cache = None
+
+
+def _sun_apparent_longitude(jd: float) -> float:
+    """태양의 겉보기 황경 (Meeus 저정밀 공식, 오차 약 0.01도)."""
+    t = (jd - 2451545.0) / 36525.0
+    l0 = 280.46646 + 36000.76983 * t + 0.0003032 * t * t
+    m = math.radians(357.52911 + 35999.05029 * t - 0.0001537 * t * t)
+    c = ((1.914602 - 0.004817 * t - 0.000014 * t * t) * math.sin(m)
+         + (0.019993 - 0.000101 * t) * math.sin(2 * m)
+         + 0.000289 * math.sin(3 * m))
+    omega = math.radians(125.04 - 1934.136 * t)
+    return (l0 + c - 0.00569 - 0.00478 * math.sin(omega)) % 360.0
+
+
+def _solve_term_jd(year: int, longitude: float) -> float:
+    """주어진 연도에서 태양 황경이 longitude 가 되는 순간의 JD(UT 근사)를 찾습니다."""
+    # 춘분(0도)이 3월 20일 무렵이므로 이를 기준으로 초기값을 잡습니다.
+    days_from_equinox = ((longitude - 0) % 360) * 365.2422 / 360.0
+    jd = 2451623.8 + (year - 2000) * 365.2422 + days_from_equinox
+    if longitude >= 285:
+        # 소한/대한은 같은 해 1월에 속하도록 한 해 앞당깁니다.
+        jd -= 365.2422
+    for _ in range(10):
+        diff = (longitude - _sun_apparent_longitude(jd) + 180.0) % 360.0 - 180.0
+        jd += diff * 365.2422 / 360.0
+        if abs(diff) < 1e-7:
+            break
+    return jd
+
+
+def _jd_to_kst_minutes(jd: float) -> int:
+    return int(round((jd - _JD_UNIX_EPOCH) * 1440.0)) + _KST_OFFSET_MIN
+
+
+def _build_term_table():
+    table = array("q")
+    for year in range(START_YEAR, END_YEAR + 1):
+        for _, longitude in SOLAR_TERMS:
+            table.append(_jd_to_kst_minutes(_solve_term_jd(year, longitude)))
+    return table
+
+
+def _get_term_table():
+    global _term_table
+    if _term_table is None:
+        with _table_lock:
+            if _term_table is None:
+                _term_table = _build_term_table()
+    return _term_table
+
+
+def _jie_array() -> np.ndarray:
+    """월 경계가 되는 12절(節)만 모은 정렬된 배열 (소한, 입춘, ..., 대설 순)."""
+    global _jie_cache
+    if _jie_cache is None:
+        _jie_cache = np.frombuffer(_get_term_table(), dtype=np.int64)[::2].copy()
+    return _jie_cache
+
+
+def to_kst_minutes(dt: datetime) -> int:
+    """datetime 을 KST 벽시계 기준 분 단위 타임스탬프로 변환합니다."""
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(KST).replace(tzinfo=None)
+    return int((dt - _EPOCH).total_seconds() // 60)
+
+
+def get_solar_terms(year: int):
+    """해당 연도의 24절기 시각(KST)을 반환합니다."""
+    if not START_YEAR <= year <= END_YEAR:
+        raise ValueError(f"지원 범위({START_YEAR}~{END_YEAR})를 벗어난 연도입니다: {year}")
+    table = _get_term_table()
+    base = (year - START_YEAR) * len(SOLAR_TERMS)
+    return [
+        {"name": name, "longitude": longitude, "at": _EPOCH + timedelta(minutes=table[base + i])}
+        for i, (name, longitude) in enumerate(SOLAR_TERMS)
+    ]
+
+
+def ganji_name(index: int) -> str:
+    """60갑자 인덱스(0=갑자)를 한글 간지로 변환합니다."""
+    return GAN_KR[index % 10] + ZHI_KR[index % 12]
+
+
+def pillar_indices_batch(minutes) -> np.ndarray:
+    """
+    KST 분 단위 타임스탬프 배열을 받아 (N, 4) 형태의 60갑자 인덱스 배열
+    [년주, 월주, 일주, 시주] 를 반환합니다. 모든 연산은 벡터화되어 있습니다.
+    """
+    t = np.asarray(minutes, dtype=np.int64)
+    jie = _jie_array()
+
+    pos = np.searchsorted(jie, t, side="right") - 1
+    if t.size and (pos.min() < 0 or pos.max() >= len(jie) - 1):
+        raise ValueError(f"지원 범위({START_YEAR}~{END_YEAR})를 벗어난 날짜가 포함되어 있습니다.")
+
+    # 절 인덱스 0(소한~입춘)은 전년도에 속합니다.
+    jie_index = pos % 12
+    saju_year = START_YEAR + pos // 12 - (jie_index == 0)
+    year_idx = (saju_year - 4) % 60
+
+    # 인월(寅月)부터 센 월 순번: 소한 이후=축월(11), 입춘 이후=인월(0) ...
+    month_no = (jie_index + 11) % 12
+    month_idx = (2 + 12 * (saju_year - 4) + month_no) % 60
+
+    days = np.floor_divide(t, 1440)
+    day_idx = (days + _JDN_UNIX_EPOCH + 49) % 60
+
+    minute_of_day = t - days * 1440
+    hour = minute_of_day // 60
+    hour_branch = ((hour + 1) // 2) % 12
+    # 23시 이후는 다음 날 일간 기준으로 시간(時干)을 정합니다.
+    hour_day_stem = (day_idx + (hour >= 23)) % 10
+    hour_stem = ((hour_day_stem % 5) * 2 + hour_branch) % 10
+    # 천간/지지 쌍을 60갑자 인덱스로 (CRT: stem ≡ i mod 10, branch ≡ i mod 12)
+    hour_idx = (6 * hour_stem - 5 * hour_branch) % 60
+
+    return np.stack([year_idx, month_idx, day_idx, hour_idx], axis=-1)
+
+
+def compute_pillars_batch(datetimes):
+    """여러 시각의 4기둥을 한 번에 계산합니다."""
+    minutes = [to_kst_minutes(dt) for dt in datetimes]
+    indices = pillar_indices_batch(minutes)
+    return [
+        {
+            "year": ganji_name(int(row[0])),
+            "month": ganji_name(int(row[1])),
+            "day": ganji_name(int(row[2])),
+            "hour": ganji_name(int(row[3])),
+        }
+        for row in indices
+    ]
+
+
+def compute_pillars(dt: datetime):
+    """단일 시각의 4기둥을 계산합니다. (예: {"year": "갑진", ...})"""
+    return compute_pillars_batch([dt])[0]
+
+
+PILLARS = ("year", "month", "day", "hour")
+_UNKNOWN = (None, "", "?", "Unknown")
+
+
+def has_birth_time(birth_time: str = None) -> bool:
+    return bool(birth_time) and str(birth_time).strip().lower() not in ("unknown", "모름", "")
+
+
+def parse_birth(birth_date: str, birth_time: str = None) -> datetime:
+    """
+    'YYYY-MM-DD' / 'HH:MM' 문자열을 datetime 으로 변환합니다.
+    시간 미상이면 년/월/일주 계산용으로 정오를 쓰며, 이때 시주는 쓰지 않아야 합니다 (has_birth_time 확인).
+    """
+    d = date.fromisoformat(str(birth_date).strip()[:10])
+    t = time(12, 0)
+    if has_birth_time(birth_time):
+        hh, mm = str(birth_time).strip().split(":")[:2]
+        t = time(int(hh), int(mm))
+    return datetime.combine(d, t)
+
+
+def birth_pillars(birth_date: str, birth_time: str = None):
+    """생년월일시의 4기둥. 시간 미상이면 hour 는 None (지어낸 시주를 넣지 않음)."""
+    pillars = compute_pillars(parse_birth(birth_date, birth_time))
+    if not has_birth_time(birth_time):
+        pillars["hour"] = None
+    return pillars
+
+
+def is_solar(saju_data: dict) -> bool:
+    """양력 입력이 확실한 경우만 True (calendarType 이 없으면 음력일 수도 있어 계산하지 않음)."""
+    if saju_data.get("is_lunar") or saju_data.get("isLunar"):
+        return False
+    calendar = saju_data.get("calendarType") or saju_data.get("calendar_type")
+    return calendar == "solar" or saju_data.get("is_lunar") is False
+
+
+def fill_saju_data(saju_data: dict) -> dict:
+    """
+    양력 생년월일시가 있고 4기둥 중 비어 있거나 '?' 인 기둥이 있으면 그 기둥만 만세력으로 채웁니다.
+    이미 있는 기둥은 그대로 두고, 시간 미상이면 시주는 비워 둡니다.
+    음력이거나 달력 종류를 모르거나 날짜를 해석할 수 없으면 원본을 그대로 돌려줍니다.
+    """
+    if not saju_data or not saju_data.get("birth_date"):
+        return saju_data
+
+    chars = saju_data.get("saju_characters")
+    chars = dict(chars) if isinstance(chars, dict) else {}
+    missing = [k for k in PILLARS if chars.get(k) in _UNKNOWN]
+    if not missing or not is_solar(saju_data):
+        return saju_data
+
+    try:
+        pillars = birth_pillars(saju_data["birth_date"], saju_data.get("birth_time"))
+    except ValueError:
+        return saju_data
+
+    for k in missing:
+        chars[k] = pillars[k] if pillars[k] is not None else "?"
+    filled = dict(saju_data)
+    filled["saju_characters"] = chars
+    if (not filled.get("dayMaster") or filled.get("dayMaster") in ("Unknown", "Error")) \
+            and chars.get("day") not in _UNKNOWN:
+        day_gan = str(chars["day"])[0]
+        if day_gan in GAN_KR:
+            filled["dayMaster"] = day_gan + GAN_ELEMENT[GAN_KR.index(day_gan)]
+    return filled
+
+
+if __name__ == "__main__":
+    for term in get_solar_terms(datetime.now().year):
+        print(f"{term['name']}: {term['at']:%Y-%m-%d %H:%M}")
+    print(compute_pillars(datetime.now()))
@@ -1,6 +1,18 @@
 import os
-import google.generativeai as genai
-from supabase import create_client, Client
+import json
+import threading
+from supabase import Client
+from src.clients import get_supabase, configure_genai, timed
+from src.llm_gateway import get_gateway
+from src.memory_store import MemoryStore
+from src.shared_cache import get_shared_cache
+
+RECENT_MESSAGES = int(os.getenv("MEMORY_RECENT_MESSAGES", "4"))
+MAX_MESSAGE_CHARS = int(os.getenv("MEMORY_MAX_MESSAGE_CHARS", "500"))
+DISTILL_EVERY = int(os.getenv("MEMORY_DISTILL_EVERY", "6"))
+SESSION_USER_TTL = int(os.getenv("MEMORY_SESSION_USER_TTL", str(24 * 3600)))
+SUMMARY_MIN_MESSAGES = int(os.getenv("MEMORY_SUMMARY_MIN_MESSAGES", "10"))
+SUMMARY_EVERY = int(os.getenv("MEMORY_SUMMARY_EVERY", "4"))
 
 class MemoryAgent:
     def __init__(self):
@@ -9,18 +21,36 @@ class MemoryAgent:
         key: str = os.environ.get("SUPABASE_SERVICE_KEY")
         if not url or not key:
             raise ValueError("Supabase Environment Variables missing")
-        self.supabase: Client = create_client(url, key)
+        self.supabase: Client = get_supabase(url, key)  # shared pooled client
 
         # 2. Initialize Gemini 2.5 Flash
         api_key = os.environ.get("GEMINI_API_KEY")
         if not api_key:
             raise ValueError("GEMINI_API_KEY missing")
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
+        configure_genai(api_key)  # memory embeddings
+        self.llm = get_gateway()
+        self.model_name = 'gemini-2.5-flash'
+
+        # 3. Long-Term Memory (user_memories + match_memories)
+        self.memory = MemoryStore(self.supabase)
+        # session -> user mapping never changes, so it is shared across workers
+        self._session_users = get_shared_cache().namespace("session_users", SESSION_USER_TTL, 10000)
+        # created_at of the last message folded into chat_sessions.topic, shared so workers don't re-summarize
+        self._summarized_until = get_shared_cache().namespace("summary_watermarks", SESSION_USER_TTL, 10000)
+        self._distilled_until = {}
+        # sessions with a distillation in flight (the watermark only moves after the LLM call)
+        self._distilling = set()
+        self._distill_lock = threading.Lock()
+
+    def _get_user_id(self, session_id: str):
+        def lookup():
+            res = self.supabase.table("chat_sessions").select("user_id").eq("id", session_id).execute()
+            return res.data[0].get("user_id") if res.data else None
+        return self._session_users.get_or_compute(session_id, lookup)
 
     def get_chat_context(self, session_id: str):
         """
-        Retrieves 'Summary' from session and 'Last 5 Messages' fro history.
+        Retrieves 'Summary' from session and the last few messages (truncated) from history.
         """
         # A. Get Session Summary
         session_res = self.supabase.table("chat_sessions").select("topic").eq("id", session_id).execute()
@@ -28,16 +58,18 @@ class MemoryAgent:
         if session_res.data and len(session_res.data) > 0:
             summary = session_res.data[0].get("topic", "")
 
-        # B. Get Recent Messages (Last 5)
-        # Note: We fetch order by desc limit 5, then reverse to preserve logical order
+        # B. Get Recent Messages (Last RECENT_MESSAGES)
+        # Note: We fetch order by desc limit N, then reverse to preserve logical order
         msg_res = self.supabase.table("chat_messages")\
             .select("role, content")\
             .eq("session_id", session_id)\
             .order("created_at", desc=True)\
-            .limit(5)\
+            .limit(RECENT_MESSAGES)\
             .execute()
         
         recent_messages = msg_res.data[::-1] if msg_res.data else []
+        for m in recent_messages:
+            m["content"] = (m.get("content") or "")[:MAX_MESSAGE_CHARS]
         
         return summary, recent_messages
 
@@ -50,65 +82,148 @@ class MemoryAgent:
 
     def check_and_summarize(self, session_id: str):
         """
-        Checks total message count. If > 10, triggers summarization.
+        Once the session has more than SUMMARY_MIN_MESSAGES messages, folds every SUMMARY_EVERY
+        new messages into the existing summary (older turns are represented by the summary itself).
         """
-        count_res = self.supabase.table("chat_messages")\
-            .select("id", count="exact")\
-            .eq("session_id", session_id)\
-            .execute()
-        
-        total_count = count_res.count
+        watermark = self._summarized_until.get(session_id)
+        query = self.supabase.table("chat_messages")\
+            .select("role, content, created_at")\
+            .eq("session_id", session_id)
+        if watermark:
+            query = query.gt("created_at", watermark)
+        msgs = query.order("created_at", desc=False).execute().data or []
 
-        # Logic: Trigger summarization if count > 10 
-        # (For optimization, we might want to flag if already summarized, but MVP is strictly > 10)
-        if total_count and total_count > 10:
-            self._generate_and_save_summary(session_id)
+        if len(msgs) < (SUMMARY_EVERY if watermark else SUMMARY_MIN_MESSAGES + 1):
+            return
+        self._generate_and_save_summary(session_id, msgs)
 
-    def _generate_and_save_summary(self, session_id: str):
+    def _generate_and_save_summary(self, session_id: str, msgs):
         """
-        Fetches ALL history, asks Gemini to summarize, and updates chat_sessions.
+        Asks Gemini to update the session summary with the new messages, and saves it to chat_sessions.
         """
-        # Fetch all history
-        all_msgs_res = self.supabase.table("chat_messages")\
-            .select("role, content")\
-            .eq("session_id", session_id)\
-            .order("created_at", desc=False)\
-            .execute()
-        
-        history_text = "\n".join([f"{m['role']}: {m['content']}" for m in all_msgs_res.data])
-        
+        session_res = self.supabase.table("chat_sessions").select("topic").eq("id", session_id).execute()
+        previous = (session_res.data[0].get("topic") if session_res.data else None) or "(none)"
+        history_text = "\n".join([f"{m['role']}: {(m.get('content') or '')[:MAX_MESSAGE_CHARS]}" for m in msgs])
+
         prompt = f"""
         [System]
-        Analyze the following conversation history.
+        Update the summary of this counseling session with the new messages.
         Summarize the user's **key characteristics** and the **main counseling topic** in ONE sentence.
-        
-        [History]
+
+        [Previous Summary]
+        {previous}
+
+        [New Messages]
         {history_text}
-        
+
         [Summary]
         """
         
-        response = self.model.generate_content(prompt)
-        summary_text = response.text.strip()
+        with timed("gemini summarize"):
+            summary_text = self.llm.generate(prompt, self.model_name).strip()
         
         # Update Session Topic
         self.supabase.table("chat_sessions")\
             .update({"topic": summary_text})\
             .eq("id", session_id)\
             .execute()
+        self._summarized_until.set(session_id, msgs[-1]["created_at"])
             
         print(f"✅ Session {session_id} Summarized: {summary_text}")
 
+    def _get_distill_watermark(self, session_id: str):
+        if session_id not in self._distilled_until:
+            res = self.supabase.table("user_memories")\
+                .select("metadata")\
+                .eq("metadata->>session_id", session_id)\
+                .order("created_at", desc=True)\
+                .limit(1)\
+                .execute()
+            self._distilled_until[session_id] = (res.data[0]["metadata"] or {}).get("until") if res.data else None
+        return self._distilled_until[session_id]
+
+    def distill_session(self, session_id: str, user_id: str):
+        """
+        Turns messages since the last distillation into a few embedded memory records.
+        Skipped while another distillation of the same session is still running.
+        """
+        with self._distill_lock:
+            if session_id in self._distilling:
+                return
+            self._distilling.add(session_id)
+        try:
+            self._distill(session_id, user_id)
+        finally:
+            with self._distill_lock:
+                self._distilling.discard(session_id)
+
+    def _distill(self, session_id: str, user_id: str):
+        query = self.supabase.table("chat_messages")\
+            .select("role, content, created_at")\
+            .eq("session_id", session_id)
+        watermark = self._get_distill_watermark(session_id)
+        if watermark:
+            query = query.gt("created_at", watermark)
+        msgs = query.order("created_at", desc=False).execute().data or []
+
+        if len(msgs) < DISTILL_EVERY:
+            return
+
+        history_text = "\n".join([f"{m['role']}: {m['content']}" for m in msgs])
+        prompt = f"""
+        [System]
+        From the conversation below, extract up to 5 durable facts about the client
+        (concerns, goals, life events, emotional patterns, preferences) that will help future counseling.
+        Each fact must be one short standalone sentence in Korean.
+        Return a JSON array of strings.
+
+        [History]
+        {history_text}
+        """
+        with timed("gemini distill"):
+            text = self.llm.generate(prompt, self.model_name, {"response_mime_type": "application/json"})
+        try:
+            facts = json.loads(text)
+        except ValueError:
+            facts = [line.strip("-• ").strip() for line in text.splitlines()]
+        if not isinstance(facts, list):
+            facts = [facts]
+        facts = [str(f) for f in facts if f][:5]
+
+        until = msgs[-1]["created_at"]
+        saved = self.memory.add_many(user_id, facts, {"session_id": session_id, "until": until}) if facts else 0
+        # advance even when nothing was extracted, so the same messages aren't sent again next turn
+        self._distilled_until[session_id] = until
+        print(f"🧠 Session {session_id}: {saved} memories distilled")
+
+    def _run_background_tasks(self, session_id: str, user_id: str):
+        try:
+            self.check_and_summarize(session_id)
+            if user_id:
+                self.distill_session(session_id, user_id)
+        except Exception as e:
+            print(f"⚠️ Memory background task failed: {e}")
+
     def chat(self, session_id: str, user_input: str):
         # 1. Save User Message
         self.log_message(session_id, "user", user_input)
 
-        # 2. Build Context
+        # 2. Build Context (fixed size: summary + recalled memories + recent turns)
         summary, recent_msgs = self.get_chat_context(session_id)
+        user_id = self._get_user_id(session_id)
+        try:
+            memories = self.memory.recall(user_id, user_input)
+        except Exception as e:
+            print(f"⚠️ Memory recall failed: {e}")
+            memories = []
         
         system_context = ""
         if summary:
             system_context += f"Previous Summary: {summary}\n"
+        if memories:
+            system_context += "[Long-Term Memory]\n"
+            for m in memories:
+                system_context += f"- {m['content']}\n"
         
         context_prompt = f"""
         {system_context}
@@ -120,13 +235,13 @@ class MemoryAgent:
         final_prompt = f"{context_prompt}\nUser: {user_input}\nAssistant:"
 
         # 3. Generate Answer
-        response = self.model.generate_content(final_prompt)
-        answer = response.text
+        with timed("gemini chat"):
+            answer = self.llm.generate(final_prompt, self.model_name)
 
         # 4. Save Assistant Message
         self.log_message(session_id, "assistant", answer)
 
-        # 5. Background Task: Summarize if needed
-        self.check_and_summarize(session_id)
+        # 5. Background Task: Summarize + distill memories (off the response path)
+        self.memory.submit(self._run_background_tasks, session_id, user_id)
 
         return answer
@@ -0,0 +1,177 @@
+"""
+Long-Term Memory Store
+세션 대화를 짧은 기억 레코드로 요약(distill)해 user_memories 테이블에 임베딩과 함께 저장하고,
+매 턴마다 질문과 관련된 기억 top-k 만 불러옵니다.
+
+- 자주 쓰는 사용자(hot user)의 기억은 프로세스 안의 NumPy 인덱스에서 바로 검색
+- 그 외에는 match_memories RPC 로 검색하고, 백그라운드에서 로컬 인덱스를 채움
+- 로컬 인덱스는 MEMORY_INDEX_TTL 이 지나면 백그라운드에서 다시 읽음 (다른 워커가 저장한 기억 반영)
+- 같은 사용자의 인덱스 적재(select)와 기억 저장(insert)은 사용자 락 안에서 실행되어 서로 놓치지 않음
+"""
+
+import os
+import json
+import time
+import zlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from src.clients import configure_genai, timed
+
+MEMORY_EMBED_MODEL = "models/text-embedding-004"  # user_memories.embedding vector(768)
+MEMORY_TOP_K = int(os.getenv("MEMORY_TOP_K", "5"))
+MEMORY_MATCH_THRESHOLD = float(os.getenv("MEMORY_MATCH_THRESHOLD", "0.5"))
+MEMORY_HOT_USERS = int(os.getenv("MEMORY_HOT_USERS", "256"))
+MEMORY_INDEX_TTL = int(os.getenv("MEMORY_INDEX_TTL", "300"))
+_USER_LOCK_STRIPES = 64
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="memory")
+
+
+def embed_texts(texts, task_type: str = "retrieval_document"):
+    """Gemini 임베딩 (여러 문장을 한 번에)."""
+    genai = configure_genai()
+    with timed("gemini embed_content"):
+        result = genai.embed_content(model=MEMORY_EMBED_MODEL, content=list(texts), task_type=task_type)
+    return np.asarray(result["embedding"], dtype=np.float32)
+
+
+def _parse_embedding(value):
+    # pgvector 는 REST 로 '[0.1,0.2,...]' 문자열을 돌려줍니다.
+    if isinstance(value, str):
+        value = json.loads(value)
+    return np.asarray(value, dtype=np.float32)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class _UserIndex:
+    def __init__(self, rows):
+        self.lock = threading.Lock()
+        self.loaded_at = time.monotonic()
+        self.contents = [r["content"] for r in rows]
+        self.metadata = [r.get("metadata") or {} for r in rows]
+        if rows:
+            self.vectors = _normalize(np.stack([_parse_embedding(r["embedding"]) for r in rows]))
+        else:
+            self.vectors = np.empty((0, 768), dtype=np.float32)
+
+    def expired(self, ttl: int = MEMORY_INDEX_TTL) -> bool:
+        return time.monotonic() - self.loaded_at > ttl
+
+    def add(self, content, vector, metadata):
+        with self.lock:
+            self.contents.append(content)
+            self.metadata.append(metadata or {})
+            self.vectors = np.vstack([self.vectors, _normalize(vector[None, :])])
+
+    def search(self, query_vec, k, threshold):
+        with self.lock:
+            if not self.contents:
+                return []
+            scores = self.vectors @ _normalize(query_vec)
+            top = np.argsort(-scores)[:k]
+            return [
+                {"content": self.contents[i], "similarity": float(scores[i]), "metadata": self.metadata[i]}
+                for i in top if scores[i] > threshold
+            ]
+
+
+class MemoryStore:
+    def __init__(self, supabase, max_hot_users: int = MEMORY_HOT_USERS):
+        self.supabase = supabase
+        self.max_hot_users = max_hot_users
+        self._hot = OrderedDict()  # user_id -> _UserIndex (LRU)
+        self._loading = set()
+        self._lock = threading.Lock()
+        # 사용자별 락 (고정 개수로 나눠 사용자 수만큼 늘어나지 않게)
+        self._user_locks = [threading.Lock() for _ in range(_USER_LOCK_STRIPES)]
+
+    def _user_lock(self, user_id):
+        return self._user_locks[zlib.crc32(str(user_id).encode("utf-8")) % _USER_LOCK_STRIPES]
+
+    # --- Local index (hot users) ---
+    def _get_hot(self, user_id):
+        with self._lock:
+            index = self._hot.get(user_id)
+            if index is not None:
+                self._hot.move_to_end(user_id)
+        if index is not None and index.expired():
+            # 만료된 인덱스는 새로 읽는 동안에도 계속 사용합니다.
+            self._warm_in_background(user_id)
+        return index
+
+    def _load_user(self, user_id):
+        try:
+            # select 와 교체를 사용자 락 안에서: 그 사이에 저장된 기억이 빠진 스냅샷으로 덮어쓰지 않도록
+            with self._user_lock(user_id):
+                res = self.supabase.table("user_memories")\
+                    .select("content, embedding, metadata")\
+                    .eq("user_id", user_id)\
+                    .execute()
+                index = _UserIndex(res.data or [])
+                with self._lock:
+                    self._hot[user_id] = index
+                    self._hot.move_to_end(user_id)
+                    while len(self._hot) > self.max_hot_users:
+                        self._hot.popitem(last=False)
+        except Exception as e:
+            print(f"⚠️ Memory warm-up failed for {user_id}: {e}")
+        finally:
+            with self._lock:
+                self._loading.discard(user_id)
+
+    def _warm_in_background(self, user_id):
+        with self._lock:
+            index = self._hot.get(user_id)
+            if user_id in self._loading or (index is not None and not index.expired()):
+                return
+            self._loading.add(user_id)
+        _executor.submit(self._load_user, user_id)
+
+    # --- Public API ---
+    def recall(self, user_id, query: str, k: int = MEMORY_TOP_K, threshold: float = MEMORY_MATCH_THRESHOLD):
+        """질문과 관련된 기억 top-k 를 반환합니다."""
+        if not user_id or not query:
+            return []
+        query_vec = embed_texts([query], task_type="retrieval_query")[0]
+
+        index = self._get_hot(user_id)
+        if index is not None:
+            return index.search(query_vec, k, threshold)
+
+        self._warm_in_background(user_id)
+        res = self.supabase.rpc("match_memories", {
+            "query_embedding": query_vec.tolist(),
+            "match_threshold": threshold,
+            "match_count": k,
+            "filter_user_id": user_id,
+        }).execute()
+        return res.data or []
+
+    def add_many(self, user_id, contents, metadata: dict = None):
+        """기억 레코드를 임베딩해서 저장하고, 로컬 인덱스에도 반영합니다."""
+        contents = [c for c in contents if c and c.strip()]
+        if not contents:
+            return 0
+        vectors = embed_texts(contents)
+        records = [
+            {"user_id": user_id, "content": c, "embedding": v.tolist(), "metadata": metadata or {}}
+            for c, v in zip(contents, vectors)
+        ]
+        with self._user_lock(user_id):
+            self.supabase.table("user_memories").insert(records).execute()
+            index = self._get_hot(user_id)
+            if index is not None:
+                for c, v in zip(contents, vectors):
+                    index.add(c, v, metadata)
+        return len(records)
+
+    def submit(self, fn, *args):
+        """기억 요약/저장 작업을 응답 경로 밖(백그라운드)에서 실행합니다."""
+        return _executor.submit(fn, *args)
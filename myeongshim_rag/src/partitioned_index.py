@@ -0,0 +1,134 @@
+"""
+Partitioned Index
+도메인별로 나눈 양자화 인덱스(QuantizedIndex) 묶음입니다.
+질문마다 QueryRouter 가 고른 파티션만 검색하고 점수 순으로 합칩니다.
+
+파일 구성 (PARTITION_PATH):
+- <domain>/       : 도메인별 QuantizedIndex 파일
+- centroids.npy   : 도메인 중심 벡터 (domains.json 의 순서)
+- domains.json    : 도메인 이름, 청크 수
+
+사용: RAG_INDEX_FORMAT=partitioned (ingest 시 자동 생성)
+      python -m src.partitioned_index build   (Chroma 에서 재임베딩 없이 다시 나누기)
+"""
+
+import os
+import json
+
+import numpy as np
+
+from src.quantized_index import QuantizedIndex, build_index, RESCORE_FACTOR
+from src.domain_router import QueryRouter, classify_source, EXCLUDED_DOMAINS
+
+PARTITION_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "pindex")
+PARTITION_DTYPE = os.getenv("RAG_PARTITION_DTYPE", "int8")
+
+
+def build_partitions(vectors, documents, metadatas, path: str = PARTITION_PATH, dtype: str = PARTITION_DTYPE):
+    """청크를 출처 기준으로 도메인에 나누어 파티션별 인덱스와 중심 벡터를 저장합니다."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    groups = {}
+    for i, meta in enumerate(metadatas):
+        meta = dict(meta or {})
+        meta["domain"] = classify_source(meta.get("source"))
+        groups.setdefault(meta["domain"], []).append((i, meta))
+
+    os.makedirs(path, exist_ok=True)
+    domains, centroids = [], []
+    for domain, items in sorted(groups.items()):
+        ids = [i for i, _ in items]
+        sub = vectors[ids]
+        build_index(sub, [documents[i] for i in ids], [m for _, m in items], os.path.join(path, domain), dtype)
+        normed = sub / np.maximum(np.linalg.norm(sub, axis=1, keepdims=True), 1e-12)
+        domains.append({"name": domain, "count": len(ids)})
+        centroids.append(normed.mean(axis=0))
+
+    np.save(os.path.join(path, "centroids.npy"), np.asarray(centroids, dtype=np.float32))
+    with open(os.path.join(path, "domains.json"), "w", encoding="utf-8") as f:
+        json.dump(domains, f, ensure_ascii=False)
+    return domains
+
+
+def build_partitions_from_chroma(db_path: str, path: str = PARTITION_PATH, dtype: str = PARTITION_DTYPE,
+                                 collection_name: str = None):
+    """Chroma 컬렉션(기본: active 임베딩 공간)에 저장된 벡터를 그대로 사용해 파티션을 만듭니다."""
+    from src.embedding_space import read_collection
+
+    vectors, documents, metadatas = read_collection(db_path, collection_name)
+
+    if not documents:
+        return []
+    return build_partitions(vectors, documents, metadatas, path, dtype)
+
+
+class PartitionedIndex:
+    # ContextAssembler 가 질문 문자열도 넘겨 주도록 알리는 표시
+    routes_queries = True
+
+    def __init__(self, path: str = PARTITION_PATH, excluded=EXCLUDED_DOMAINS):
+        with open(os.path.join(path, "domains.json"), encoding="utf-8") as f:
+            names = [d["name"] for d in json.load(f)]
+        centroids = np.load(os.path.join(path, "centroids.npy"))
+
+        self.partitions = {
+            name: QuantizedIndex(os.path.join(path, name)) for name in names if name not in excluded
+        }
+        self.router = QueryRouter(
+            {name: c for name, c in zip(names, centroids) if name in self.partitions}, excluded=excluded
+        )
+        self.format = f"partitioned/{next(iter(self.partitions.values())).format}" if self.partitions else "partitioned"
+
+    def __len__(self):
+        return sum(len(p) for p in self.partitions.values())
+
+    def query_batch(self, query_vecs, n_results: int, questions=None):
+        """
+        질문별로 라우팅된 파티션만 검색합니다. 같은 파티션을 쓰는 질의는 한 번의 행렬 검색으로 묶습니다.
+        questions 가 없으면 centroid 만으로 라우팅합니다.
+        """
+        query_vecs = np.atleast_2d(np.asarray(query_vecs, dtype=np.float32))
+        questions = questions or [""] * len(query_vecs)
+        routes = [self.router.route(q, v) for q, v in zip(questions, query_vecs)]
+
+        hits = [[] for _ in range(len(query_vecs))]  # (점수, 도메인, 행 번호)
+        for name, index in self.partitions.items():
+            members = [i for i, route in enumerate(routes) if name in route]
+            if not members:
+                continue
+            for i, (ids, scores) in zip(members, index.search_batch(query_vecs[members], n_results, RESCORE_FACTOR)):
+                hits[i].extend((float(s), name, int(r)) for r, s in zip(ids, scores))
+
+        results = []
+        for found in hits:
+            found.sort(key=lambda h: -h[0])
+            candidates, vectors = [], []
+            for _, name, row in found[:n_results]:
+                cands, vecs = self.partitions[name]._to_candidates([row])
+                candidates.extend(cands)
+                vectors.append(vecs[0])
+            dim = query_vecs.shape[1]
+            results.append((candidates, np.asarray(vectors, dtype=np.float32).reshape(-1, dim)))
+        return results
+
+    def query(self, query_vec, n_results: int, question: str = None):
+        return self.query_batch([query_vec], n_results, [question or ""])[0]
+
+    def resident_bytes(self) -> int:
+        return sum(p.resident_bytes() for p in self.partitions.values())
+
+    def mapped_bytes(self) -> int:
+        return sum(p.mapped_bytes() for p in self.partitions.values())
+
+
+if __name__ == "__main__":
+    import sys
+
+    from src.embedding_space import active_space, build_space_index, space_path
+
+    if len(sys.argv) > 1 and sys.argv[1] == "build":
+        from src.ingest import DB_PATH
+        build_space_index(DB_PATH, active_space()[1], "partitioned")
+    else:
+        index = PartitionedIndex(space_path(PARTITION_PATH, active_space()[1]))
+        print(f"{len(index)} vectors in {len(index.partitions)} partitions "
+              f"(excluded: {', '.join(sorted(EXCLUDED_DOMAINS)) or '-'})")
@@ -0,0 +1,164 @@
+"""
+Profiling
+운영 중 /ask 지연이 튈 때 원인을 보기 위한 도구입니다.
+
+- SamplingProfiler: 켜 둔 동안만 모든 스레드의 스택을 주기적으로 샘플링하고
+  flamegraph.pl / speedscope 에 바로 넣을 수 있는 collapsed-stack 텍스트로 돌려줌
+- 요청 트레이스: 단계별 시간(stage)과 프롬프트/컨텍스트 크기(note)를 기록하고,
+  SLOW_REQUEST_MS 보다 느린 요청만 고정 크기 링 버퍼(slow_requests)에 보관
+"""
+
+import os
+import sys
+import time
+import threading
+import contextvars
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+PROFILER_INTERVAL_MS = float(os.getenv("PROFILER_INTERVAL_MS", "10"))
+PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", "120"))
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "3000"))
+SLOW_REQUEST_BUFFER = int(os.getenv("SLOW_REQUEST_BUFFER", "100"))
+
+
+class SamplingProfiler:
+    """sys._current_frames() 샘플링 프로파일러 (켜져 있을 때만 비용 발생, 최대 PROFILER_MAX_SECONDS)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._stacks = Counter()
+        self.samples = 0
+        self.started_at = None
+        self.interval = PROFILER_INTERVAL_MS / 1000
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval_ms: float = PROFILER_INTERVAL_MS, max_seconds: float = PROFILER_MAX_SECONDS):
+        with self._lock:
+            if self.running:
+                return False
+            self._stacks = Counter()
+            self.samples = 0
+            self.interval = max(interval_ms, 1.0) / 1000
+            self.started_at = time.monotonic()
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, args=(max_seconds,), name="sampling-profiler", daemon=True
+            )
+            self._thread.start()
+            return True
+
+    def _run(self, max_seconds: float):
+        me = threading.get_ident()
+        names = {}
+        deadline = time.monotonic() + max_seconds
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            if len(names) != threading.active_count():
+                names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self._stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self) -> str:
+        """프로파일러를 멈추고 collapsed-stack 텍스트('프레임;프레임;... 횟수' 줄 목록)를 반환합니다."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.collapsed()
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self._stacks.most_common())
+
+    def status(self):
+        return {
+            "running": self.running,
+            "samples": self.samples,
+            "interval_ms": self.interval * 1000,
+            "elapsed_s": round(time.monotonic() - self.started_at, 1) if self.started_at else None,
+        }
+
+
+profiler = SamplingProfiler()
+
+
+# --- Request traces ---
+class RequestTrace:
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self.stages = {}
+        self.notes = {}
+        self._lock = threading.Lock()
+
+    def add_stage(self, name: str, seconds: float):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def to_dict(self, total_ms: float):
+        return {
+            "name": self.name,
+            "started_at": self.started_at,
+            "total_ms": round(total_ms, 1),
+            "stages_ms": {k: round(v * 1000, 1) for k, v in self.stages.items()},
+            **self.notes,
+        }
+
+
+_current = contextvars.ContextVar("request_trace", default=None)
+slow_requests = deque(maxlen=SLOW_REQUEST_BUFFER)
+
+
+@contextmanager
+def trace_request(name: str, slow_ms: float = SLOW_REQUEST_MS):
+    """요청 하나를 감쌉니다. slow_ms 보다 오래 걸리면 slow_requests 에 남깁니다."""
+    trace = RequestTrace(name)
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+        total_ms = (time.perf_counter() - trace.started) * 1000
+        if total_ms >= slow_ms:
+            slow_requests.append(trace.to_dict(total_ms))
+
+
+@contextmanager
+def stage(name: str):
+    """현재 요청 트레이스에 단계 시간을 더합니다 (트레이스 밖에서는 아무것도 하지 않음)."""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add_stage(name, time.perf_counter() - started)
+
+
+def note(**values):
+    """현재 요청 트레이스에 크기 등의 값을 기록합니다. 숫자는 누적합니다."""
+    trace = _current.get()
+    if trace is None:
+        return
+    with trace._lock:
+        for key, value in values.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                trace.notes[key] = trace.notes.get(key, 0) + value
+            else:
+                trace.notes[key] = value
@@ -0,0 +1,237 @@
+"""
+Quantized Vector Index
+Chroma 에 저장된 768차원 float32 벡터를 float16 또는 int8(벡터별 스케일) 로 압축해
+메모리 맵 파일로 보관합니다. 여러 워커가 같은 파일을 매핑하므로 OS 페이지 캐시를 공유하고,
+상위 후보만 float32 원본으로 다시 점수를 매겨(rescoring) 정확도를 유지합니다.
+
+파일 구성 (INDEX_PATH):
+- vectors.q.npy   : 양자화 벡터 (float16 또는 int8)
+- scales.npy      : int8 일 때 벡터별 스케일
+- vectors.f32.npy : rescoring 용 정규화된 float32 원본 (필요한 행만 디스크에서 읽음)
+- docs.jsonl      : 청크 본문과 메타데이터 (메모리 맵, 필요한 줄만 읽음)
+- docs.offsets.npy: docs.jsonl 의 줄별 바이트 오프셋 (개수 + 1)
+- meta.json       : 포맷, 차원, 개수
+"""
+
+import os
+import json
+import time
+
+import numpy as np
+
+INDEX_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "qindex")
+INDEX_FORMAT = os.getenv("RAG_INDEX_FORMAT", "chroma")  # chroma | float16 | int8 | pgvector | partitioned | sharded
+RESCORE_FACTOR = int(os.getenv("RAG_RESCORE_FACTOR", "4"))
+BLOCK_SIZE = 65536
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return (vectors / np.maximum(norms, 1e-12)).astype(np.float32)
+
+
+def quantize(vectors: np.ndarray, dtype: str):
+    """정규화된 float32 벡터를 양자화합니다. (int8 은 벡터별 대칭 스케일 사용)"""
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    if dtype == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales = np.maximum(scales, 1e-12).astype(np.float32)
+        q = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return q, scales
+    raise ValueError(f"Unsupported index format: {dtype}")
+
+
+def build_index(vectors, documents, metadatas, path: str = INDEX_PATH, dtype: str = "int8"):
+    """벡터와 문서를 양자화 인덱스 파일로 저장합니다."""
+    os.makedirs(path, exist_ok=True)
+    full = _normalize(np.asarray(vectors, dtype=np.float32))
+    q, scales = quantize(full, dtype)
+
+    np.save(os.path.join(path, "vectors.q.npy"), q)
+    np.save(os.path.join(path, "vectors.f32.npy"), full)
+    if scales is not None:
+        np.save(os.path.join(path, "scales.npy"), scales)
+
+    offsets = [0]
+    with open(os.path.join(path, "docs.jsonl"), "wb") as f:
+        for doc, meta in zip(documents, metadatas):
+            line = (json.dumps({"content": doc, "metadata": meta or {}}, ensure_ascii=False) + "\n").encode("utf-8")
+            f.write(line)
+            offsets.append(offsets[-1] + len(line))
+    np.save(os.path.join(path, "docs.offsets.npy"), np.asarray(offsets, dtype=np.int64))
+
+    with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"format": dtype, "dim": int(full.shape[1]), "count": int(full.shape[0])}, f)
+
+    return path
+
+
+def build_index_from_chroma(db_path: str, path: str = INDEX_PATH, dtype: str = "int8", collection_name: str = None):
+    """Chroma 컬렉션(기본: active 임베딩 공간)의 벡터를 읽어 양자화 인덱스를 만듭니다."""
+    from src.embedding_space import read_collection
+
+    vectors, documents, metadatas = read_collection(db_path, collection_name)
+
+    if not documents:
+        return None
+    return build_index(vectors, documents, metadatas, path, dtype)
+
+
+class QuantizedIndex:
+    def __init__(self, path: str = INDEX_PATH):
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.format = self.meta["format"]
+
+        # mmap_mode="r": 워커들이 같은 파일 페이지를 공유합니다.
+        self.q = np.load(os.path.join(path, "vectors.q.npy"), mmap_mode="r")
+        self.full = np.load(os.path.join(path, "vectors.f32.npy"), mmap_mode="r")
+        scales_path = os.path.join(path, "scales.npy")
+        self.scales = np.load(scales_path, mmap_mode="r") if os.path.exists(scales_path) else None
+
+        # 청크 본문도 파이썬 리스트로 올리지 않고 매핑해 두고, 반환할 후보의 줄만 읽습니다.
+        docs_path = os.path.join(path, "docs.jsonl")
+        if os.path.getsize(docs_path):
+            self.doc_blob = np.memmap(docs_path, dtype=np.uint8, mode="r")
+        else:
+            self.doc_blob = np.empty(0, dtype=np.uint8)
+        offsets_path = os.path.join(path, "docs.offsets.npy")
+        if os.path.exists(offsets_path):
+            self.doc_offsets = np.load(offsets_path, mmap_mode="r")
+        else:
+            # 오프셋 파일이 없는 이전 인덱스: 줄 끝 위치로 계산
+            ends = np.flatnonzero(np.asarray(self.doc_blob) == ord("\n")) + 1
+            self.doc_offsets = np.concatenate([[0], ends]).astype(np.int64)
+
+    def __len__(self):
+        return self.q.shape[0]
+
+    def approximate_scores(self, query: np.ndarray) -> np.ndarray:
+        """양자화 벡터로 코사인 유사도를 근사합니다. 블록 단위로 계산해 float32 전체 복사를 피합니다."""
+        return self.approximate_scores_batch(query[None, :])[0]
+
+    def approximate_scores_batch(self, queries: np.ndarray) -> np.ndarray:
+        """(질의 수, 벡터 수) 근사 점수 행렬. 블록마다 한 번의 행렬곱으로 모든 질의를 계산합니다."""
+        scores = np.empty((queries.shape[0], len(self)), dtype=np.float32)
+        for start in range(0, len(self), BLOCK_SIZE):
+            block = np.asarray(self.q[start:start + BLOCK_SIZE], dtype=np.float32)
+            s = queries @ block.T
+            if self.scales is not None:
+                s *= self.scales[start:start + BLOCK_SIZE]
+            scores[:, start:start + BLOCK_SIZE] = s
+        return scores
+
+    def _rescore(self, query: np.ndarray, approx: np.ndarray, k: int, rescore_factor: int):
+        shortlist = min(len(self), max(k, k * rescore_factor))
+        cand = np.argpartition(-approx, shortlist - 1)[:shortlist]
+        cand.sort()  # mmap 에서 순차 접근이 되도록 정렬
+
+        exact = np.asarray(self.full[cand]) @ query
+        top = np.argsort(-exact)[:k]
+        return cand[top], exact[top]
+
+    def search_batch(self, query_vecs, k: int, rescore_factor: int = RESCORE_FACTOR):
+        """여러 질의의 상위 k 개 (인덱스, 점수) 목록을 반환합니다."""
+        queries = _normalize(np.atleast_2d(np.asarray(query_vecs, dtype=np.float32)))
+        if len(self) == 0:
+            empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+            return [empty for _ in range(len(queries))]
+
+        approx = self.approximate_scores_batch(queries)
+        return [self._rescore(q, a, k, rescore_factor) for q, a in zip(queries, approx)]
+
+    def search(self, query_vec, k: int, rescore_factor: int = RESCORE_FACTOR):
+        """
+        (인덱스, 점수) 상위 k 개를 반환합니다.
+        양자화 점수로 k * rescore_factor 개를 고른 뒤 float32 원본으로 다시 정렬합니다.
+        """
+        return self.search_batch([query_vec], k, rescore_factor)[0]
+
+    def _doc(self, i: int) -> dict:
+        return json.loads(bytes(self.doc_blob[self.doc_offsets[i]:self.doc_offsets[i + 1]]))
+
+    def _to_candidates(self, ids):
+        candidates = []
+        for i in ids:
+            doc = self._doc(int(i))
+            meta = doc.get("metadata") or {}
+            candidates.append({"content": doc["content"], "source": meta.get("source", "Unknown"), "metadata": meta})
+        return candidates, np.asarray(self.full[ids], dtype=np.float32)
+
+    def query(self, query_vec, n_results: int):
+        """ContextAssembler 가 사용하는 후보 형식(청크 목록, float32 벡터)으로 반환합니다."""
+        return self.query_batch([query_vec], n_results)[0]
+
+    def query_batch(self, query_vecs, n_results: int):
+        return [self._to_candidates(ids) for ids, _ in self.search_batch(query_vecs, n_results)]
+
+    def resident_bytes(self) -> int:
+        """
+        검색 시 상주하는 바이트 수: 매 질의 전체를 훑는 양자화 벡터/스케일과 문서 오프셋.
+        rescoring 용 float32 파일과 docs.jsonl 은 상위 후보 행만 읽습니다 (mapped_bytes 참고).
+        """
+        total = self.q.nbytes + self.doc_offsets.nbytes
+        if self.scales is not None:
+            total += self.scales.nbytes
+        return total
+
+    def mapped_bytes(self) -> int:
+        """매핑된 파일 전체 바이트 수 (상주 + 필요할 때만 읽는 float32 원본과 청크 본문)."""
+        return self.resident_bytes() + self.full.nbytes + self.doc_blob.nbytes
+
+
+def recall_report(vectors=None, n: int = 20000, dim: int = 768, queries: int = 200, k: int = 10):
+    """
+    float32 전체 탐색 대비 float16 / int8 인덱스의 recall@k 와 메모리를 측정합니다.
+    vectors 가 없으면 군집 구조를 가진 합성 데이터를 사용합니다.
+    """
+    import tempfile
+
+    rng = np.random.default_rng(42)
+    if vectors is None:
+        centers = rng.normal(size=(64, dim))
+        vectors = centers[rng.integers(0, 64, n)] + 0.5 * rng.normal(size=(n, dim))
+    full = _normalize(np.asarray(vectors, dtype=np.float32))
+    q_idx = rng.choice(len(full), size=min(queries, len(full)), replace=False)
+    qs = _normalize(full[q_idx] + 0.1 * rng.normal(size=(len(q_idx), full.shape[1])))
+
+    started = time.perf_counter()
+    truth = [set(np.argsort(-(full @ q))[:k]) for q in qs]
+    exact_ms = (time.perf_counter() - started) / len(qs) * 1000
+    rows = [("float32", full.nbytes, full.nbytes, 1.0, 1.0, exact_ms)]
+
+    for dtype in ("float16", "int8"):
+        with tempfile.TemporaryDirectory() as tmp:
+            build_index(full, [""] * len(full), [{}] * len(full), tmp, dtype)
+            index = QuantizedIndex(tmp)
+            raw_hits = rescored_hits = 0
+            elapsed = 0.0
+            for q, gt in zip(qs, truth):
+                raw_hits += len(gt & set(np.argsort(-index.approximate_scores(q))[:k]))
+                started = time.perf_counter()
+                ids, _ = index.search(q, k)
+                elapsed += time.perf_counter() - started
+                rescored_hits += len(gt & set(ids.tolist()))
+            elapsed = elapsed / len(qs) * 1000
+            rows.append((dtype, index.resident_bytes(), index.mapped_bytes(), raw_hits / (k * len(qs)),
+                         rescored_hits / (k * len(qs)), elapsed))
+            del index
+
+    print(f"{'format':<8} {'memory(MB)':>11} {'ratio':>6} {'mapped(MB)':>11} {'recall@'+str(k):>10} {'rescored':>9} "
+          f"{'ms/query':>9}")
+    for name, nbytes, mapped, recall, rescored, ms in rows:
+        print(f"{name:<8} {nbytes / 2**20:>11.1f} {full.nbytes / nbytes:>6.1f} {mapped / 2**20:>11.1f} {recall:>10.3f} "
+              f"{rescored:>9.3f} {ms:>9.2f}")
+    return rows
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == "build":
+        from src.ingest import DB_PATH
+        from src.embedding_space import active_space, build_space_index
+        build_space_index(DB_PATH, active_space()[1], sys.argv[2] if len(sys.argv) > 2 else "int8")
+    else:
+        recall_report()
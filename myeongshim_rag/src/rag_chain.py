@@ -1,33 +1,89 @@
 import os
-from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
+import asyncio
+import threading
+from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_chroma import Chroma
-from langchain.chains import RetrievalQA
 from langchain.prompts import PromptTemplate
 from dotenv import load_dotenv
+from src.manseryeok import fill_saju_data
+from src.context_assembler import ContextAssembler
+from src.quantized_index import QuantizedIndex, INDEX_FORMAT, INDEX_PATH
+from src.answer_cache import answer_cache, answer_key
+from src.llm_gateway import get_gateway
+from src.profiling import stage, note
+from src.glossary import load_glossary
+from src.embedding_space import load_spaces, space_path, check_collection, registry_version
 
 load_dotenv()
 
 DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "db")
+ASK_MANY_CONCURRENCY = int(os.getenv("ASK_MANY_CONCURRENCY", "4"))
+RAG_MODEL = os.getenv("RAG_MODEL", "gemini-2.0-flash")
+RAG_GENERATION_CONFIG = {"temperature": 0.7}
+# Replaced indexes (reload / cutover) are closed after this many seconds, once in-flight requests are done with them
+RETIRED_INDEX_GRACE = float(os.getenv("RETIRED_INDEX_GRACE", "30"))
+NOT_READY_ANSWER = "아직 지식 베이스가 준비되지 않았습니다. PDF를 업로드하고 학습(Ingest) 시켜주세요."
 
 class MyeongshimBrain:
     def __init__(self):
-        self.qa_chain = None
+        self.assembler = None
+        self.llm = None
+        self.prompt = None
+        self.glossary = None
+        self.space = None
+        self.space_version = None
+        self.dual_read = None  # optional hook(question, chunks), set while an embedding migration runs
+        self._reload_lock = threading.Lock()
         self._initialize_brain()
 
     def _initialize_brain(self):
+        # Term index built at ingest (definition fast path + term definitions in context)
+        self.glossary = load_glossary()
+        # Embedding space (model + collection) is read from the registry; a cutover changes its version
+        self.space_version = registry_version()
+        spaces = load_spaces()
+        space = spaces["spaces"][spaces["active"]]
+
         if not os.path.exists(DB_PATH) or not os.listdir(DB_PATH):
             print("Vector DB not found. Please run ingestion first.")
             return
 
         # 1. Load DB
-        embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
-        vectorstore = Chroma(persist_directory=DB_PATH, embedding_function=embeddings)
+        embeddings = GoogleGenerativeAIEmbeddings(model=space["model"])
+        vectorstore = Chroma(persist_directory=DB_PATH, collection_name=space["collection"],
+                             embedding_function=embeddings)
+        try:
+            check_collection(vectorstore._collection, space)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return
         
-        # 2. Retriver
-        retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
+        # 2. Context Assembler (over-fetch + MMR + token budget)
+        index = None
+        if INDEX_FORMAT == "pgvector":
+            from src.pg_retriever import PgVectorIndex, PGVECTOR_TABLE
+            index = PgVectorIndex(table=PGVECTOR_TABLE + space.get("suffix", "").replace("-", "_"))
+            print(f"Using pgvector backend (table: {index.table}).")
+        elif INDEX_FORMAT == "partitioned":
+            from src.partitioned_index import PartitionedIndex, PARTITION_PATH
+            partition_path = space_path(PARTITION_PATH, space)
+            if os.path.exists(os.path.join(partition_path, "domains.json")):
+                index = PartitionedIndex(partition_path)
+                print(f"Using {index.format} index ({len(index)} vectors, domains: {', '.join(index.partitions)}).")
+        elif INDEX_FORMAT == "sharded":
+            from src.sharded_index import ShardedIndex, SHARD_PATH
+            shard_path = space_path(SHARD_PATH, space)
+            if os.path.exists(os.path.join(shard_path, "shards.json")):
+                index = ShardedIndex(shard_path)
+                print(f"Using {index.format} index ({len(index)} vectors, {len(index.shards)} shards, "
+                      f"{index.workers} {index.pool} workers).")
+        elif INDEX_FORMAT != "chroma" and os.path.exists(os.path.join(space_path(INDEX_PATH, space), "meta.json")):
+            index = QuantizedIndex(space_path(INDEX_PATH, space))
+            print(f"Using {index.format} quantized index ({len(index)} vectors).")
+        assembler = ContextAssembler(vectorstore, embeddings, index=index)
 
-        # 3. LLM
-        llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0.7)
+        # 3. LLM (shared gateway: adaptive concurrency, retries, fallback model)
+        llm = get_gateway()
 
         # 4. Prompt
         # 4. Prompt
@@ -66,33 +122,48 @@ class MyeongshimBrain:
         
         prompt = PromptTemplate(template=template, input_variables=["context", "question"])
 
-        # 5. Chain
-        self.qa_chain = RetrievalQA.from_chain_type(
-            llm=llm,
-            chain_type="stuff",
-            retriever=retriever,
-            chain_type_kwargs={"prompt": prompt},
-            return_source_documents=True
-        )
-        print("MyeongshimBrain Initialized.")
+        previous = self.assembler
+        self.assembler = assembler
+        self.llm = llm
+        self.prompt = prompt
+        self.space = spaces["active"]
+        print(f"MyeongshimBrain Initialized (embedding space: {self.space}).")
+        if previous is not None and previous.index is not None:
+            self._retire_index(previous.index)
+
+    @staticmethod
+    def _retire_index(index):
+        """Closes a replaced index (shard worker pool, pgvector connection) after RETIRED_INDEX_GRACE seconds."""
+        close = getattr(index, "close", None)
+        if close is None:
+            return
+        timer = threading.Timer(RETIRED_INDEX_GRACE, close)
+        timer.daemon = True
+        timer.start()
 
     def reload(self):
-        self._initialize_brain()
+        with self._reload_lock:
+            self._initialize_brain()
+
+    def _follow_cutover(self):
+        """Embedding space cutover -> rebuild the assembler in a background thread; requests keep the old one meanwhile."""
+        if registry_version() == self.space_version or not self._reload_lock.acquire(blocking=False):
+            return
+        threading.Thread(target=self._reload_after_cutover, name="brain-cutover", daemon=True).start()
+
+    def _reload_after_cutover(self):
+        try:
+            if registry_version() != self.space_version:
+                self._initialize_brain()
+        except Exception as e:
+            print(f"⚠️ Reload after embedding cutover failed: {e}")
+        finally:
+            self._reload_lock.release()
+
+    def _format_saju(self, saju_data: dict = None) -> str:
+        # 4기둥이 비어 있으면 만세력 엔진으로 미리 채워서 모델이 간지를 추론하지 않도록 합니다.
+        saju_data = fill_saju_data(saju_data)
 
-    def get_answer(self, question: str, saju_data: dict = None):
-        if not self.qa_chain:
-            return {"answer": "아직 지식 베이스가 준비되지 않았습니다. PDF를 업로드하고 학습(Ingest) 시켜주세요.", "sources": []}
-        
-        # [Enhanced Logic] Inject Saju Data into the Query Context (Silent Injection)
-        # We append it to the query so it becomes part of the reasoning input, 
-        # but we DON'T want it to mess up retrieval too much.
-        # However, for RetrievalQA, the 'query' is used for BOTH retrieval and generation.
-        # To avoid retrieving irrelevant docs (matching saju terms), we should keep the query clean for retrieval if possible.
-        # But RetrievalQA is rigid.
-        # Strategy: Append Saju Info to the PROMPT via the question string sent to LLM?
-        # No, RetrievalQA sends 'query' to LLM as {question}.
-        # So we modify the question string effectively.
-        
         formatted_saju = ""
         if saju_data:
             formatted_saju = f"""
@@ -103,18 +174,130 @@ class MyeongshimBrain:
 - Current Daewoon: {str(saju_data.get('current_luck_cycle', {}))}
 - Current Year Luck: {str(saju_data.get('current_yearly_luck', {}))}
 """
+        return formatted_saju
+
+    def _glossary_answer(self, question: str, saju_data: dict = None):
+        """Pure definition questions ("지장간이 뭐예요?") are answered from the term index without the LLM."""
+        term = self.glossary.definition_query(question, saju_data) if self.glossary else None
+        if term is None:
+            return None
+        note(glossary_hit=True)
+        return self.glossary.answer(term)
+
+    def _with_glossary(self, question: str, context: str) -> str:
+        return (self.glossary.context_block(question) if self.glossary else "") + context
+
+    def get_answer(self, question: str, saju_data: dict = None):
+        fast = self._glossary_answer(question, saju_data)
+        if fast is not None:
+            return fast
+
+        self._follow_cutover()
+        if not self.assembler:
+            return {"answer": NOT_READY_ANSWER, "sources": []}
+
+        key = answer_key(question, saju_data)
+        cached = answer_cache.get(key)
+        if cached is not None:
+            note(cache_hit=True)
+            return cached
+        # Only one worker generates a given (question, saju profile) at a time; the others wait for its result
+        return answer_cache.get_or_compute(key, lambda: self._generate_answer(question, saju_data))
+
+    def _generate_answer(self, question: str, saju_data: dict = None):
+        # [Enhanced Logic] Inject Saju Data into the generation prompt only (Silent Injection).
+        # Retrieval runs on the clean question so saju terms don't pull in irrelevant docs.
+        formatted_saju = self._format_saju(saju_data)
         
         # We combine them. Use special separators to help LLM distinguish.
         augmented_query = f"{question}\n\n{formatted_saju}"
-        
-        # Note: This augmented query is used for Retrieval too. 
-        # Ideally, we want retrieval on 'question' only.
-        # But for now, let's stick to simple implementation.
-        # If retrieval quality drops, we'll need to decouple retrieval_query from generation_query.
-        
-        result = self.qa_chain.invoke({"query": augmented_query})
-        
+
+        context, chunks = self.assembler.assemble(question)
+        if self.dual_read:
+            self.dual_read(question, chunks)
+        prompt = self.prompt.format(context=self._with_glossary(question, context), question=augmented_query)
+        note(prompt_chars=len(prompt))
+        with stage("generate"):
+            answer = self.llm.generate(prompt, RAG_MODEL, RAG_GENERATION_CONFIG)
+        note(answer_chars=len(answer))
+
         return {
-            "answer": result["result"],
-            "sources": [doc.metadata.get("source", "Unknown") for doc in result["source_documents"]]
+            "answer": answer,
+            "sources": [chunk["source"] for chunk in chunks]
         }
+
+    def _assemble_each(self, questions):
+        """질문마다 따로 assemble_many 를 호출합니다. 실패한 질문 자리에는 예외를 둡니다."""
+        assembled = []
+        for question in questions:
+            try:
+                assembled.extend(self.assembler.assemble_many([question]))
+            except Exception as e:
+                assembled.append(e)
+        return assembled
+
+    async def get_answers(self, questions, saju_data: dict = None, max_concurrency: int = None):
+        """
+        여러 질문을 한 번에 처리합니다 (리포트 생성용).
+        - 질문 임베딩은 한 번의 호출, 검색은 한 번의 행렬 검색으로 수행
+        - 답변 생성은 max_concurrency 개까지 동시에 실행
+        결과는 입력 순서대로 반환하며, 개별 실패는 해당 항목의 error 에 담습니다.
+        """
+        # Same order as get_answer: glossary questions are answered even before the index is ready
+        results = [None] * len(questions)
+        for i, question in enumerate(questions):
+            fast = self._glossary_answer(question, saju_data)
+            if fast is not None:
+                results[i] = {"question": question, **fast, "error": None}
+
+        self._follow_cutover()
+        if not self.assembler:
+            return [r or {"question": q, "answer": NOT_READY_ANSWER, "sources": [], "error": None}
+                    for q, r in zip(questions, results)]
+
+        keys = [answer_key(q, saju_data) for q in questions]
+        for i, key in enumerate(keys):
+            cached = answer_cache.get(key) if results[i] is None else None
+            if cached is not None:
+                results[i] = {"question": questions[i], **cached, "error": None}
+        pending = [i for i, r in enumerate(results) if r is None]
+        note(cache_hits=len(questions) - len(pending))
+        if not pending:
+            return results
+
+        formatted_saju = self._format_saju(saju_data)
+        try:
+            assembled = await asyncio.to_thread(self.assembler.assemble_many, [questions[i] for i in pending])
+        except Exception as e:
+            # 배치 임베딩/검색이 실패하면 질문별로 다시 시도해서 실패한 항목만 error 로 보고합니다.
+            print(f"⚠️ Batch retrieval failed, retrying per question: {e}")
+            assembled = await asyncio.to_thread(self._assemble_each, [questions[i] for i in pending])
+
+        limit = max(1, min(max_concurrency or ASK_MANY_CONCURRENCY, ASK_MANY_CONCURRENCY))
+        semaphore = asyncio.Semaphore(limit)
+
+        async def generate(question, key, item):
+            if isinstance(item, Exception):
+                return {"question": question, "answer": None, "sources": [], "error": str(item)}
+            context, chunks = item
+            async with semaphore:
+                try:
+                    prompt = self.prompt.format(
+                        context=self._with_glossary(question, context), question=f"{question}\n\n{formatted_saju}"
+                    )
+                    note(prompt_chars=len(prompt))
+                    with stage("generate"):
+                        answer = await self.llm.agenerate(prompt, RAG_MODEL, RAG_GENERATION_CONFIG)
+                    response = {"answer": answer, "sources": [chunk["source"] for chunk in chunks]}
+                    answer_cache.set(key, response)
+                    return {"question": question, **response, "error": None}
+                except Exception as e:
+                    return {"question": question, "answer": None, "sources": [], "error": str(e)}
+
+        generated = await asyncio.gather(*[
+            generate(questions[i], keys[i], item)
+            for i, item in zip(pending, assembled)
+        ])
+        for i, item in zip(pending, generated):
+            results[i] = item
+        return results
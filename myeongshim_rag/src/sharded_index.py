@@ -0,0 +1,263 @@
+"""
+Sharded Index
+양자화 인덱스(QuantizedIndex)를 여러 샤드로 나누고 스레드/프로세스 풀에서 동시에 검색합니다.
+샤드별 상위 k 개를 힙으로 합치므로, 코퍼스가 커져도 코어 수만큼 나누어 검색 지연을 유지합니다.
+
+파일 구성 (SHARD_PATH):
+- shard_000/ ... : 샤드별 QuantizedIndex 파일
+- shards.json    : 샤드 이름, 청크 수, 나눈 기준(file | hash)
+
+샤딩 기준 (RAG_SHARD_BY):
+- file : 같은 출처 파일의 청크를 한 샤드에 모으고, 큰 파일부터 가장 작은 샤드에 배정
+- hash : 청크 본문 해시로 고르게 분산
+
+사용: RAG_INDEX_FORMAT=sharded (ingest 시 자동 생성)
+      python -m src.sharded_index build           (Chroma 에서 재임베딩 없이 다시 나누기)
+      python -m src.sharded_index bench [n] [dim]  (합성 코퍼스로 1~N 워커 확장성 측정)
+"""
+
+import os
+import json
+import time
+import zlib
+import heapq
+import itertools
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import numpy as np
+
+from src.quantized_index import QuantizedIndex, build_index, _normalize, RESCORE_FACTOR
+
+SHARD_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "sindex")
+SHARD_COUNT = int(os.getenv("RAG_SHARDS", str(os.cpu_count() or 4)))
+SHARD_BY = os.getenv("RAG_SHARD_BY", "file")  # file | hash
+SHARD_DTYPE = os.getenv("RAG_SHARD_DTYPE", "int8")
+SEARCH_WORKERS = int(os.getenv("RAG_SEARCH_WORKERS", str(os.cpu_count() or 4)))
+SEARCH_POOL = os.getenv("RAG_SEARCH_POOL", "thread")  # thread | process
+
+
+def assign_shards(documents, metadatas, n_shards: int, by: str = SHARD_BY):
+    """청크별 샤드 번호 목록."""
+    if by == "hash":
+        return [zlib.crc32(doc.encode("utf-8")) % n_shards for doc in documents]
+    if by != "file":
+        raise ValueError(f"Unsupported shard key: {by}")
+
+    files = {}
+    for i, meta in enumerate(metadatas):
+        files.setdefault((meta or {}).get("source", "Unknown"), []).append(i)
+    sizes = [0] * n_shards
+    shard_of = [0] * len(documents)
+    for _, ids in sorted(files.items(), key=lambda item: -len(item[1])):
+        target = sizes.index(min(sizes))
+        sizes[target] += len(ids)
+        for i in ids:
+            shard_of[i] = target
+    return shard_of
+
+
+def build_shards(vectors, documents, metadatas, path: str = SHARD_PATH, n_shards: int = SHARD_COUNT,
+                 by: str = SHARD_BY, dtype: str = SHARD_DTYPE):
+    """청크를 샤드로 나누어 샤드별 인덱스를 저장합니다."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    n_shards = max(1, min(n_shards, len(documents)))
+    shard_of = np.asarray(assign_shards(documents, metadatas, n_shards, by))
+
+    os.makedirs(path, exist_ok=True)
+    shards = []
+    for s in range(n_shards):
+        ids = np.flatnonzero(shard_of == s)
+        if len(ids) == 0:
+            continue
+        name = f"shard_{s:03d}"
+        build_index(vectors[ids], [documents[i] for i in ids], [metadatas[i] for i in ids],
+                    os.path.join(path, name), dtype)
+        shards.append({"name": name, "count": int(len(ids))})
+
+    with open(os.path.join(path, "shards.json"), "w", encoding="utf-8") as f:
+        json.dump({"by": by, "shards": shards}, f, ensure_ascii=False)
+    return shards
+
+
+def build_shards_from_chroma(db_path: str, path: str = SHARD_PATH, n_shards: int = SHARD_COUNT,
+                             by: str = SHARD_BY, dtype: str = SHARD_DTYPE, collection_name: str = None):
+    """Chroma 컬렉션(기본: active 임베딩 공간)에 저장된 벡터를 그대로 사용해 샤드를 만듭니다."""
+    from src.embedding_space import read_collection
+
+    vectors, documents, metadatas = read_collection(db_path, collection_name)
+
+    if not documents:
+        return []
+    return build_shards(vectors, documents, metadatas, path, n_shards, by, dtype)
+
+
+# --- Process pool workers: 각 프로세스가 샤드 파일을 직접 매핑 (OS 페이지 캐시 공유) ---
+_worker_shards = {}
+
+
+def _init_worker(shard_dirs):
+    for name, shard_dir in shard_dirs.items():
+        _worker_shards[name] = QuantizedIndex(shard_dir)
+
+
+def _search_in_worker(name, queries, k, rescore_factor):
+    return _worker_shards[name].search_batch(queries, k, rescore_factor)
+
+
+def merge_topk(per_shard, k: int):
+    """샤드별 (행 번호, 점수) 정렬 목록을 점수 내림차순 (점수, 샤드, 행) 상위 k 개로 합칩니다."""
+    streams = [
+        ((float(score), shard, int(row)) for shard, row, score in zip(itertools.repeat(name), ids, scores))
+        for name, (ids, scores) in per_shard
+    ]
+    return list(itertools.islice(heapq.merge(*streams, key=lambda hit: -hit[0]), k))
+
+
+class ShardedIndex:
+    def __init__(self, path: str = SHARD_PATH, workers: int = SEARCH_WORKERS, pool: str = SEARCH_POOL):
+        with open(os.path.join(path, "shards.json"), encoding="utf-8") as f:
+            info = json.load(f)
+        self.by = info["by"]
+        dirs = {s["name"]: os.path.join(path, s["name"]) for s in info["shards"]}
+        # 후보 변환(_to_candidates)은 요청 프로세스에서 하므로 프로세스 풀이어도 샤드를 열어 둡니다.
+        self.shards = {name: QuantizedIndex(d) for name, d in dirs.items()}
+        self.workers = max(1, min(workers, len(self.shards)))
+        self.pool = pool
+        if pool == "process":
+            self.executor = ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(dirs,))
+        else:
+            self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix="shard-search")
+        first = next(iter(self.shards.values()), None)
+        self.format = f"sharded/{first.format}" if first else "sharded"
+
+    def __len__(self):
+        return sum(len(s) for s in self.shards.values())
+
+    def _search_shard(self, name, queries, k, rescore_factor):
+        if self.pool == "process":
+            return self.executor.submit(_search_in_worker, name, queries, k, rescore_factor)
+        return self.executor.submit(self.shards[name].search_batch, queries, k, rescore_factor)
+
+    def search_batch(self, query_vecs, k: int, rescore_factor: int = RESCORE_FACTOR):
+        """모든 샤드를 동시에 검색하고 질의별 상위 k 개 (점수, 샤드, 행) 목록을 반환합니다."""
+        queries = _normalize(np.atleast_2d(np.asarray(query_vecs, dtype=np.float32)))
+        futures = [(name, self._search_shard(name, queries, k, rescore_factor)) for name in self.shards]
+        per_shard = [(name, future.result()) for name, future in futures]
+        return [
+            merge_topk([(name, results[qi]) for name, results in per_shard], k)
+            for qi in range(len(queries))
+        ]
+
+    def query_batch(self, query_vecs, n_results: int):
+        """ContextAssembler 가 사용하는 후보 형식(청크 목록, float32 벡터)으로 반환합니다."""
+        dim = np.atleast_2d(query_vecs).shape[1]
+        results = []
+        for hits in self.search_batch(query_vecs, n_results):
+            candidates, vectors = [], []
+            for _, name, row in hits:
+                cands, vecs = self.shards[name]._to_candidates([row])
+                candidates.extend(cands)
+                vectors.append(vecs[0])
+            results.append((candidates, np.asarray(vectors, dtype=np.float32).reshape(-1, dim)))
+        return results
+
+    def query(self, query_vec, n_results: int):
+        return self.query_batch([query_vec], n_results)[0]
+
+    def resident_bytes(self) -> int:
+        return sum(s.resident_bytes() for s in self.shards.values())
+
+    def mapped_bytes(self) -> int:
+        return sum(s.mapped_bytes() for s in self.shards.values())
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+def scaling_report(n: int = 200000, dim: int = 768, shards: int = None, queries: int = 64, k: int = 10,
+                   pool: str = "thread"):
+    """
+    합성 코퍼스(n 청크)를 샤드로 만들고 워커 수 1, 2, 4, ... 코어 수 별 검색 지연을 측정합니다.
+    샤드는 코어 수만큼 만들고(각 샤드를 따로 생성해 전체 float32 복사본을 메모리에 두지 않음),
+    같은 벡터로 만든 단일(monolithic) QuantizedIndex 와 지연 시간, 상위 k 겹침률(vs mono)을 비교합니다.
+    (단일 인덱스를 만드는 동안에만 전체 float32 복사본이 필요합니다)
+    NumPy BLAS 자체 스레드와 겹치지 않도록 OPENBLAS_NUM_THREADS=1 (또는 MKL/OMP) 로 실행하세요.
+    """
+    import tempfile
+
+    cores = os.cpu_count() or 1
+    shards = shards or cores
+    rng = np.random.default_rng(42)
+    centers = rng.normal(size=(64, dim)).astype(np.float32)
+    qs = _normalize(centers[rng.integers(0, 64, queries)] + 0.5 * rng.normal(size=(queries, dim)))
+
+    worker_counts = sorted({1, *[w for w in (2, 4, 8, 16, 32, 64) if w <= cores], cores})
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        started = time.perf_counter()
+        meta = []
+        first_row = {}  # 샤드 이름 -> 단일 인덱스에서의 첫 행 번호
+        for s in range(shards):
+            size = n // shards + (1 if s < n % shards else 0)
+            vecs = centers[rng.integers(0, 64, size)] + 0.5 * rng.normal(size=(size, dim)).astype(np.float32)
+            name = f"shard_{s:03d}"
+            first_row[name] = sum(m["count"] for m in meta)
+            build_index(vecs, [""] * size, [{}] * size, os.path.join(tmp, name), SHARD_DTYPE)
+            meta.append({"name": name, "count": size})
+        with open(os.path.join(tmp, "shards.json"), "w", encoding="utf-8") as f:
+            json.dump({"by": "hash", "shards": meta}, f)
+        print(f"Built {shards} shards x ~{n // shards} chunks (dim {dim}) in {time.perf_counter() - started:.1f}s")
+
+        # 단일 QuantizedIndex: 샤드의 float32 원본을 이어 붙여 같은 벡터로 만듭니다.
+        mono_path = os.path.join(tmp, "monolithic")
+        build_index(np.concatenate([np.load(os.path.join(tmp, m["name"], "vectors.f32.npy"), mmap_mode="r")
+                                    for m in meta]), [""] * n, [{}] * n, mono_path, SHARD_DTYPE)
+        mono = QuantizedIndex(mono_path)
+        mono.search_batch(qs[:1], k)
+        started = time.perf_counter()
+        for q in qs:
+            mono.search(q, k)
+        mono_single_ms = (time.perf_counter() - started) / queries * 1000
+        started = time.perf_counter()
+        baseline = [set(ids.tolist()) for ids, _ in mono.search_batch(qs, k)]
+        mono_batch_ms = (time.perf_counter() - started) / queries * 1000
+        del mono
+
+        for workers in worker_counts:
+            index = ShardedIndex(tmp, workers=workers, pool=pool)
+            index.search_batch(qs[:1], k)  # warm-up (프로세스 기동, 페이지 캐시)
+            started = time.perf_counter()
+            for q in qs:
+                hits = index.search_batch(q, k)
+            single_ms = (time.perf_counter() - started) / queries * 1000
+            started = time.perf_counter()
+            hits = index.search_batch(qs, k)
+            batch_ms = (time.perf_counter() - started) / queries * 1000
+            top = [{first_row[name] + row for _, name, row in h} for h in hits]
+            overlap = float(np.mean([len(t & b) / k for t, b in zip(top, baseline)]))
+            rows.append((workers, single_ms, batch_ms, overlap))
+            index.close()
+            del index
+
+    print(f"{'workers':>7} {'ms/query':>9} {'batched':>9} {'speedup':>8} {'vs mono':>8}")
+    print(f"{'mono':>7} {mono_single_ms:>9.2f} {mono_batch_ms:>9.2f} {1.0:>8.2f} {1.0:>8.3f}")
+    for workers, single_ms, batch_ms, overlap in rows:
+        print(f"{workers:>7} {single_ms:>9.2f} {batch_ms:>9.2f} {mono_single_ms / single_ms:>8.2f} {overlap:>8.3f}")
+    return rows
+
+
+if __name__ == "__main__":
+    import sys
+
+    from src.embedding_space import active_space, build_space_index, space_path
+
+    if len(sys.argv) > 1 and sys.argv[1] == "build":
+        from src.ingest import DB_PATH
+        build_space_index(DB_PATH, active_space()[1], "sharded")
+    elif len(sys.argv) > 1 and sys.argv[1] == "bench":
+        n = int(sys.argv[2]) if len(sys.argv) > 2 else 200000
+        dim = int(sys.argv[3]) if len(sys.argv) > 3 else 768
+        scaling_report(n, dim, pool=os.getenv("RAG_SEARCH_POOL", "thread"))
+    else:
+        index = ShardedIndex(space_path(SHARD_PATH, active_space()[1]))
+        print(f"{len(index)} vectors in {len(index.shards)} shards (by {index.by}, {index.workers} {index.pool} workers)")
@@ -0,0 +1,456 @@
+"""
+Shared Cache
+프로세스 안의 LRU/TTL 캐시(1단) 뒤에 워커·노드가 함께 쓰는 공유 캐시(2단)를 두는 캐시 계층입니다.
+
+- CACHE_BACKEND=local  : 프로세스 안 캐시만 사용 (기본값)
+- CACHE_BACKEND=sqlite : 같은 머신의 워커끼리 SQLite(WAL) 파일 공유 (CACHE_SQLITE_PATH)
+- CACHE_BACKEND=redis  : Redis 프로토콜 서버 공유 (CACHE_REDIS_URL, redis 패키지 필요)
+  테스트에서는 MemoryBackend 로 바꿔 끼울 수 있습니다.
+
+- 이름공간(namespace)마다 TTL, 1단 크기, 적중/미스 통계
+- invalidate(): 이름공간 세대(generation)를 올려 모든 워커의 항목을 한 번에 무효화
+- get_or_compute(): 같은 키를 동시에 계산하지 않도록 프로세스 안 single-flight + 공유 락
+
+RAG 서버(answer_cache)와 MemoryAgent 가 사용합니다. 다른 src.* 모듈에는 의존하지 않습니다.
+"""
+
+import os
+import time
+import pickle
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "local")  # local | sqlite | redis
+CACHE_SQLITE_PATH = os.getenv(
+    "CACHE_SQLITE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "shared_cache.sqlite3"),
+)
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+CACHE_GENERATION_TTL = float(os.getenv("CACHE_GENERATION_TTL", "2"))  # 다른 워커의 무효화를 알아채는 주기(초)
+CACHE_LOCK_TTL = float(os.getenv("CACHE_LOCK_TTL", "60"))
+CACHE_LOCK_WAIT = float(os.getenv("CACHE_LOCK_WAIT", "30"))
+
+
+class TTLCache:
+    """크기 제한(LRU)과 만료 시간이 있는 스레드 안전 캐시."""
+
+    def __init__(self, ttl: int, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < now:
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def peek(self, key):
+        """통계와 LRU 순서를 바꾸지 않는 조회."""
+        with self._lock:
+            item = self._data.get(key)
+            return item[1] if item and item[0] >= time.monotonic() else None
+
+    def remaining(self, key) -> float:
+        """남은 유효 시간(초). 없거나 만료되었으면 0."""
+        with self._lock:
+            item = self._data.get(key)
+            return max(0.0, item[0] - time.monotonic()) if item else 0.0
+
+    def set(self, key, value, ttl: int = None):
+        with self._lock:
+            self._data[key] = (time.monotonic() + (ttl or self.ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+# --- Shared backends ---
+# 값은 (만료 시각(epoch 초), 값) 을 pickle 한 bytes 로 저장합니다.
+class MemoryBackend:
+    """Redis/SQLite 대신 쓰는 프로세스 안 공유 계층 (테스트용 stand-in)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+        self._generations = {}
+        self._locks = {}
+
+    def get(self, ns, key):
+        with self._lock:
+            return self._data.get((ns, key))
+
+    def set(self, ns, key, payload: bytes, ttl: float):
+        with self._lock:
+            self._data[(ns, key)] = payload
+
+    def generation(self, ns) -> int:
+        with self._lock:
+            return self._generations.get(ns, 0)
+
+    def invalidate(self, ns) -> int:
+        with self._lock:
+            self._generations[ns] = self._generations.get(ns, 0) + 1
+            for k in [k for k in self._data if k[0] == ns]:
+                del self._data[k]
+            return self._generations[ns]
+
+    def acquire_lock(self, name, ttl: float) -> bool:
+        now = time.time()
+        with self._lock:
+            if self._locks.get(name, 0) > now:
+                return False
+            self._locks[name] = now + ttl
+            return True
+
+    def release_lock(self, name):
+        with self._lock:
+            self._locks.pop(name, None)
+
+
+class SQLiteBackend:
+    """같은 머신의 여러 워커가 공유하는 SQLite(WAL) 파일."""
+
+    def __init__(self, path: str = CACHE_SQLITE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._local = threading.local()
+        self._sets = 0
+        conn = self._conn()
+        conn.executescript("""
+            create table if not exists entries (
+                ns text, key text, value blob, expires_at real, primary key (ns, key)
+            );
+            create table if not exists generations (ns text primary key, generation integer);
+            create table if not exists locks (name text primary key, expires_at real);
+        """)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("pragma journal_mode=wal")
+            conn.execute("pragma synchronous=normal")
+            self._local.conn = conn
+        return conn
+
+    def get(self, ns, key):
+        row = self._conn().execute(
+            "select value from entries where ns = ? and key = ? and expires_at > ?", (ns, key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, ns, key, payload: bytes, ttl: float):
+        conn = self._conn()
+        now = time.time()
+        conn.execute("insert or replace into entries values (?, ?, ?, ?)", (ns, key, payload, now + ttl))
+        self._sets += 1
+        if self._sets % 500 == 0:
+            conn.execute("delete from entries where expires_at <= ?", (now,))
+
+    def generation(self, ns) -> int:
+        row = self._conn().execute("select generation from generations where ns = ?", (ns,)).fetchone()
+        return row[0] if row else 0
+
+    def invalidate(self, ns) -> int:
+        conn = self._conn()
+        conn.execute("begin immediate")
+        try:
+            conn.execute("""
+                insert into generations values (?, 1)
+                on conflict(ns) do update set generation = generation + 1
+            """, (ns,))
+            conn.execute("delete from entries where ns = ?", (ns,))
+            conn.execute("commit")
+        except Exception:
+            conn.execute("rollback")
+            raise
+        return self.generation(ns)
+
+    def acquire_lock(self, name, ttl: float) -> bool:
+        conn = self._conn()
+        now = time.time()
+        conn.execute("begin immediate")
+        try:
+            conn.execute("delete from locks where name = ? and expires_at <= ?", (name, now))
+            acquired = conn.execute("insert or ignore into locks values (?, ?)", (name, now + ttl)).rowcount == 1
+            conn.execute("commit")
+        except Exception:
+            conn.execute("rollback")
+            raise
+        return acquired
+
+    def release_lock(self, name):
+        self._conn().execute("delete from locks where name = ?", (name,))
+
+
+class RedisBackend:
+    """Redis 프로토콜 서버 (redis 패키지는 이 백엔드를 쓸 때만 필요)."""
+
+    def __init__(self, url: str = CACHE_REDIS_URL, prefix: str = "myeongshim"):
+        import redis
+
+        self.redis = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def _key(self, ns, key):
+        return f"{self.prefix}:{ns}:{key}"
+
+    def get(self, ns, key):
+        return self.redis.get(self._key(ns, key))
+
+    def set(self, ns, key, payload: bytes, ttl: float):
+        self.redis.set(self._key(ns, key), payload, px=max(1, int(ttl * 1000)))
+
+    def generation(self, ns) -> int:
+        return int(self.redis.get(self._key(ns, "__generation__")) or 0)
+
+    def invalidate(self, ns) -> int:
+        # 이전 세대 키는 지우지 않고 TTL 로 사라지게 둡니다 (KEYS/SCAN 을 피함).
+        return int(self.redis.incr(self._key(ns, "__generation__")))
+
+    def acquire_lock(self, name, ttl: float) -> bool:
+        return bool(self.redis.set(self._key("__lock__", name), b"1", nx=True, px=max(1, int(ttl * 1000))))
+
+    def release_lock(self, name):
+        self.redis.delete(self._key("__lock__", name))
+
+
+def make_backend(kind: str = CACHE_BACKEND):
+    if kind == "local":
+        return None
+    if kind == "sqlite":
+        return SQLiteBackend()
+    if kind == "redis":
+        return RedisBackend()
+    raise ValueError(f"Unsupported cache backend: {kind}")
+
+
+# --- Namespaces ---
+def _key_id(key) -> str:
+    return hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+
+
+class Namespace:
+    """
+    이름공간 하나. TTLCache 와 같은 get / set / remaining / clear / stats 에 더해
+    get_or_compute, invalidate 를 제공합니다.
+    """
+
+    def __init__(self, name: str, ttl: float, max_size: int, backend=None):
+        self.name = name
+        self.ttl = ttl
+        self.backend = backend
+        self.local = TTLCache(ttl, max_size)
+        self._lock = threading.Lock()
+        self._inflight = {}  # key -> threading.Event (single-flight)
+        self._generation = (0, 0.0)  # (세대, 확인 시각)
+        self.counts = {k: 0 for k in ("local_hits", "shared_hits", "misses", "computes", "waits",
+                                      "invalidations", "backend_errors")}
+
+    def _incr(self, name: str):
+        with self._lock:
+            self.counts[name] += 1
+
+    def _current_generation(self) -> int:
+        if self.backend is None:
+            return self._generation[0]
+        generation, checked = self._generation
+        if time.monotonic() - checked > CACHE_GENERATION_TTL:
+            try:
+                generation = self.backend.generation(self.name)
+            except Exception:
+                self._incr("backend_errors")
+            self._generation = (generation, time.monotonic())
+        return generation
+
+    def _get_entry(self, key, count: bool = True):
+        """(값, 남은 초) 또는 None. count=False 면 적중/미스 통계에 넣지 않습니다 (remaining 등 조회용)."""
+        generation = self._current_generation()
+        local_key = (generation, key)
+        value = self.local.get(local_key) if count else self.local.peek(local_key)
+        if value is not None:
+            if count:
+                self._incr("local_hits")
+            return value, self.local.remaining(local_key)
+        if self.backend is not None:
+            try:
+                payload = self.backend.get(self.name, f"{generation}:{_key_id(key)}")
+            except Exception:
+                payload = None
+                self._incr("backend_errors")
+            if payload is not None:
+                expires_at, value = pickle.loads(payload)
+                left = expires_at - time.time()
+                if left > 0:
+                    self.local.set(local_key, value, left)
+                    if count:
+                        self._incr("shared_hits")
+                    return value, left
+        if count:
+            self._incr("misses")
+        return None
+
+    def get(self, key):
+        entry = self._get_entry(key)
+        return entry[0] if entry else None
+
+    def remaining(self, key) -> float:
+        entry = self._get_entry(key, count=False)
+        return entry[1] if entry else 0.0
+
+    def set(self, key, value, ttl: float = None):
+        ttl = ttl or self.ttl
+        generation = self._current_generation()
+        self.local.set((generation, key), value, ttl)
+        if self.backend is not None:
+            try:
+                payload = pickle.dumps((time.time() + ttl, value), protocol=pickle.HIGHEST_PROTOCOL)
+                self.backend.set(self.name, f"{generation}:{_key_id(key)}", payload, ttl)
+            except Exception:
+                self._incr("backend_errors")
+
+    def get_or_compute(self, key, compute, ttl: float = None):
+        """
+        캐시에 없으면 compute() 결과를 저장하고 반환합니다.
+        같은 키는 프로세스 안에서 한 스레드만, 워커 사이에서는 공유 락을 잡은 워커만 계산하고
+        나머지는 결과가 채워질 때까지 기다립니다 (최대 CACHE_LOCK_WAIT 초, 넘으면 직접 계산).
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            event = self._inflight.get(key)
+            leader = event is None
+            if leader:
+                event = self._inflight[key] = threading.Event()
+        if not leader:
+            self._incr("waits")
+            event.wait(CACHE_LOCK_WAIT)
+            value = self.get(key)
+            return value if value is not None else compute()
+
+        try:
+            lock_name = f"{self.name}:{_key_id(key)}"
+            locked = self._acquire_shared(lock_name)
+            if not locked:
+                value = self._wait_for_shared(key)
+                if value is not None:
+                    return value
+            try:
+                self._incr("computes")
+                value = compute()
+                if value is not None:
+                    self.set(key, value, ttl)
+                return value
+            finally:
+                if locked and self.backend is not None:
+                    try:
+                        self.backend.release_lock(lock_name)
+                    except Exception:
+                        self._incr("backend_errors")
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            event.set()
+
+    def _acquire_shared(self, lock_name) -> bool:
+        if self.backend is None:
+            return True
+        try:
+            return self.backend.acquire_lock(lock_name, CACHE_LOCK_TTL)
+        except Exception:
+            self._incr("backend_errors")
+            return True
+
+    def _wait_for_shared(self, key):
+        self._incr("waits")
+        deadline = time.monotonic() + CACHE_LOCK_WAIT
+        delay = 0.05
+        while time.monotonic() < deadline:
+            time.sleep(delay)
+            delay = min(delay * 2, 1.0)
+            value = self.get(key)
+            if value is not None:
+                return value
+        return None
+
+    def invalidate(self):
+        """모든 워커에서 이 이름공간의 항목을 무효화합니다."""
+        self._incr("invalidations")
+        self.local.clear()
+        if self.backend is None:
+            self._generation = (self._generation[0] + 1, 0.0)
+            return
+        try:
+            self._generation = (self.backend.invalidate(self.name), time.monotonic())
+        except Exception:
+            self._incr("backend_errors")
+
+    clear = invalidate
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self.counts)
+        lookups = counts["local_hits"] + counts["shared_hits"] + counts["misses"]
+        counts["hit_rate"] = round((counts["local_hits"] + counts["shared_hits"]) / lookups, 3) if lookups else 0.0
+        counts["local_size"] = self.local.stats()["size"]
+        return counts
+
+
+class SharedCache:
+    def __init__(self, backend=None):
+        self.backend = backend
+        self._namespaces = {}
+        self._lock = threading.Lock()
+
+    def namespace(self, name: str, ttl: float, max_size: int = 1000) -> Namespace:
+        with self._lock:
+            if name not in self._namespaces:
+                self._namespaces[name] = Namespace(name, ttl, max_size, self.backend)
+            return self._namespaces[name]
+
+    def invalidate(self, *names):
+        for name in names or list(self._namespaces):
+            if name in self._namespaces:
+                self._namespaces[name].invalidate()
+
+    def stats(self):
+        return {
+            "backend": type(self.backend).__name__ if self.backend else "local",
+            "namespaces": {name: ns.stats() for name, ns in sorted(self._namespaces.items())},
+        }
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_cache() -> SharedCache:
+    """프로세스 공용 캐시 (CACHE_BACKEND 에 따라 공유 계층 선택)."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = SharedCache(make_backend())
+        return _shared
@@ -0,0 +1,87 @@
+import asyncio
+import threading
+import types
+
+import numpy as np
+import pytest
+
+from src.answer_cache import clear_all
+from src.cache_warmer import CacheWarmer
+from src.context_assembler import ContextAssembler
+
+QUESTION = "요즘 일이 손에 안 잡혀요. 어떻게 해야 할까요?"
+# PromptEngine.fetchRAGContext 가 /ask 로 보내는 sajuData 와 같은 모양
+SAJU = {
+    "birth_date": "1991-07-14",
+    "birth_time": "08:30",
+    "gender": "female",
+    "dayMaster": "병화",
+    "saju_characters": {"year": "신미", "month": "을미", "day": "병인", "hour": "임진"},
+    "current_luck_cycle": {"age": 31, "ganji": "임진"},
+    "current_yearly_luck": {"year": 2026, "ganji": "병오"},
+}
+
+
+class FakeEmbeddings:
+    model = "models/fake-embedding"
+
+    def __init__(self):
+        self.calls = 0
+
+    def embed_query(self, text):
+        self.calls += 1
+        return np.ones(8, dtype=np.float32)
+
+    def embed_documents(self, texts, task_type=None):
+        self.calls += 1
+        return [np.ones(8, dtype=np.float32) for _ in texts]
+
+
+class FakeIndex:
+    def __init__(self):
+        self.calls = 0
+
+    def query_batch(self, query_vecs, n_results):
+        self.calls += 1
+        chunk = {"content": "병화 일간은 태양처럼 밝습니다.", "source": "data/lecture.pdf", "metadata": {}}
+        return [([chunk], np.ones((1, 8), dtype=np.float32)) for _ in query_vecs]
+
+
+@pytest.fixture
+def assembler():
+    clear_all()
+    return ContextAssembler(None, FakeEmbeddings(), index=FakeIndex())
+
+
+def test_warmed_context_skips_embedding_and_search(assembler):
+    stats = asyncio.run(CacheWarmer(types.SimpleNamespace(assembler=assembler), rpm=10 ** 6).run_once([QUESTION]))
+    assert stats["warmed"] == 1
+    embed_calls, search_calls = assembler.embeddings.calls, assembler.index.calls
+
+    context, chunks = assembler.assemble(f" {QUESTION} ")
+    assert "태양" in context and chunks
+    assert (assembler.embeddings.calls, assembler.index.calls) == (embed_calls, search_calls)
+
+    rerun = asyncio.run(CacheWarmer(types.SimpleNamespace(assembler=assembler), rpm=10 ** 6).run_once([QUESTION]))
+    assert rerun["fresh"] == 1 and rerun["warmed"] == 0
+
+
+def test_warmed_entry_is_hit_by_ask_payload(assembler):
+    pytest.importorskip("langchain.prompts")
+    rag_chain = pytest.importorskip("src.rag_chain")
+
+    asyncio.run(CacheWarmer(types.SimpleNamespace(assembler=assembler), rpm=10 ** 6).run_once([QUESTION]))
+    embed_calls, search_calls = assembler.embeddings.calls, assembler.index.calls
+
+    prompts = []
+    brain = object.__new__(rag_chain.MyeongshimBrain)
+    brain.assembler, brain.glossary, brain.dual_read = assembler, None, None
+    brain.space_version = rag_chain.registry_version()
+    brain._reload_lock = threading.Lock()
+    brain.prompt = rag_chain.PromptTemplate(template="{context}\n{question}", input_variables=["context", "question"])
+    brain.llm = types.SimpleNamespace(generate=lambda prompt, *args: prompts.append(prompt) or "답변")
+
+    response = brain.get_answer(QUESTION, SAJU)
+    assert response["answer"] == "답변"
+    assert "태양" in prompts[0] and "병화" in prompts[0]
+    assert (assembler.embeddings.calls, assembler.index.calls) == (embed_calls, search_calls)
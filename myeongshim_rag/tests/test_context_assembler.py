@@ -0,0 +1,19 @@
+from src.context_assembler import estimate_tokens, pack_sentences
+
+
+def chunk(source, content):
+    return {"source": source, "content": content, "metadata": {}}
+
+
+def test_oversized_sentence_is_skipped_not_the_rest_of_the_chunk():
+    long_sentence = "가" * 50 + "."
+    chunks = [chunk("a.pdf", f"짧은 문장. {long_sentence} 다음 문장.")]
+    blocks, used = pack_sentences(chunks, token_budget=20)
+    assert blocks[0]["text"] == "짧은 문장. 다음 문장."
+    assert used == estimate_tokens("짧은 문장.") + estimate_tokens("다음 문장.")
+
+
+def test_only_contributing_chunks_are_reported():
+    chunks = [chunk("a.pdf", "같은 문장."), chunk("b.pdf", "같은 문장."), chunk("c.pdf", "새 문장.")]
+    blocks, _ = pack_sentences(chunks, token_budget=100)
+    assert [b["chunk"]["source"] for b in blocks] == ["a.pdf", "c.pdf"]
@@ -0,0 +1,26 @@
+import numpy as np
+
+from src.domain_router import QueryRouter, classify_source
+
+
+def make_router():
+    return QueryRouter({d: np.eye(4)[i] for i, d in enumerate(["myeongri", "psychology", "iching", "general"])},
+                       excluded=set())
+
+
+def test_bare_64_in_age_or_year_is_not_iching():
+    router = make_router()
+    assert "iching" not in router.keyword_domains("1964년생인데 올해 운세가 궁금해요")
+    assert "iching" not in router.keyword_domains("64세 아버지 건강운")
+
+
+def test_hexagram_keywords_route_to_iching():
+    router = make_router()
+    assert "iching" in router.keyword_domains("64괘 중 건괘의 의미")
+    assert "iching" in router.keyword_domains("64 키 중 하나를 알려줘")
+
+
+def test_classify_source():
+    assert classify_source("data/64책뇌과학.docx") == "iching"
+    assert classify_source("data/256번-격국론-116p.pdf") == "myeongri"
+    assert classify_source("data/2064_report.pdf") == "general"
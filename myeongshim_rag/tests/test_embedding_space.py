@@ -0,0 +1,35 @@
+from src.embedding_space import (
+    cutover, load_spaces, record_dim, registry_version, reset_after_ingest, save_spaces,
+)
+
+
+class FakeCollection:
+    def get(self, limit=None, include=None):
+        return {"embeddings": [[0.0] * 768]}
+
+
+def test_registry_version_changes_only_on_cutover(tmp_path):
+    path = str(tmp_path / "embedding_spaces.json")
+    initial = registry_version(path)
+
+    spaces = load_spaces(path)
+    spaces["spaces"]["text-embedding-004"] = {
+        "model": "models/text-embedding-004", "dim": None, "collection": "space_text-embedding-004",
+        "suffix": "-text-embedding-004", "status": "building",
+    }
+    save_spaces(spaces, path)  # 마이그레이션 시작
+    assert registry_version(path) == initial
+    record_dim("text-embedding-004", FakeCollection(), path)
+    reset_after_ingest(path)
+    assert registry_version(path) == initial
+
+    spaces = load_spaces(path)
+    spaces["spaces"]["text-embedding-004"]["status"] = "ready"
+    save_spaces(spaces, path)
+    cutover("text-embedding-004", db_path=None, path=path, build_index=False)
+    after = registry_version(path)
+    assert after != initial and after[0] == "text-embedding-004"
+
+    previous = initial[0]
+    cutover(previous, db_path=None, path=path, build_index=False)  # 되돌리기
+    assert registry_version(path) not in (initial, after)
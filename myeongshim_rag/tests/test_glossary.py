@@ -0,0 +1,66 @@
+import asyncio
+import threading
+
+import pytest
+
+from src.glossary import Glossary
+
+ENTRIES = [
+    {"term": term, "aliases": [term], "definition": f"{term} 정의.", "source": "data/lecture.pdf", "page": 0}
+    for term in ("지장간", "용신", "세운", "대운", "오행", "사주", "일간")
+] + [
+    {"term": "다크코드", "aliases": ["다크코드", "Dark Code"], "definition": "그림자.", "source": "terms.txt"},
+]
+SAJU = {"birth_date": "1990-03-05", "birth_time": "10:00"}
+
+
+@pytest.fixture(scope="module")
+def glossary():
+    return Glossary(ENTRIES)
+
+
+@pytest.mark.parametrize("question, term", [
+    ("지장간이 뭐예요?", "지장간"),
+    ("용신이란?", "용신"),
+    ("용신이란 무엇인가요?", "용신"),
+    ("오행의 뜻", "오행"),
+    ("Dark Code 뜻", "다크코드"),
+    ("용신에 대해 설명해줘", "용신"),
+])
+def test_definition_queries(glossary, question, term):
+    assert glossary.definition_query(question) == term
+    assert glossary.definition_query(question, SAJU) == term
+
+
+@pytest.mark.parametrize("question", [
+    "세운이 어떤가요?",
+    "오행 뭐가 부족해요?",
+    "사주 뭐가 문제일까요?",
+    "대운이 뭐가 좋아요?",
+    "일간이 어떤 성격이에요?",
+    "지장간이 뭐예요? 제 사주에도 있나요?",
+    "용신과 대운이 뭐예요?",
+])
+def test_personal_questions_are_not_definitions(glossary, question):
+    assert glossary.definition_query(question) is None
+    assert glossary.definition_query(question, SAJU) is None
+
+
+def test_evaluative_words_skip_fast_path_with_saju(glossary):
+    assert glossary.definition_query("대운 뜻 좋아요?") is None
+    assert glossary.definition_query("대운의 의미", SAJU) == "대운"
+
+
+def test_batch_answers_definitions_before_index_is_ready(glossary):
+    pytest.importorskip("langchain.prompts")
+    rag_chain = pytest.importorskip("src.rag_chain")
+
+    brain = object.__new__(rag_chain.MyeongshimBrain)
+    brain.assembler, brain.glossary = None, glossary
+    brain.space_version = rag_chain.registry_version()
+    brain._reload_lock = threading.Lock()
+
+    single = brain.get_answer("용신이란?", SAJU)
+    results = asyncio.run(brain.get_answers(["용신이란?", "올해 운세는?"], SAJU))
+    assert results[0]["answer"] == single["answer"] != rag_chain.NOT_READY_ANSWER
+    assert results[1]["answer"] == rag_chain.NOT_READY_ANSWER
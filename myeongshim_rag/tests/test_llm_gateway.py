@@ -0,0 +1,30 @@
+import httpx
+import pytest
+
+from src.llm_gateway import LLMGateway, GatewayError
+
+
+def make_gateway(handler):
+    gateway = LLMGateway(api_key="test", base_url="http://gemini.test", fallback_model=None, hedge=False,
+                         max_retries=0)
+    gateway.http = httpx.Client(transport=httpx.MockTransport(handler))
+    return gateway
+
+
+def test_stream_client_error_raises_gateway_error():
+    # 스트리밍 응답처럼 본문을 아직 읽지 않은 상태로 돌려줍니다.
+    gateway = make_gateway(lambda request: httpx.Response(400, stream=httpx.ByteStream(b"bad request")))
+    with pytest.raises(GatewayError, match="HTTP 400: bad request"):
+        list(gateway.stream("안녕"))
+
+
+def test_generate_non_json_body_raises_gateway_error():
+    gateway = make_gateway(lambda request: httpx.Response(200, text="<html>proxy error</html>"))
+    with pytest.raises(GatewayError, match="Invalid JSON response"):
+        gateway.generate("안녕")
+
+
+def test_generate_returns_text():
+    body = {"candidates": [{"content": {"parts": [{"text": "답변"}]}}]}
+    gateway = make_gateway(lambda request: httpx.Response(200, json=body))
+    assert gateway.generate("안녕") == "답변"
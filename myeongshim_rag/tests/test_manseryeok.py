@@ -0,0 +1,35 @@
+from datetime import datetime
+
+from src.manseryeok import KST, birth_pillars, compute_pillars, fill_saju_data, get_solar_terms
+
+
+def test_known_day_pillar():
+    assert birth_pillars("2000-01-01")["day"] == "무오"
+    assert compute_pillars(datetime(2000, 1, 1, 12, 0, tzinfo=KST))["day"] == "무오"
+
+
+def test_year_and_month_change_at_ipchun():
+    ipchun = next(t for t in get_solar_terms(2024) if t["name"] == "입춘")["at"]
+    assert ipchun.date().isoformat() == "2024-02-04"
+
+    before = birth_pillars("2024-02-03", "12:00")
+    after = birth_pillars("2024-02-05", "12:00")
+    assert (before["year"], before["month"]) == ("계묘", "을축")
+    assert (after["year"], after["month"]) == ("갑진", "병인")
+
+
+def test_unknown_birth_time_leaves_hour_empty():
+    assert birth_pillars("2000-01-01", "모름")["hour"] is None
+    assert birth_pillars("2000-01-01", "10:00")["hour"] is not None
+
+    filled = fill_saju_data({"birth_date": "2000-01-01", "birth_time": "모름", "calendarType": "solar",
+                             "saju_characters": {"year": "기묘"}})
+    assert filled["saju_characters"] == {"year": "기묘", "month": "병자", "day": "무오", "hour": "?"}
+    assert filled["dayMaster"] == "무토"
+
+
+def test_lunar_or_unknown_calendar_is_left_alone():
+    data = {"birth_date": "2000-01-01", "birth_time": "10:00", "saju_characters": {}}
+    assert fill_saju_data(data) is data
+    lunar = dict(data, calendarType="lunar", is_lunar=True)
+    assert fill_saju_data(lunar) is lunar
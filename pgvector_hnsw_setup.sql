@@ -0,0 +1,151 @@
+-- ======================================
+-- pgvector HNSW 인덱스 + 인덱스 친화적 검색 함수
+-- Supabase SQL Editor 또는 로컬 Postgres(pgvector) 에서 실행하세요
+--
+-- 기존 함수는 WHERE 절에서 1 - (embedding <=> query) > threshold 를 계산해서
+-- ANN 인덱스를 쓸 수 없었습니다. 아래 함수들은
+--   1) ORDER BY embedding <=> query LIMIT n 으로 인덱스 스캔을 먼저 하고
+--   2) 바깥 쿼리에서 threshold 를 적용합니다.
+--
+-- 필터(user_id, metadata @> '{"source": ...}')가 선택적이면 HNSW 가 ef_search 개 후보를 자른 뒤
+-- 필터를 적용해 결과가 모자라거나 비게 됩니다. 그래서 각 함수의 SET 절에서
+-- hnsw.iterative_scan = relaxed_order 로 필터를 통과한 행이 match_count 개가 될 때까지
+-- 인덱스 스캔을 이어 가게 합니다. (pgvector 0.8 이상 필요, Supabase 기본 제공)
+-- ======================================
+
+create extension if not exists vector;
+
+-- 1. HNSW 벡터 인덱스 (코사인 거리)
+create index if not exists knowledge_store_embedding_hnsw_idx
+on knowledge_store using hnsw (embedding vector_cosine_ops)
+with (m = 16, ef_construction = 64);
+
+create index if not exists knowledge_base_embedding_hnsw_idx
+on knowledge_base using hnsw (embedding vector_cosine_ops)
+with (m = 16, ef_construction = 64);
+
+create index if not exists user_memories_embedding_hnsw_idx
+on user_memories using hnsw (embedding vector_cosine_ops)
+with (m = 16, ef_construction = 64);
+
+-- 기존 IVFFlat 인덱스는 HNSW 로 대체합니다.
+drop index if exists knowledge_embedding_idx;
+drop index if exists memories_embedding_idx;
+drop index if exists user_memories_embedding_idx;
+
+-- 2. 메타데이터 필터 인덱스 (metadata @> filter, source = ..., user_id = ...)
+create index if not exists knowledge_store_metadata_idx
+on knowledge_store using gin (metadata jsonb_path_ops);
+
+create index if not exists knowledge_base_metadata_idx
+on knowledge_base using gin (metadata jsonb_path_ops);
+
+create index if not exists knowledge_base_source_idx
+on knowledge_base (source);
+
+create index if not exists user_memories_user_idx
+on user_memories (user_id);
+
+-- 3. match_knowledge (knowledge_store, create_match_function.sql 과 동일)
+-- 기본값은 supabase_rag_setup.sql 버전과 맞춰 둡니다 (create or replace 는 기본값을 제거할 수 없음).
+create or replace function match_knowledge (
+  query_embedding vector(768),
+  match_threshold float default 0.5,
+  match_count int default 3,
+  filter jsonb default '{}'
+)
+returns table (
+  id bigint,
+  content text,
+  metadata jsonb,
+  similarity float
+)
+language sql stable
+set hnsw.iterative_scan = relaxed_order
+set hnsw.ef_search = 100
+as $$
+  select t.id, t.content, t.metadata, 1 - t.distance as similarity
+  from (
+    select
+      knowledge_store.id,
+      knowledge_store.content,
+      knowledge_store.metadata,
+      knowledge_store.embedding <=> query_embedding as distance
+    from knowledge_store
+    where filter is null or filter = '{}' or knowledge_store.metadata @> filter
+    order by knowledge_store.embedding <=> query_embedding
+    limit match_count
+  ) t
+  where 1 - t.distance > match_threshold
+  order by t.distance;
+$$;
+
+-- 4. match_knowledge_base (knowledge_base, ingest_pdfs_supabase.py 가 채우는 테이블)
+create or replace function match_knowledge_base (
+  query_embedding vector(768),
+  match_threshold float default 0.5,
+  match_count int default 3,
+  filter jsonb default '{}'
+)
+returns table (
+  id bigint,
+  content text,
+  metadata jsonb,
+  similarity float
+)
+language sql stable
+set hnsw.iterative_scan = relaxed_order
+set hnsw.ef_search = 100
+as $$
+  select t.id, t.content, t.metadata, 1 - t.distance as similarity
+  from (
+    select
+      kb.id,
+      kb.content,
+      kb.metadata,
+      kb.embedding <=> query_embedding as distance
+    from knowledge_base kb
+    where filter is null or filter = '{}' or kb.metadata @> filter
+    order by kb.embedding <=> query_embedding
+    limit match_count
+  ) t
+  where 1 - t.distance > match_threshold
+  order by t.distance;
+$$;
+
+-- 5. match_memories (user_memories, 사용자 필터)
+create or replace function match_memories (
+  query_embedding vector(768),
+  match_threshold float,
+  match_count int,
+  filter_user_id uuid
+)
+returns table (
+  id uuid,
+  content text,
+  similarity float,
+  metadata jsonb,
+  created_at timestamptz
+)
+language sql stable
+set hnsw.iterative_scan = relaxed_order
+set hnsw.ef_search = 100
+as $$
+  select t.id, t.content, 1 - t.distance as similarity, t.metadata, t.created_at
+  from (
+    select
+      user_memories.id,
+      user_memories.content,
+      user_memories.metadata,
+      user_memories.created_at,
+      user_memories.embedding <=> query_embedding as distance
+    from user_memories
+    where user_memories.user_id = filter_user_id
+    order by user_memories.embedding <=> query_embedding
+    limit match_count
+  ) t
+  where 1 - t.distance > match_threshold
+  order by t.distance;
+$$;
+
+select 'pgvector HNSW 인덱스/함수 적용 완료!' as status;
@@ -1,11 +1,18 @@
 import streamlit as st
-from supabase import create_client, Client
-import google.generativeai as genai
+from supabase import Client
 import os
+import sys
 from dotenv import load_dotenv
+import time
 import datetime
+from concurrent.futures import ThreadPoolExecutor
 from dateutil import parser
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from myeongshim_rag.src.clients import get_supabase
+from myeongshim_rag.src.llm_gateway import get_gateway
+from myeongshim_rag.src.access_tokens import verify_token, looks_like_token, is_revoked
+
 # Load environment variables
 load_dotenv()
 
@@ -43,14 +50,55 @@ st.markdown("""
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "30"))
+STREAM_RENDER_INTERVAL = float(os.getenv("STREAM_RENDER_INTERVAL", "0.1"))  # seconds between re-renders while streaming
 
 if not SUPABASE_URL or not SUPABASE_KEY:
     st.error("🚨 서버 설정 오류: .env 파일에 SUPABASE_URL 및 Key가 없습니다.")
     st.stop()
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-genai.configure(api_key=GEMINI_API_KEY)
-model = genai.GenerativeModel('gemini-2.5-flash')
+# Process-wide pooled clients: reused across Streamlit reruns and sessions
+supabase: Client = get_supabase(SUPABASE_URL, SUPABASE_KEY)
+llm = get_gateway()  # retries, adaptive concurrency and fallback model for Gemini calls
+
+
+@st.cache_resource
+def get_writer():
+    """Single background worker: DB writes leave the render path but keep their submit order."""
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="chat-writer")
+
+
+def persist(*writes):
+    """Queue Supabase writes (callables) off the render path; failures are logged, not shown."""
+    def run():
+        for write in writes:
+            try:
+                write()
+            except Exception as e:
+                print(f"⚠️ Chat persistence failed: {e}")
+    get_writer().submit(run)
+
+
+def fetch_history_page(session_id, before=None, limit=HISTORY_PAGE_SIZE):
+    """
+    Keyset page of messages older than the `before` cursor (created_at, id), oldest first; plus whether more remain.
+    The id tie-break keeps rows that share a timestamp at a page boundary.
+    """
+    query = supabase.table("chat_messages").select("id, role, content, created_at").eq("session_id", session_id)
+    if before:
+        created_at, row_id = before
+        query = query.or_(f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt."{row_id}")')
+    rows = query.order("created_at", desc=True).order("id", desc=True).limit(limit + 1).execute().data or []
+    return list(reversed(rows[:limit])), len(rows) > limit
+
+
+def history_cursor(page):
+    return (page[0]["created_at"], page[0]["id"]) if page else None
+
+
+def deduct_coin():
+    """Atomic `coins = coins - 1 where coins > 0` in the DB; returns the new balance, or None if none was left."""
+    return supabase.rpc("deduct_coin", {"p_user_id": str(user_uuid)}).execute().data
 
 # 2. Key Validation Logic
 query_params = st.query_params
@@ -79,52 +127,73 @@ if not access_key:
     st.stop()
 
 # --- Scenario 2: Validate Key & User ---
-try:
-    user_res = supabase.table("users").select("*").eq("access_key", access_key).single().execute()
-    user = user_res.data
-except Exception as e:
-    user = None
-
-if not user:
-    st.error("❌ 유효하지 않은 Access Key입니다. 링크를 다시 확인해주세요.")
-    st.stop()
+# Signed tokens are verified locally (no DB call per rerun); legacy raw keys are looked up once per session.
+if st.session_state.get("access_key") != access_key:
+    claims = None
+    account = None
+    if looks_like_token(access_key):
+        try:
+            claims = verify_token(access_key)
+        except ValueError:  # InvalidToken, or ACCESS_TOKEN_SECRET not configured
+            claims = None
+    else:
+        try:
+            account = supabase.table("users").select("*").eq("access_key", access_key).single().execute().data
+        except Exception:
+            account = None
+        if account:
+            claims = {"uid": account["id"], "dur": account.get("duration_minutes", 30)}
 
-# Check Coins & Time (Lazy Start Logic)
-current_coins = user.get('coins', 0)
-user_uuid = user.get('id')
-user_email = user.get('email', '익명')
-access_at_str = user.get('access_at')
-duration_min = user.get('duration_minutes', 30)
-
-now_utc = datetime.datetime.now(datetime.timezone.utc)
-
-# 3. Time Check Logic
-if access_at_str:
-    # Already Started
-    access_at = parser.isoparse(access_at_str)
-    expire_at = access_at + datetime.timedelta(minutes=duration_min)
-    remaining_seconds = (expire_at - now_utc).total_seconds()
-
-    if remaining_seconds <= 0:
-        st.error(f"🚨 이용 시간이 종료되었습니다. (총 {duration_min}분 이용 완료)")
-        st.warning("추가 상담을 원하시면 이용권을 재구매해주세요.")
+    if not claims:
+        st.error("❌ 유효하지 않은 Access Key입니다. 링크를 다시 확인해주세요.")
         st.stop()
-    
-    # Format remaining time
-    rem_min = int(remaining_seconds // 60)
-    rem_sec = int(remaining_seconds % 60)
-    st.sidebar.markdown(f"## ⏳ 남은 시간: {rem_min}분 {rem_sec}초")
-else:
-    # Not Started Yet
-    st.sidebar.success(f"🎟️ 이용권: {duration_min}분 (첫 질문 시 시작)")
+    st.session_state.access_key = access_key
+    st.session_state.access_claims = claims
+    st.session_state.account = account  # coins / access_at, refreshed on each prompt
+
+claims = st.session_state.access_claims
+if claims.get("exp", float("inf")) < time.time():  # verified once per session, so expiry is rechecked on every rerun
+    st.error("❌ 만료된 Access Key입니다. 관리자에게 문의해주세요.")
+    st.stop()
+if is_revoked(supabase, claims):
+    st.error("❌ 사용이 중지된 Access Key입니다. 관리자에게 문의해주세요.")
+    st.stop()
+
+user_uuid = claims["uid"]
 
-# Sidebar Info
-st.sidebar.markdown(f"💰 남은 코인: {current_coins}개")
-st.sidebar.markdown(f"📧 계정: {user_email}")
 
-if current_coins <= 0:
-    st.warning("🚨 보유 코인을 모두 사용하셨습니다. 충전 후 이용해주세요!")
+def remaining_seconds(account, now):
+    """Seconds left on the pass, or None when it has not started yet."""
+    if not account or not account.get("access_at"):
+        return None
+    duration = account.get("duration_minutes") or claims.get("dur", 30)
+    expire_at = parser.isoparse(account["access_at"]) + datetime.timedelta(minutes=duration)
+    return (expire_at - now).total_seconds()
+
+
+# Sidebar shows the last known state (fetched on prompt submit), computed locally on reruns
+account = st.session_state.account
+duration_min = (account or {}).get("duration_minutes") or claims.get("dur", 30)
+user_email = (account or {}).get("email") or "방문자"
+remaining = remaining_seconds(account, datetime.datetime.now(datetime.timezone.utc))
+
+if remaining is not None and remaining <= 0:
+    st.error(f"🚨 이용 시간이 종료되었습니다. (총 {duration_min}분 이용 완료)")
+    st.warning("추가 상담을 원하시면 이용권을 재구매해주세요.")
     st.stop()
+elif remaining is not None:
+    st.sidebar.markdown(f"## ⏳ 남은 시간: {int(remaining // 60)}분 {int(remaining % 60)}초")
+elif account is None:
+    st.sidebar.info(f"🎟️ 이용권: {duration_min}분 (남은 시간과 코인은 질문 시 확인됩니다)")
+else:
+    st.sidebar.success(f"🎟️ 이용권: {duration_min}분 (첫 질문 시 시작)")
+
+if account:
+    st.sidebar.markdown(f"💰 남은 코인: {account.get('coins', 0)}개")
+    st.sidebar.markdown(f"📧 계정: {user_email}")
+    if account.get("coins", 0) <= 0:
+        st.warning("🚨 보유 코인을 모두 사용하셨습니다. 충전 후 이용해주세요!")
+        st.stop()
 
 # --- Session Management (For Chat History Persistence) ---
 if "session_id" not in st.session_state:
@@ -145,13 +214,20 @@ session_id = st.session_state.session_id
 st.title("🔮 명심코칭 : 운명 상담")
 st.caption(f"반갑습니다, **{user_email}**님.")
 
-# Initialize Local Chat State
+# Initialize Local Chat State: only the latest page, older pages on demand
 if "messages" not in st.session_state:
-    st.session_state.messages = []
-    hist_res = supabase.table("chat_messages").select("*").eq("session_id", session_id).order("created_at", desc=False).execute()
-    if hist_res.data:
-        for m in hist_res.data:
-            st.session_state.messages.append({"role": m['role'], "content": m['content']})
+    page, has_more = fetch_history_page(session_id)
+    st.session_state.messages = [{"role": m["role"], "content": m["content"]} for m in page]
+    st.session_state.history_cursor = history_cursor(page)
+    st.session_state.history_has_more = has_more
+
+if st.session_state.history_has_more and st.button("⬆️ 이전 대화 더 보기"):
+    page, has_more = fetch_history_page(session_id, before=st.session_state.history_cursor)
+    st.session_state.messages[:0] = [{"role": m["role"], "content": m["content"]} for m in page]
+    if page:
+        st.session_state.history_cursor = history_cursor(page)
+    st.session_state.history_has_more = has_more
+    st.rerun()
 
 # Display Chat
 for message in st.session_state.messages:
@@ -162,26 +238,44 @@ for message in st.session_state.messages:
 # --- Chat Logic ---
 if prompt := st.chat_input("무엇이든 물어보세요 (1코인 차감)"):
     
+    # Coin / time state is only fetched when a prompt is actually submitted
+    account = supabase.table("users").select("id, email, coins, access_at, duration_minutes")\
+        .eq("id", user_uuid).single().execute().data
+    previous = st.session_state.account
+    if previous:
+        # The lazy-start write may still be queued in the background writer
+        account["access_at"] = account.get("access_at") or previous.get("access_at")
+    st.session_state.account = account
+    now_utc = datetime.datetime.now(datetime.timezone.utc)
+    remaining = remaining_seconds(account, now_utc)
+    current_coins = account.get("coins", 0)
+
+    if remaining is not None and remaining <= 0:
+        st.error("🚨 이용 시간이 종료되었습니다.")
+        st.stop()
+    if current_coins <= 0:
+        st.warning("🚨 보유 코인을 모두 사용하셨습니다. 충전 후 이용해주세요!")
+        st.stop()
+
     # [Lazy Start] First Access Trigger
-    if not access_at_str:
+    if remaining is None:
         now_iso = now_utc.isoformat()
-        supabase.table("users").update({"access_at": now_iso}).eq("id", user_uuid).execute()
+        persist(lambda: supabase.table("users").update({"access_at": now_iso}).eq("id", user_uuid).execute())
         st.toast("⏱️ 상담 시간이 지금부터 시작됩니다!")
-        # Update local variable to prevent 'Not Started' view next re-run
-        # We don't rerun immediately to keep the current prompt processing smooth
-        access_at_str = now_iso 
+        # Keep the local copy in sync so the next rerun shows the countdown without a DB call
+        account["access_at"] = now_iso
 
     # 1. UI Append User Message
     st.session_state.messages.append({"role": "user", "content": prompt})
     with st.chat_message("user", avatar="👤"):
         st.markdown(prompt)
 
-    # 2. Save User Message to DB
-    supabase.table("chat_messages").insert({
+    # 2. Save User Message to DB (background)
+    persist(lambda: supabase.table("chat_messages").insert({
         "session_id": session_id,
         "role": "user",
         "content": prompt
-    }).execute()
+    }).execute())
 
     # 3. Generate Answer
     with st.chat_message("assistant", avatar="🤖"):
@@ -191,25 +285,31 @@ if prompt := st.chat_input("무엇이든 물어보세요 (1코인 차감)"):
         try:
             history_context = [{"role": "user" if m["role"] == "user" else "model", "parts": [m["content"]]} for m in st.session_state.messages[:-1]]
             
-            chat = model.start_chat(history=history_context)
-            response = chat.send_message(prompt, stream=True)
+            history_context.append({"role": "user", "parts": [prompt]})
             
-            for chunk in response:
-                if chunk.text:
-                    full_response += chunk.text
-                    message_placeholder.markdown(full_response + "▌")
+            # Re-render at most every STREAM_RENDER_INTERVAL instead of on every chunk
+            parts = []
+            last_render = 0.0
+            for chunk in llm.stream(history_context, 'gemini-2.5-flash'):
+                parts.append(chunk)
+                now = time.monotonic()
+                if now - last_render >= STREAM_RENDER_INTERVAL:
+                    message_placeholder.markdown("".join(parts) + "▌")
+                    last_render = now
+            full_response = "".join(parts)
             
             message_placeholder.markdown(full_response)
             
-            # 4. Save Assistant Message and Deduct Coin
-            supabase.table("chat_messages").insert({
+            # 4. Save Assistant Message (background, after the user message) and Deduct Coin
+            persist(lambda: supabase.table("chat_messages").insert({
                 "session_id": session_id,
                 "role": "assistant",
                 "content": full_response
-            }).execute()
+            }).execute())
 
-            new_coin_count = current_coins - 1
-            supabase.table("users").update({"coins": new_coin_count}).eq("id", user_uuid).execute()
+            # The deduction stays synchronous and atomic in the DB, so top-ups are never overwritten
+            new_coin_count = deduct_coin()
+            account["coins"] = new_coin_count if new_coin_count is not None else 0
             
             st.session_state.messages.append({"role": "assistant", "content": full_response})
             # To update coin display effectively, we might want to rerun, but let's avoid jarring refresh.
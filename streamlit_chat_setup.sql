@@ -0,0 +1,26 @@
+-- ======================================
+-- Streamlit 상담 채팅 설정 (streamlit_app)
+-- Supabase SQL Editor에서 실행하세요
+--
+-- 1) 채팅 기록 keyset 페이지네이션 인덱스
+--    앱은 최근 HISTORY_PAGE_SIZE 개만 먼저 불러오고, "이전 대화 더 보기" 때
+--    (created_at, id) 커서보다 오래된 다음 페이지를 읽습니다.
+--      where session_id = $1 and (created_at < $2 or (created_at = $2 and id < $3))
+--      order by created_at desc, id desc limit n
+-- 2) 코인 차감 함수: 읽고-쓰기 대신 DB 에서 원자적으로 1 차감 (세션 중 충전분을 덮어쓰지 않음)
+-- ======================================
+
+drop index if exists chat_messages_session_created_idx;
+create index if not exists chat_messages_session_created_id_idx
+on chat_messages (session_id, created_at desc, id desc);
+
+create or replace function deduct_coin(p_user_id uuid)
+returns integer
+language sql
+as $$
+  update users set coins = coins - 1
+  where id = p_user_id and coins > 0
+  returning coins;
+$$;
+
+select 'chat_messages_session_created_id_idx / deduct_coin 생성 완료!' as status;